@@ -1,15 +1,33 @@
 import json
-import time
+import os
 import threading
 import asyncio
-import janus
-import queue
+import concurrent.futures
 from mcp.client.session import ClientSession
 from mcp.client.sse import sse_client
 
 
 session_ready = threading.Event()
 
+# Runners started in parallel against one server each pass their own id, e.g. MCP_SESSION_ID=runner-1
+SESSION_ID = os.environ.get("MCP_SESSION_ID", "")
+
+
+class SessionClient:
+    """ClientSession whose tool calls all run in this runner's browser session."""
+    def __init__(self, session, session_id):
+        self._session = session
+        self._session_id = session_id
+
+    def call_tool(self, name, arguments=None, **kwargs):
+        arguments = dict(arguments or {})
+        if self._session_id:
+            arguments.setdefault("session_id", self._session_id)
+        return self._session.call_tool(name, arguments=arguments, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
 # def before_all(context):
 #     context._task_queue = asyncio.Queue()
 #     context._result_queue = asyncio.Queue()
@@ -58,42 +76,45 @@ session_ready = threading.Event()
 
 
 def before_all(context):
-    context._task_queue = janus.Queue()
-    context._result_queue = janus.Queue()
+    # Step modules in sub-directories of features/steps are only imported when
+    # the selected features use their patterns.
+    from features.steps import load_steps_for_features
+    load_steps_for_features(getattr(context._runner, "features", None))
 
+    # The MCP session lives on an event loop in a background thread; steps submit
+    # their tool call coroutines to it and block on the matching future.
     session_ready = threading.Event()
+    errors = []
+    loop = asyncio.new_event_loop()
+    context._loop = loop
+
+    async def mcp_worker():
+        context._stop = asyncio.Event()
+        try:
+            async with sse_client("http://localhost:8000/sse") as streams:
+                async with ClientSession(*streams) as session:
+                    await session.initialize()
+                    context.session = SessionClient(session, SESSION_ID)
+                    session_ready.set()
+                    await context._stop.wait()
+        except Exception as e:
+            print(f"MCP session failed: {e}")
+            errors.append(e)
+        finally:
+            session_ready.set()
 
     def run_loop():
-        loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-
-        async def mcp_worker():
-            try:
-                async with sse_client("http://localhost:8000/sse") as streams:
-                    async with ClientSession(*streams) as session:
-                        await session.initialize()
-                        context.session = session
-                        session_ready.set()
-
-                        while True:
-                            task = await context._task_queue.async_q.get()
-                            if task is None:
-                                break
-
-                            start = time.time()
-                            coro = task
-                            result = await coro
-                            await context._result_queue.async_q.put(result)
-
-            except Exception as e:
-                session_ready.set()
-
         loop.run_until_complete(mcp_worker())
 
-    thread = threading.Thread(target=run_loop, daemon=True)
-    thread.start()
+    context._loop_thread = threading.Thread(target=run_loop, daemon=True)
+    context._loop_thread.start()
 
     session_ready.wait()
+    if errors or getattr(context, "session", None) is None:
+        # without a session every step would fail on context.session, stop the run here
+        raise RuntimeError("MCP session could not be started, is the server running on localhost:8000?") \
+            from (errors[0] if errors else None)
 
 
 
@@ -104,8 +125,9 @@ def before_all(context):
 
 
 def after_all(context):
-    if hasattr(context, "_task_queue"):
-        context._task_queue.sync_q.put_nowait(None)
+    if hasattr(context, "_stop"):
+        context._loop.call_soon_threadsafe(context._stop.set)
+        context._loop_thread.join(timeout=10)
 
 
 # def call_tool_sync(context, coro, timeout=40):
@@ -130,16 +152,20 @@ def after_all(context):
 
 
 def call_tool_sync(context, coro, timeout=40):
-    start = time.time()
-    context._task_queue.sync_q.put(coro)
-    while True:
-        try:
-            result = context._result_queue.sync_q.get_nowait()
-            return result
-        except queue.Empty:
-            if time.time() - start > timeout:
-                raise TimeoutError("MCP tool invocation timed out.")
-            time.sleep(0.1)
+    """
+    Run a tool call coroutine on the MCP loop and wait for its own result.
+
+    The call is cancelled when it times out or the step is interrupted, so a
+    late response can never be taken for the result of a later call.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, context._loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        raise TimeoutError(f"MCP tool invocation timed out after {timeout} seconds.") from None
+    finally:
+        if not future.done():
+            future.cancel()
 
 
 def get_tool_json(result):
@@ -1,29 +1,159 @@
 # features/steps/__init__.py
+"""
+Lazy loading of the step modules in the sub-directories of features/steps.
+
+behave executes the .py files directly in this directory itself. Modules in
+sub-directories are only imported when a selected feature uses one of their
+patterns: environment.before_all calls load_steps_for_features with the
+parsed features. The patterns of every module are kept in .step_index.json
+next to the steps, and only files whose mtime or size changed are parsed
+again (with ast, without importing them).
+
+Set BEHAVE_EAGER_STEPS=1 to import every module as before.
+"""
+import ast
+import json
 import os
 import pathlib
 import importlib.util
 import traceback
 
-def auto_import_steps():
+import parse
+
+
+STEPS_DIR = pathlib.Path(__file__).resolve().parent
+INDEX_FILE = STEPS_DIR / ".step_index.json"
+INDEX_VERSION = 1
+STEP_KEYWORDS = ("given", "when", "then", "step")
 
-    steps_dir = pathlib.Path(__file__).parent
-    base_dir = steps_dir.parent 
+_loaded = set()  # relative paths of the modules imported so far
 
-    for py_file in steps_dir.rglob("*.py"):
-        if py_file.name == "__init__.py":
+
+def _parse_module(py_file):
+    """{"patterns": [[keyword, pattern], ...], "eager": bool} of a step module."""
+    patterns, eager = [], False
+    tree = ast.parse(py_file.read_bytes(), filename=str(py_file))
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
             continue
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else ""
+        if name in ("use_step_matcher", "step_matcher"):
+            eager = True  # not parse patterns, cannot be matched here
+        elif name.lower() in STEP_KEYWORDS:
+            if node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+                patterns.append([name.lower(), node.args[0].value])
+            else:
+                eager = True
+    return {"patterns": patterns, "eager": eager}
+
+
+def _step_files():
+    for py_file in sorted(STEPS_DIR.rglob("*.py")):
+        if py_file.parent != STEPS_DIR and py_file.name != "__init__.py":
+            yield py_file
+
 
+def load_index():
+    """Index of the step modules, refreshed for the files that changed since it was written."""
+    try:
+        index = json.loads(INDEX_FILE.read_text(encoding="utf-8"))
+        if index.get("version") != INDEX_VERSION:
+            index = None
+    except (OSError, ValueError):
+        index = None
+    old_files = index["files"] if index else {}
+
+    files, changed = {}, False
+    for py_file in _step_files():
+        rel = py_file.relative_to(STEPS_DIR).as_posix()
+        st = py_file.stat()
+        entry = old_files.get(rel)
+        if not entry or entry["mtime_ns"] != st.st_mtime_ns or entry["size"] != st.st_size:
+            try:
+                entry = dict(_parse_module(py_file), mtime_ns=st.st_mtime_ns, size=st.st_size)
+            except (OSError, SyntaxError, ValueError) as e:
+                print(f"[auto-import] Cannot index {py_file}, it will always be loaded: {e}")
+                entry = {"patterns": [], "eager": True, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+            changed = True
+        files[rel] = entry
+
+    index = {"version": INDEX_VERSION, "files": files}
+    if changed or files.keys() != old_files.keys():
         try:
-            rel_path = py_file.relative_to(base_dir)
-            module_name = ".".join(rel_path.with_suffix("").parts)
+            tmp_file = INDEX_FILE.with_name(f"{INDEX_FILE.name}.{os.getpid()}.tmp")
+            tmp_file.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_file, INDEX_FILE)
+        except OSError as e:
+            print(f"[auto-import] Cannot write {INDEX_FILE}: {e}")
+    return index
+
+
+def _import_module(rel):
+    py_file = STEPS_DIR / rel
+    try:
+        rel_path = py_file.relative_to(STEPS_DIR.parent)
+        module_name = ".".join(rel_path.with_suffix("").parts)
+        spec = importlib.util.spec_from_file_location(module_name, py_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _loaded.add(rel)
+    except Exception as e:
+        print(f"[auto-import] Failed to import {py_file}: {e}")
+        traceback.print_exc()
+
+
+def _feature_steps(features):
+    for feature in features:
+        if feature.background:
+            yield from feature.background.steps
+        for scenario in feature.walk_scenarios():
+            yield from scenario.steps
+
+
+class _PatternIndex:
+    """
+    Step keyword -> [(case-folded literal prefix, pattern, module)], parse
+    patterns compiled on first use. The prefix check is case-insensitive,
+    like behave's parse matcher.
+    """
+    def __init__(self, files):
+        self.by_keyword = {keyword: [] for keyword in STEP_KEYWORDS}
+        self._compiled = {}
+        for rel, entry in files.items():
+            for keyword, pattern in entry["patterns"]:
+                self.by_keyword[keyword].append((pattern.split("{", 1)[0].casefold(), pattern, rel))
 
-            print(f"[auto-import] Loading module: {module_name}")
-            spec = importlib.util.spec_from_file_location(module_name, py_file)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
+    def modules_for(self, step_type, text):
+        modules = set()
+        folded = text.casefold()
+        for keyword in (step_type, "step"):
+            for prefix, pattern, rel in self.by_keyword.get(keyword, ()):
+                if rel in modules or not folded.startswith(prefix):
+                    continue
+                compiled = self._compiled.get(pattern)
+                if compiled is None:
+                    compiled = self._compiled[pattern] = parse.compile(pattern)
+                if compiled.parse(text) is not None:
+                    modules.add(rel)
+        return modules
 
-        except Exception as e:
-            print(f"[auto-import] Failed to import {py_file}: {e}")
-            traceback.print_exc()
 
-auto_import_steps()
+def load_steps_for_features(features=None):
+    """
+    Import the step modules the steps of ``features`` need (plus the ones that
+    cannot be indexed). None, or BEHAVE_EAGER_STEPS=1, imports all of them.
+    """
+    index = load_index()
+    files = index["files"]
+    if features is None or os.environ.get("BEHAVE_EAGER_STEPS") == "1":
+        wanted = set(files)
+    else:
+        patterns = _PatternIndex(files)
+        wanted = {rel for rel, entry in files.items() if entry["eager"]}
+        for step in _feature_steps(features):
+            wanted |= patterns.modules_for(step.step_type, step.name)
+    for rel in sorted(wanted - _loaded):
+        _import_module(rel)
+    print(f"[auto-import] Loaded {len(wanted)} of {len(files)} indexed step modules")
+    return sorted(wanted)
@@ -0,0 +1,48 @@
+"""
+Benchmarks of the server on the simulated UIA backend (fake_backend.py,
+fake_uia.py), run with pytest-benchmark on any platform:
+
+    python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+``--benchmark-autosave`` keeps every run under .benchmarks/ and
+``--benchmark-compare`` checks the current one against the last saved
+run, so a regression fails the job. Every benchmark also records the
+simulated UIA calls it made per round in ``extra_info`` (see
+``--benchmark-json``), which do not depend on the machine.
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_backend
+
+fake_backend.install()
+
+
+@pytest.fixture
+def bench_calls(benchmark):
+    """
+    ``bench_calls(tree, func, **pedantic)`` benchmarks ``func`` (through
+    benchmark.pedantic when options are given) and records the calls it made
+    on ``tree`` per run in extra_info["uia_calls"]. Returns func's result.
+    """
+    def run(tree, func, **pedantic):
+        runs = [0]
+
+        def counted():
+            runs[0] += 1
+            return func()
+
+        start = tree.calls
+        result = benchmark.pedantic(counted, **pedantic) if pedantic else benchmark(counted)
+        benchmark.extra_info["uia_calls"] = round((tree.calls - start) / max(1, runs[0]), 1)
+        return result
+    return run
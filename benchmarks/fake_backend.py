@@ -0,0 +1,156 @@
+"""
+Simulated UIA backend for the benchmarks: runs the real tool functions of
+tools/*.py on any platform, against the in-memory trees of benchmarks/fake_uia.py.
+
+``install()`` must be called before importing the server modules. It puts a
+minimal pywinauto in sys.modules (only the names the server imports at
+module level), so the benchmarks never drive a real desktop even on Windows.
+Everything the tools touch at run time comes from benchmarks/fake_uia.py.
+"""
+import asyncio
+import functools
+import os
+import sys
+import types
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from fake_uia import FakeBrowserApp, FakeElement, FakeTree, build_fake_tree, install_provider
+
+
+def _unavailable(name):
+    def call(*args, **kwargs):
+        raise RuntimeError(f"{name} is not available in the simulated backend")
+    return call
+
+
+def install():
+    """Register the fake pywinauto modules and the fake tree provider, once."""
+    install_provider()
+    if getattr(sys.modules.get("pywinauto"), "__fake__", False):
+        return
+
+    def module(name, **attrs):
+        mod = types.ModuleType(name)
+        mod.__fake__ = True
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+        return mod
+
+    handleprops = module("pywinauto.handleprops", iswindow=lambda hwnd: False, processid=lambda hwnd: 0)
+    mouse = module("pywinauto.mouse", move=lambda coords=None: None, press=lambda button="left", coords=None: None,
+                   release=lambda button="left", coords=None: None, click=lambda button="left", coords=None: None)
+    keyboard = module("pywinauto.keyboard", send_keys=lambda keys, **kwargs: None)
+    uiawrapper = module("pywinauto.controls.uiawrapper", UIAWrapper=FakeElement)
+    controls = module("pywinauto.controls", uiawrapper=uiawrapper)
+    uia_defines = module("pywinauto.uia_defines", IUIA=_unavailable("IUIA"))
+    uia_element_info = module("pywinauto.uia_element_info", UIAElementInfo=_unavailable("UIAElementInfo"))
+    module("pywinauto", Application=_unavailable("Application"), Desktop=_unavailable("Desktop"),
+           handleprops=handleprops, mouse=mouse, keyboard=keyboard, controls=controls,
+           uia_defines=uia_defines, uia_element_info=uia_element_info)
+
+
+class FakeMCP:
+    """Collects the tools registered with ``@mcp.tool()`` and calls them like FastMCP.call_tool."""
+    def __init__(self):
+        self.tools = {}
+
+    def tool(self):
+        def decorator(func):
+            self.tools[func.__name__] = func
+            return func
+        return decorator
+
+    async def call_tool(self, name, arguments):
+        return await self.tools[name](**arguments)
+
+
+def build_browser_tree(depth=4, breadth=5, latency=0.0):
+    """
+    Synthetic browser window: a toolbar with named buttons and a web page
+    document holding a ``depth`` x ``breadth`` generated subtree.
+    """
+    tree = FakeTree(latency=latency)
+    window = build_fake_tree(depth=0, tree=tree)
+    toolbar = window.add_child(title="App bar", control_type="ToolBar", class_name="ToolbarView")
+    for name in ("Back", "Refresh", "Favorites", "Settings and more"):
+        toolbar.add_child(title=name, control_type="Button", class_name="ToolbarButton", rect=(0, 0, 32, 32))
+    toolbar.add_child(title="Address and search bar", control_type="Edit", automation_id="view_1020", value="about:blank")
+    page = window.add_child(title="Benchmark page", control_type="Document", automation_id="RootWebArea",
+                            rect=(0, 80, 1920, 1080))
+    content = build_fake_tree(depth=depth, breadth=breadth, tree=tree)
+    for child in content._children:
+        child.parent = page
+        page._children.append(child)
+    return window
+
+
+def toggle_panel(window, button_title="Favorites", panel_title="Favorites panel", items=20):
+    """Scripted UI change: clicking ``button_title`` opens / closes a panel of ``items`` tree items."""
+    button = window.child_window(title=button_title, control_type="Button").wrapper_object()
+
+    def on_click(element):
+        panel = next((child for child in window._children if child.title == panel_title), None)
+        if panel is not None:
+            panel.remove()
+            return
+        panel = window.add_child(title=panel_title, control_type="Pane", index=1)
+        for i in range(items):
+            panel.add_child(title=f"Item {i}", control_type="TreeItem", expanded=False)
+
+    button.on_click = on_click
+    return button
+
+
+class FakeSession:
+    """
+    The registered tools of simple_server bound to one fake browser session.
+    ``quiet_ms`` caps the settle wait after every action.
+    """
+    def __init__(self, depth=4, breadth=5, latency=0.0, quiet_ms=20, browser="edge"):
+        install()
+        from browser_session import BrowserSessionPool, CurrentSession
+        from tools.batch_tool import register_batch_tools
+        from tools.browser_tool import register_browser_tools
+        from tools.gen_code_tool import register_gen_code_tools
+        from tools.mouse_tool import register_mouse_tools
+        from tools.snapshot_tool import register_snapshot_tools
+        from tools.verify_tool import register_verify_tools
+
+        self.window = build_browser_tree(depth, breadth, latency)
+        self.app = FakeBrowserApp(window=self.window)
+        self.pool = BrowserSessionPool(browser)
+        self.browser_manager = CurrentSession(self.pool)
+        self.manager = self.pool.get("")
+        self.manager._app = self.app
+
+        wait_for_ui = self.manager.wait_for_ui
+
+        @functools.wraps(wait_for_ui)
+        def capped_wait_for_ui(mark, until="stable", quiet_ms=quiet_ms, timeout=None):
+            return wait_for_ui(mark, until=until, quiet_ms=min(quiet_ms, self.quiet_ms), timeout=timeout)
+
+        self.quiet_ms = quiet_ms
+        self.manager.wait_for_ui = capped_wait_for_ui
+
+        self.mcp = FakeMCP()
+        for register in (register_browser_tools, register_mouse_tools, register_gen_code_tools,
+                         register_verify_tools, register_batch_tools, register_snapshot_tools):
+            register(self.mcp, self.browser_manager)
+        self._loop = asyncio.new_event_loop()
+
+    @property
+    def tree(self):
+        return self.window.tree
+
+    def call(self, tool_name, **arguments):
+        """Run a tool to completion, returns its JSON response text."""
+        return self._loop.run_until_complete(self.mcp.call_tool(tool_name, arguments))
+
+    def close(self):
+        self.manager.executor.shutdown()
+        if self.manager.ui_events:
+            self.manager.ui_events.close()
+        self._loop.close()
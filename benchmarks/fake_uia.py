@@ -0,0 +1,449 @@
+"""
+In-memory UIA trees for the tests and the benchmarks: elements, window
+specifications, browser apps and launchers that behave like the pywinauto
+ones the server uses, and count every call as a UIA round trip.
+
+``install_provider()`` makes utils.uia_cache.select_provider read these
+trees through FakeCacheProvider, the same cost model as a UIA CacheRequest.
+"""
+import itertools
+import re
+import threading
+import time
+
+from utils.uia_cache import CachedNode, EXPAND_STATE_EXPANDED, format_runtime_id, register_provider
+from utils.wait_util import FOCUS_CHANGED, PROPERTY_CHANGED, STRUCTURE_CHANGED
+
+
+class FakeRect:
+    def __init__(self, left=0, top=0, right=0, bottom=0):
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+
+    def mid_point(self):
+        return ((self.left + self.right) // 2, (self.top + self.bottom) // 2)
+
+    def width(self):
+        return self.right - self.left
+
+    def height(self):
+        return self.bottom - self.top
+
+
+class FakeTree:
+    """
+    Shared state of an in-memory element tree: runtime id allocation and the
+    number of calls made against its elements (one call == one UIA round trip).
+    ``latency`` seconds are slept on every call to simulate the cross-process cost.
+    """
+    def __init__(self, process_id=4242, latency=0):
+        self.process_id = process_id
+        self.latency = latency
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_runtime_id(self):
+        return (42, self.process_id, next(self._ids))
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = 0
+
+
+class FakeElementInfo:
+    def __init__(self, element):
+        self._element = element
+
+    @property
+    def control_type(self):
+        self._element.tree.count_call()
+        return self._element.control_type
+
+    @property
+    def automation_id(self):
+        self._element.tree.count_call()
+        return self._element.automation_id
+
+    @property
+    def class_name(self):
+        self._element.tree.count_call()
+        return self._element.class_name
+
+    @property
+    def name(self):
+        self._element.tree.count_call()
+        return self._element.title
+
+    @property
+    def runtime_id(self):
+        self._element.tree.count_call()
+        return self._element.runtime_id
+
+    @property
+    def process_id(self):
+        return self._element.tree.process_id
+
+    @property
+    def parent(self):
+        self._element.tree.count_call()
+        return self._element.parent.element_info if self._element.parent else None
+
+    def children(self):
+        return [child.element_info for child in self._element.children()]
+
+    def __eq__(self, other):
+        return isinstance(other, FakeElementInfo) and other._element is self._element
+
+    def __hash__(self):
+        return id(self._element)
+
+
+class FakeElement:
+    """
+    In-memory stand-in for a pywinauto UIA wrapper.
+
+    Implements the subset of the wrapper API used by the snapshot walker and
+    the tools. Every method that would be a cross-process COM call on Windows
+    increments ``tree.calls``. ``value``, ``toggle_state`` and ``expanded`` are
+    ``None`` when the element does not support the matching UIA pattern; the
+    getters then raise like pywinauto does.
+    """
+    def __init__(self, title="", control_type="Pane", automation_id="", class_name="",
+                 rect=(0, 0, 0, 0), value=None, toggle_state=None, expanded=None,
+                 tree=None, parent=None):
+        self.tree = tree or FakeTree()
+        self.title = title
+        self.control_type = control_type
+        self.automation_id = automation_id
+        self.class_name = class_name
+        self.rect = FakeRect(*rect)
+        self.value = value
+        self.toggle_state = toggle_state
+        self.expanded = expanded
+        self.parent = parent
+        self.runtime_id = self.tree.next_runtime_id()
+        self.alive = True
+        self.handle = None  # fake elements have no native window
+        self.on_click = None  # scripted UI change: called with the element on every click
+        self.typed = []  # key sequences sent with type_keys
+        self._children = []
+        self.element_info = FakeElementInfo(self)
+
+    # --- tree construction / scripted changes ---
+    def add_child(self, title="", control_type="Pane", index=None, **kwargs):
+        child = FakeElement(title=title, control_type=control_type, tree=self.tree, parent=self, **kwargs)
+        if index is None:
+            self._children.append(child)
+        else:
+            self._children.insert(index, child)
+        return child
+
+    def remove(self):
+        if self.parent:
+            self.parent._children.remove(self)
+        for node in self.iter_subtree():
+            node.alive = False
+
+    def iter_subtree(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node._children))
+
+    # --- pywinauto wrapper API ---
+    def window_text(self):
+        self.tree.count_call()
+        return self.title
+
+    def rectangle(self):
+        self.tree.count_call()
+        return FakeRect(self.rect.left, self.rect.top, self.rect.right, self.rect.bottom)
+
+    def children(self, **kwargs):
+        self.tree.count_call()
+        return list(self._children)
+
+    def descendants(self, **kwargs):
+        self.tree.count_call()
+        return [node for node in self.iter_subtree() if node is not self]
+
+    def get_value(self):
+        self.tree.count_call()
+        if self.value is None:
+            raise AttributeError("Value pattern is not supported")
+        return self.value
+
+    def get_toggle_state(self):
+        self.tree.count_call()
+        if self.toggle_state is None:
+            raise AttributeError("Toggle pattern is not supported")
+        return self.toggle_state
+
+    def is_expanded(self):
+        self.tree.count_call()
+        if self.expanded is None:
+            raise AttributeError("ExpandCollapse pattern is not supported")
+        return self.expanded
+
+    def get_expand_state(self):
+        self.tree.count_call()
+        if self.expanded is None:
+            return 3
+        return 1 if self.expanded else 0
+
+    def expand(self):
+        self.tree.count_call()
+        self.expanded = True
+        return self
+
+    def collapse(self):
+        self.tree.count_call()
+        self.expanded = False
+        return self
+
+    def is_visible(self):
+        self.tree.count_call()
+        return self.alive
+
+    def exists(self, timeout=None):
+        return self.alive
+
+    def child_window(self, **criteria):
+        return FakeWindowSpec(self, criteria)
+
+    def _input(self):
+        self.tree.count_call()
+        if self.on_click is not None:
+            self.on_click(self)
+
+    def click_input(self, **kwargs):
+        self._input()
+
+    def right_click_input(self, **kwargs):
+        self._input()
+
+    def double_click_input(self, **kwargs):
+        self._input()
+
+    def type_keys(self, keys, **kwargs):
+        self.tree.count_call()
+        self.typed.append(keys)
+
+    def set_focus(self):
+        self.tree.count_call()
+        return self
+
+    def wrapper_object(self):
+        return self
+
+    def __repr__(self):
+        return f"<FakeElement {self.control_type} '{self.title}' {self.runtime_id}>"
+
+
+class FakeWindowSpec:
+    """
+    Lazy ``child_window`` lookup on a FakeElement, like pywinauto's
+    WindowSpecification. A lookup is a single call (one UIA FindFirst).
+    Supports title, title_re, control_type, auto_id, class_name and
+    found_index; other criteria are ignored.
+    """
+    def __init__(self, parent, criteria):
+        self.parent = parent
+        self.criteria = criteria
+
+    def _matches(self, element):
+        c = self.criteria
+        return ("title" not in c or element.title == c["title"]) \
+            and ("title_re" not in c or re.match(c["title_re"], element.title)) \
+            and ("control_type" not in c or element.control_type == c["control_type"]) \
+            and ("auto_id" not in c or element.automation_id == c["auto_id"]) \
+            and ("class_name" not in c or element.class_name == c["class_name"])
+
+    def find(self):
+        parent = self.parent.wrapper_object()
+        parent.tree.count_call()
+        found = [node for node in parent.iter_subtree() if node is not parent and node.alive and self._matches(node)]
+        index = self.criteria.get("found_index", 0)
+        return found[index] if index < len(found) else None
+
+    def exists(self, timeout=None):
+        return self.find() is not None
+
+    def wrapper_object(self):
+        element = self.find()
+        if element is None:
+            raise LookupError(f"No fake element matches {self.criteria}")
+        return element
+
+    def child_window(self, **criteria):
+        return FakeWindowSpec(self, criteria)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapper_object(), name)
+
+
+def build_fake_tree(depth=4, breadth=5, control_types=("Pane", "Group", "Button", "Text"), tree=None):
+    """
+    Build a synthetic tree with ``breadth`` children per node down to ``depth``
+    levels below a top-level ``Window``. Returns the root element.
+    """
+    root = FakeElement(title="Fake - Microsoft Edge", control_type="Window",
+                       class_name="Chrome_WidgetWin_1", rect=(0, 0, 1920, 1080), tree=tree)
+    level = [root]
+    for d in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(breadth):
+                control_type = control_types[(d + i) % len(control_types)]
+                next_level.append(parent.add_child(
+                    title=f"{control_type} {d}-{i}",
+                    control_type=control_type,
+                    automation_id=f"auto_{d}_{i}",
+                    class_name=f"Fake{control_type}",
+                    rect=(i * 10, d * 10, i * 10 + 10, d * 10 + 10),
+                ))
+        level = next_level
+    return root
+
+
+def random_change(rng, root, events, counter):
+    """
+    Apply one random change (add, remove or rename) to the tree under ``root``
+    and emit on ``events`` what UIA would. ``counter`` is a one-item list
+    numbering the new titles.
+    """
+    elements = [e for e in root.iter_subtree()]
+    target = rng.choice(elements)
+    action = rng.random()
+    if action < 0.35:
+        counter[0] += 1
+        parent = target
+        child = parent.add_child(title=f"Added {counter[0]}", control_type=rng.choice(("Button", "Text", "Group")),
+                                 index=rng.randint(0, len(parent._children)))
+        if rng.random() < 0.3:
+            child.add_child(title=f"Added {counter[0]} label", control_type="Text")
+        sender = parent
+        kind = STRUCTURE_CHANGED
+    elif action < 0.6 and target is not root:
+        sender = target.parent
+        target.remove()
+        kind = STRUCTURE_CHANGED
+    else:
+        counter[0] += 1
+        target.title = f"Renamed {counter[0]}"
+        sender = target
+        kind = PROPERTY_CHANGED
+    # some events arrive without a usable sender, and focus events carry no change
+    runtime_id = None if rng.random() < 0.05 else format_runtime_id(sender.runtime_id)
+    events.emit(kind, runtime_id)
+    if rng.random() < 0.2:
+        events.emit(FOCUS_CHANGED, format_runtime_id(rng.choice(elements).runtime_id))
+
+
+class FakeBrowserApp:
+    """Stand-in for a pywinauto Application started on a fake browser process."""
+    _pids = itertools.count(10000)
+
+    def __init__(self, cmd="", window=None):
+        self.cmd = cmd
+        self.process = next(self._pids)
+        self.main_window = window or build_fake_tree(depth=2, breadth=3, tree=FakeTree(self.process))
+        self.running = True
+
+    def window(self, **kwargs):
+        return self.main_window
+
+    def is_process_running(self):
+        return self.running
+
+    def kill(self, soft=False):
+        self.running = False
+        for node in self.main_window.iter_subtree():
+            node.alive = False
+
+
+class FakeLauncher:
+    """
+    Launcher for utils.warm_pool that starts FakeBrowserApp instead of a
+    browser, after ``delay`` seconds. Keeps every launch for inspection.
+    """
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.launched = []
+
+    def launch(self, user_data_dir, debug_port):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("fake launch failure")
+        app = FakeBrowserApp(cmd=f'fake-browser --remote-debugging-port={debug_port} --user-data-dir="{user_data_dir}"')
+        self.launched.append(app)
+        return app
+
+
+class FakeCacheProvider:
+    """
+    Bulk provider for the trees of this module, see install_provider.
+
+    Counts a round trip on the fake tree per ``root`` call and per node whose
+    children are read, the same cost model as UIACacheRequestProvider, so
+    call counts of the two providers can be compared on Linux.
+    """
+    name = "fake-cache"
+    prefetched = True
+
+    def __init__(self, subtree=False):
+        self.subtree = subtree
+        self.round_trips = 0
+
+    def root(self, element):
+        self.round_trips += 1
+        element.tree.count_call()
+        return CachedNode(self, (element, True), element)
+
+    def get(self, data, name):
+        element = data[0]
+        if name == "rectangle":
+            return element.rect.left, element.rect.top, element.rect.right, element.rect.bottom
+        if name == "has_value":
+            return element.value is not None
+        if name == "has_toggle":
+            return element.toggle_state is not None
+        if name == "has_expand":
+            return element.expanded is not None
+        if name == "expand_state":
+            return EXPAND_STATE_EXPANDED if element.expanded else 0
+        return getattr(element, name)
+
+    def cached_children(self, data):
+        element, children_cached = data
+        if not children_cached:
+            self.round_trips += 1
+            element.tree.count_call()
+        return [(child, self.subtree) for child in element._children]
+
+    def has_cached_children(self, data):
+        element, children_cached = data
+        return bool(element._children) if children_cached else None
+
+    def wrap(self, data):
+        return data[0]
+
+
+def _fake_provider(element, subtree):
+    return FakeCacheProvider(subtree) if isinstance(element, FakeElement) else None
+
+
+def install_provider():
+    """Read FakeElement trees with FakeCacheProvider wherever the server picks a provider."""
+    register_provider(_fake_provider)
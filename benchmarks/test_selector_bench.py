@@ -0,0 +1,83 @@
+"""
+Selector engine (utils.selector) against the title_re scan the tools used
+to do, on a synthetic tree from fake_uia.py where every call costs a
+simulated round trip.
+
+"title_re scan" is what pywinauto does for child_window(title_re=...): list
+the descendants, then read the control type and name of each one and run
+the regex. The selector walks the same tree once, with the bulk provider
+(one round trip, like a UIA CacheRequest) or node by node, and literal
+tests instead of a regex. Node by node is the fallback when no bulk
+provider is available and reads the three static properties of every node
+at once, so it costs more calls than the scan.
+"""
+import re
+
+import pytest
+
+from fake_uia import FakeCacheProvider, FakeTree, build_fake_tree
+from utils.selector import _parse, compile_selector, quote
+from utils.uia_cache import WrapperPropertyProvider
+
+DEPTH = 4
+BREADTH = 6
+LATENCY = 0.00005
+NAME = "Total (USD) [beta]*"  # not regex-safe: title_re would need re.escape
+
+
+@pytest.fixture(scope="module")
+def tree_and_target():
+    root = build_fake_tree(depth=DEPTH, breadth=BREADTH, tree=FakeTree(latency=LATENCY))
+    # the target sits in the last branch, so every search walks most of the tree
+    last = root
+    while last._children:
+        last = last._children[-1]
+    return root, last.parent.add_child(title=f"Grand {NAME}", control_type="Text")
+
+
+def title_re_scan(root, name, control_type):
+    pattern = f".*{name}.*"
+    for element in root.descendants():
+        if element.element_info.control_type == control_type and re.match(pattern, element.element_info.name):
+            return element
+    return None
+
+
+def _path_selector(root, target):
+    path, node = [], target.parent
+    while node is not root:
+        path.insert(0, node.control_type)
+        node = node.parent
+    return " > ".join(["", *path, f"Text[title*={quote(NAME)}]"])
+
+
+def test_title_re_scan(bench_calls, tree_and_target):
+    root, target = tree_and_target
+    assert bench_calls(root.tree, lambda: title_re_scan(root, "Grand Total", "Text"), rounds=5) is target
+
+
+@pytest.mark.parametrize("provider", ["wrapper", "bulk"])
+def test_selector(bench_calls, tree_and_target, provider):
+    root, target = tree_and_target
+    selector = compile_selector(f"Text[title*={quote(NAME)}]")
+
+    def make():
+        return WrapperPropertyProvider() if provider == "wrapper" else FakeCacheProvider(subtree=True)
+
+    assert bench_calls(root.tree, lambda: selector.find(root, make()), rounds=5) is target
+
+
+def test_selector_child_steps(bench_calls, tree_and_target):
+    root, target = tree_and_target
+    selector = compile_selector(_path_selector(root, target))
+    assert bench_calls(root.tree, lambda: selector.find(root, FakeCacheProvider(subtree=True)), rounds=5) is target
+
+
+def test_compile(benchmark):
+    benchmark(_parse, f"Pane[title={quote(NAME)}] > Text[title~=\"Grand.*\"]:nth-of-type(1)")
+
+
+def test_compile_cached(benchmark):
+    text = f"Text[title*={quote(NAME)}]"
+    compile_selector(text)
+    benchmark(compile_selector, text)
@@ -0,0 +1,76 @@
+"""
+Snapshot walks and encodings on synthetic trees from fake_uia.py: the
+speedup of walking the top-level subtrees on several threads when every
+property read costs a round trip, and the size and latency of the formats
+of utils.snapshot_codec.
+"""
+import json
+
+import pytest
+
+from fake_uia import FakeTree, build_fake_tree
+from utils.snapshot import SnapshotEngine
+from utils.snapshot_codec import FORMAT_JSON, SNAPSHOT_FORMATS, decode_compact, encode_snapshot
+from utils.uia_cache import WrapperPropertyProvider
+
+WALK_DEPTH = 4
+WALK_BREADTH = 5
+WALK_LATENCY = 0.0001  # seconds per simulated UIA call, what makes threads pay off
+FORMAT_DEPTH = 4
+FORMAT_BREADTH = 6
+
+
+@pytest.fixture(scope="module")
+def walk_tree():
+    tree = FakeTree(latency=WALK_LATENCY)
+    return build_fake_tree(depth=WALK_DEPTH, breadth=WALK_BREADTH, tree=tree)
+
+
+@pytest.fixture(scope="module")
+def sequential_snapshot(walk_tree):
+    return SnapshotEngine(max_root_depth=WALK_DEPTH + 2, max_web_length=WALK_BREADTH,
+                          provider=WrapperPropertyProvider()).snapshot(walk_tree)
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_parallel_walk(bench_calls, walk_tree, sequential_snapshot, workers):
+    engine = SnapshotEngine(max_root_depth=WALK_DEPTH + 2, max_web_length=WALK_BREADTH,
+                            provider=WrapperPropertyProvider(), workers=workers)
+
+    def run():
+        engine.reset()
+        return engine.snapshot(walk_tree)
+
+    assert bench_calls(walk_tree.tree, run, rounds=3, iterations=1) == sequential_snapshot
+
+
+@pytest.fixture(scope="module")
+def format_snapshot():
+    root = build_fake_tree(depth=FORMAT_DEPTH, breadth=FORMAT_BREADTH, control_types=("Group", "TreeItem", "Button", "Text"))
+    for node in root.iter_subtree():
+        if node.control_type == "TreeItem":
+            node.expanded = True
+    return SnapshotEngine(max_root_depth=FORMAT_DEPTH + 2, max_web_length=FORMAT_BREADTH).snapshot(root)
+
+
+def _response(snapshot, snapshot_format):
+    return json.dumps({"status": "success", "data": {"snapshot": encode_snapshot(snapshot, snapshot_format)}},
+                      ensure_ascii=False)
+
+
+@pytest.mark.parametrize("snapshot_format", SNAPSHOT_FORMATS)
+def test_encode(benchmark, format_snapshot, snapshot_format):
+    size = len(benchmark(_response, format_snapshot, snapshot_format).encode("utf-8"))
+    json_size = len(_response(format_snapshot, FORMAT_JSON).encode("utf-8"))
+    benchmark.extra_info.update(bytes=size, ratio=round(size / json_size, 3))
+
+
+@pytest.mark.parametrize("snapshot_format", SNAPSHOT_FORMATS)
+def test_decode(benchmark, format_snapshot, snapshot_format):
+    payload = _response(format_snapshot, snapshot_format)
+
+    def decode():
+        decoded = json.loads(payload)["data"]["snapshot"]
+        return decoded if snapshot_format == FORMAT_JSON else decode_compact(decoded)
+
+    assert benchmark(decode) == json.loads(json.dumps(format_snapshot)), f"{snapshot_format} does not round trip"
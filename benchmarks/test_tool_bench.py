@@ -0,0 +1,101 @@
+"""
+Latency of the real tool functions against the simulated UIA backend of
+fake_backend.py, with the UIA calls each run makes. Off Windows the settle
+wait polls the tree, capped by the fake session's quiet_ms.
+"""
+import json
+import logging
+
+import pytest
+
+import fake_backend
+from utils.response_format import format_tool_response
+from utils.snapshot import take_snapshot
+from utils.uia_cache import WrapperPropertyProvider
+
+DEPTH = 4
+BREADTH = 5
+LATENCY = 0.0  # seconds slept on every simulated UIA call
+
+
+@pytest.fixture
+def session():
+    logging.disable(logging.WARNING)
+    session = fake_backend.FakeSession(depth=DEPTH, breadth=BREADTH, latency=LATENCY, quiet_ms=20)
+    yield session
+    session.close()
+    logging.disable(logging.NOTSET)
+
+
+@pytest.mark.parametrize("provider", ["cache", "wrapper"])
+def test_snapshot_full(bench_calls, session, provider):
+    """Full snapshot of the window, nothing known from a previous walk: one prefetch per node, or one call per property."""
+    if provider == "wrapper":
+        session.manager.snapshot_engine.provider = WrapperPropertyProvider()
+
+    def run():
+        session.manager.snapshot_engine.reset()
+        return take_snapshot(session.browser_manager)
+
+    assert bench_calls(session.tree, run)["title"]
+
+
+def test_snapshot_diff(bench_calls, session):
+    """Diff snapshot after a scripted change (a panel opening / closing)."""
+    button = fake_backend.toggle_panel(session.window)
+    take_snapshot(session.browser_manager)
+
+    def run():
+        button.click_input()
+        session.manager.begin_tool_call()
+        return take_snapshot(session.browser_manager, diff=1)
+
+    assert "diff" in bench_calls(session.tree, run)
+
+
+def test_snapshot_unchanged(bench_calls, session):
+    """verify_element_exists passing the snapshot_hash of its previous, identical response."""
+    arguments = {"caller": "bench", "element_name": "Refresh", "control_type": "Button"}
+    last_hash = json.loads(session.call("verify_element_exists", **arguments))["data"]["snapshot"]["snapshot_hash"]
+    response = bench_calls(session.tree, lambda: session.call("verify_element_exists", snapshot_hash=last_hash, **arguments))
+    assert json.loads(response)["data"]["snapshot"]["unchanged"] is True
+
+
+@pytest.mark.parametrize("cache", ["warm", "cold"])
+def test_locator_search(bench_calls, session, cache):
+    """native_button_click on a toolbar button, with the locator cache warm or dropped before every run."""
+    def run():
+        if cache == "cold":
+            session.manager.locator_cache.invalidate("benchmark")
+        return session.call("native_button_click", caller="bench", name="Refresh", control_type="Button", need_snapshot=0)
+
+    assert json.loads(bench_calls(session.tree, run, rounds=20, warmup_rounds=2))["status"] == "success"
+
+
+@pytest.mark.parametrize("snapshot_format", ["json", "compact"])
+def test_response_format(benchmark, session, snapshot_format):
+    """format_tool_response of a response holding a full snapshot."""
+    snapshot = take_snapshot(session.browser_manager, snapshot_format=snapshot_format)
+    benchmark(format_tool_response, {"status": "success", "data": {"snapshot": snapshot}})
+
+
+def test_record_calls(bench_calls, session, tmp_path):
+    """native_button_click recorded for code generation (compare with test_locator_search)."""
+    session.call("before_gen_code", step_file=str(tmp_path / "steps" / "record_steps.py"))
+
+    def run():
+        result = session.call("native_button_click", caller="bench", name="Refresh", control_type="Button",
+                              need_snapshot=0, scenario="Benchmark", step_raw='When I click "Refresh"')
+        del session.manager.gen_code_cache[:-100]
+        return result
+
+    assert json.loads(bench_calls(session.tree, run, rounds=20, warmup_rounds=2))["status"] == "success"
+
+
+def test_gen_code_preview(benchmark, session, tmp_path):
+    """preview_code_changes over 20 recorded steps."""
+    session.call("before_gen_code", step_file=str(tmp_path / "steps" / "preview_steps.py"))
+    for i in range(20):
+        session.call("native_button_click", caller="bench", name="Refresh", control_type="Button", need_snapshot=0,
+                     scenario="Benchmark", step_raw=f'When I click "Refresh" {i} times')
+    benchmark(session.call, "preview_code_changes")
@@ -0,0 +1,34 @@
+"""
+Cost of handing work to a session's UI executor (utils.ui_executor): the
+round trip of a no-op call from the event loop to the worker thread and
+back, paid by every tool call. Event loop responsiveness while the worker
+is busy is checked in tests/test_ui_executor.py.
+"""
+import asyncio
+
+import pytest
+
+from utils.ui_executor import UIExecutor
+
+CALLS = 100
+
+
+@pytest.fixture
+def executor():
+    executor = UIExecutor("bench")
+    yield executor
+    executor.shutdown()
+
+
+def test_dispatch(benchmark, executor):
+    loop = asyncio.new_event_loop()
+
+    async def calls():
+        for _ in range(CALLS):
+            await executor.run(lambda: None)
+
+    try:
+        benchmark(lambda: loop.run_until_complete(calls()))
+    finally:
+        loop.close()
+    benchmark.extra_info["calls_per_round"] = CALLS
@@ -0,0 +1,80 @@
+"""
+Element lookups from a UIMirror against live child_window searches, on a
+synthetic tree from fake_uia.py where every call costs a simulated round
+trip. A live lookup scans the window (FakeWindowSpec.find walks every
+element, the cost of one UIA FindFirst on a large tree); a mirror lookup
+only pays for the subtrees events reported changed since the previous one.
+The consistency of the mirror is checked in tests/test_ui_mirror.py.
+"""
+import random
+
+import pytest
+
+from fake_uia import FakeTree, build_fake_tree, random_change
+from utils.ui_mirror import UIMirror
+from utils.wait_util import SimulatedEventSource
+
+DEPTH = 4
+BREADTH = 6
+LATENCY = 0.00005
+LOOKUPS = 50
+
+
+@pytest.fixture
+def window():
+    root = build_fake_tree(depth=DEPTH, breadth=BREADTH, tree=FakeTree(latency=LATENCY))
+    elements = [e for e in root.iter_subtree() if e is not root]
+    for i, element in enumerate(elements):
+        element.title = f"{element.title} #{i}"  # unique, so a lookup has a single answer
+    rng = random.Random(1)
+    return root, [rng.choice(elements) for _ in range(LOOKUPS)]
+
+
+def _criteria(element):
+    return {"title": element.title, "control_type": element.control_type}
+
+
+def _lookups(find, targets):
+    return sum(find(_criteria(target)) is target for target in targets)
+
+
+def test_initial_sync(bench_calls, window):
+    root, _ = window
+
+    def sync():
+        mirror = UIMirror(root, SimulatedEventSource())
+        mirror.refresh()
+        return len(mirror)
+
+    assert bench_calls(root.tree, sync, rounds=5) == sum(1 for _ in root.iter_subtree())
+
+
+def test_live_child_window(bench_calls, window):
+    root, targets = window
+    assert bench_calls(root.tree, lambda: _lookups(lambda c: root.child_window(**c).find(), targets), rounds=3) == LOOKUPS
+
+
+def test_mirror(bench_calls, window):
+    root, targets = window
+    mirror = UIMirror(root, SimulatedEventSource())
+    mirror.refresh()
+    assert bench_calls(root.tree, lambda: _lookups(mirror.find, targets)) == LOOKUPS
+    mirror.close()
+
+
+def test_mirror_one_change_per_lookup(bench_calls, window):
+    """The same lookups with a random change reported before each of them."""
+    root, targets = window
+    events = SimulatedEventSource()
+    mirror = UIMirror(root, events)
+    mirror.refresh()
+    rng, counter = random.Random(2), [0]
+
+    def run():
+        for target in targets:
+            random_change(rng, root, events, counter)
+            if target.alive:
+                mirror.find(_criteria(target))
+
+    bench_calls(root.tree, run, rounds=3)
+    mirror.close()
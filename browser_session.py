@@ -4,13 +4,24 @@ import os
 import psutil
 import time
 import logging
-import shutil
-import tempfile
-import uuid
+import contextlib
+import contextvars
+import functools
+import threading
+from collections import deque
 from pathlib import Path
 from datetime import datetime
-from pywinauto import Application, Desktop
+from pywinauto import Application, Desktop, handleprops
 from pywinauto.controls.uiawrapper import UIAWrapper
+from utils.locator import LocatorCache
+from utils.metrics import metrics, PHASE_ACTION, PHASE_SETTLE, PHASE_WINDOW
+from utils.profile_cache import ProfileCache
+from utils.snapshot import SnapshotEngine
+from utils.snapshot_handles import SnapshotHandles
+from utils.ui_mirror import UIMirror
+from utils.ui_executor import UIExecutor
+from utils.warm_pool import WarmBrowserPool
+from utils.wait_util import create_event_source, wait_for_ui, UNTIL_STABLE, DEFAULT_QUIET_MS, DEFAULT_SETTLE_TIMEOUT
 
 
 logger = logging.getLogger(__name__)
@@ -25,7 +36,7 @@ BROWSER_CONFIGS = {
         "window_title_re": ".*Microsoft.*Edge Beta"
     },
     "edge-canary": {
-        "exe": os.path.join(os.environ['LOCALAPPDATA'], r"Microsoft\Edge SxS\Application\msedge.exe"),
+        "exe": os.path.join(os.environ.get('LOCALAPPDATA', ''), r"Microsoft\Edge SxS\Application\msedge.exe"),
         "window_title_re": ".*Microsoft.*Edge Canary"
     },
     "chrome": {
@@ -41,17 +52,110 @@ LAUNCH_ARGS = ['--no-first-run',
             #    r'--user-data-dir="C:\Users\toyu\code\edgeinternal.quality-toolkit\auto-mcp-demo\behave_demo\test_data\test_000"',
             #    '--start-maximized',
                ]
+
+DEBUG_PORT_BASE = 9222
+DEFAULT_SESSION_ID = ""
+BROWSER_SLOT_TIMEOUT = 600  # how long a launch may queue for a free browser slot, in seconds
+
+profile_cache = ProfileCache()  # per-run profile clones shared by all sessions
+
+
+def build_launch_cmd(exe_path, args, url="", user_data_dir=None):
+    cmd = f'{exe_path}'
+    if args:
+        cmd += " " + " ".join(args)
+    if url:
+        cmd += f" {url}"
+    if user_data_dir:
+        cmd += f' --user-data-dir="{user_data_dir}"'
+    return cmd
+
+
+def with_debug_port(args, debug_port):
+    port_arg = f"--remote-debugging-port={debug_port}"
+    return [port_arg if arg.startswith("--remote-debugging-port=") else arg for arg in args]
+
+
+class ProcessLauncher:
+    """Starts a browser on its own profile and waits for its main window, for the warm pool."""
+    def __init__(self, browser, args=LAUNCH_ARGS, timeout=15):
+        self.config = BROWSER_CONFIGS[browser]
+        self.args = args
+        self.timeout = timeout
+
+    def launch(self, user_data_dir, debug_port):
+        cmd = build_launch_cmd(self.config["exe"], with_debug_port(self.args, debug_port), user_data_dir=user_data_dir)
+        logger.info(f"[ProcessLauncher] Launching: {cmd}")
+        app = Application(backend="uia").start(cmd)
+        main_window = app.window(title_re=self.config["window_title_re"], control_type="Window")
+        try:
+            main_window.wait("exists visible enabled", timeout=self.timeout)
+        except Exception:
+            app.kill()
+            raise
+        return app
             
 
 
+class BrowserSlots:
+    """
+    Caps the number of browsers running at the same time.
+
+    Launches beyond the cap wait in FIFO order until a running browser is
+    closed, or fail after ``timeout`` seconds.
+    """
+    def __init__(self, limit, timeout=BROWSER_SLOT_TIMEOUT):
+        self.limit = limit
+        self.timeout = timeout
+        self._in_use = 0
+        self._waiting = deque()
+        self._cond = threading.Condition()
+
+    def acquire(self, owner):
+        with self._cond:
+            self._waiting.append(owner)
+            if self._waiting[0] is not owner or self._in_use >= self.limit:
+                logger.info(f"[BrowserSlots] Session '{owner}' queued: {self._in_use}/{self.limit} browsers running, {len(self._waiting)} waiting")
+            try:
+                ready = self._cond.wait_for(lambda: self._waiting[0] is owner and self._in_use < self.limit, self.timeout)
+                if not ready:
+                    raise TimeoutError(f"No free browser slot for session '{owner}' after {self.timeout} seconds")
+                self._in_use += 1
+            finally:
+                self._waiting.remove(owner)
+                self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._in_use = max(0, self._in_use - 1)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"limit": self.limit, "running": self._in_use, "waiting": len(self._waiting)}
+
+
 class BrowserSessionManager:
-    def __init__(self, browser: str):
+    def __init__(self, browser: str, session_id: str = DEFAULT_SESSION_ID, isolated: bool = False,
+                 debug_port: int = DEBUG_PORT_BASE, slots: BrowserSlots = None):
         if browser not in BROWSER_CONFIGS:
             raise ValueError(f"Unsupported browser: {browser}")
         
         self._app = None  # Application instance
         self.browser = browser
         self.config = BROWSER_CONFIGS[browser]
+        self.session_id = session_id
+        self.isolated = isolated  # own profile and process, never attach to or kill other browsers
+        self.debug_port = debug_port
+        self._slots = slots
+        self._has_slot = False
+        self.warm_pool = None  # WarmBrowserPool handing out pre-launched browsers, isolated sessions only
+        self._warm_port = None  # debug port of the warm browser in use, given back on close
+        self._pinned_window = None  # main window reused by every lookup inside pinned_main_window()
+        self._main_hwnd = None  # handle the main window was resolved to
+        self._main_window = None  # window specification bound to _main_hwnd
+        self.main_window_hits = 0
+        self.main_window_misses = 0
 
         self.gen_code_id = None
         self.gen_code_cache = []
@@ -61,6 +165,20 @@ class BrowserSessionManager:
         self.step_file_target = None  # Target step file for code generation
 
         self.user_data_dir = None  # Directory for user data, if needed
+
+        self.snapshot_engine = SnapshotEngine()  # Keeps the previous UI tree for incremental snapshots
+        self.scoped_snapshot_engines = {}  # SnapshotScope.engine_key() -> engine of snapshots with a snapshot_scope
+        self.snapshot_handles = SnapshotHandles()  # Recent snapshots kept for expand_node
+        self.ui_events = None  # Event source of the main window, created by the first mark_ui()
+        self.event_driven_snapshots = False  # Let snapshots skip subtrees no event reported as changed
+        self.mirror_lookups = False  # Answer element lookups from a UIMirror kept up to date by UIA events
+        self.ui_mirror = None  # UIMirror of the main window, created by the first lookup when mirror_lookups is set
+        self.settle_timeout = DEFAULT_SETTLE_TIMEOUT  # Upper bound of wait_for_ui in seconds
+        self.snapshot_workers = 1  # Threads walking the top-level subtrees of a snapshot
+        self._action_started = None  # perf_counter of the last mark_ui, the action phase ends at wait_for_ui
+        self._ui_epoch = 0  # Moves whenever the UI may have changed since the last snapshot, see ui_epoch()
+        self.locator_cache = LocatorCache()  # Search criteria -> resolved element
+        self.executor = UIExecutor(f"{browser}-{session_id}" if session_id else browser)  # Worker thread that owns every pywinauto call of this session
    
 
     def start_and_get_new_browser_window(exe_path="msedge.exe", title_re=".*Edge.*", timeout=15):
@@ -89,36 +207,71 @@ class BrowserSessionManager:
         if not user_data_dir.exists():
             raise FileNotFoundError(f"custom_user_data_dir does not exist: {user_data_dir}")
 
-        temp_root = Path(tempfile.gettempdir()).resolve()
-
-        dest_dir_name = "win_auto_mcp_user_data_" + user_data_dir.name + "_" + str(uuid.uuid1())
-        dest_dir = temp_root / dest_dir_name
-        if dest_dir.exists():
-            shutil.rmtree(dest_dir)
-        logger.info(f"[BrowserManager] Copying user data from \n{user_data_dir} \nto \n{dest_dir}")
-        shutil.copytree(user_data_dir, dest_dir)
+        dest_dir = profile_cache.clone(user_data_dir)
+        logger.info(f"[BrowserManager] Cloned user data from \n{user_data_dir} \nto \n{dest_dir}")
         return dest_dir
 
    
+    def _launch_args(self, args: list[str]):
+        if not self.isolated:
+            return args
+        return with_debug_port(args, self.debug_port)
+
+    def _take_slot(self):
+        if self._slots and not self._has_slot:
+            self._slots.acquire(self.session_id)
+            self._has_slot = True
+
+    def _launch_warm(self, custom_user_data_dir: str = None):
+        """Adopt an idle pre-launched browser, False when the warm pool has none ready."""
+        warm = self.warm_pool.take(custom_user_data_dir)
+        if warm is None:
+            return False
+        self._take_slot()
+        self.reset_ui_state()
+        self._app = warm.app
+        self.user_data_dir = warm.user_data_dir
+        self._warm_port = warm.debug_port
+        logger.info(f"[BrowserManager] Session '{self.session_id}' took {warm}")
+        return True
+
     def _new_launch(self, url: str, args: list[str], custom_user_data_dir: str = None):
+        self._take_slot()
+        started = None
+        try:
+            cmd = self._launch_cmd(url, args, custom_user_data_dir)
+            logger.info(f"[BrowserManager] Launching new {self.browser}: {cmd}")
+            self.reset_ui_state()
+            started = Application(backend="uia").start(cmd)
+            self._wait_for_window(started, cmd)
+        except Exception as e:
+            # give back the slot and the profile clone, and stop what was started, or the pool stays one short
+            logger.error(f"[BrowserManager] Launching new {self.browser} failed, cleaning up: {repr(e)}")
+            self._app = self._app or started
+            try:
+                self.browser_close()
+            except Exception as close_error:
+                logger.error(f"[BrowserManager] Cleanup after the failed launch failed: {repr(close_error)}")
+            raise
+
+    def _launch_cmd(self, url: str, args: list[str], custom_user_data_dir: str = None):
         if custom_user_data_dir:
             self.user_data_dir = self.copy_user_data_to_temp(Path(custom_user_data_dir).resolve())
+        elif self.isolated and not self.user_data_dir:
+            self.user_data_dir = profile_cache.empty(prefix=f"win_auto_mcp_session_{self.session_id}_")
+        args = self._launch_args(args)
             
-        exe_path = self.config["exe"]
-        cmd = f'{exe_path}'
-        if args:
-            cmd += " " + " ".join(args)
-        if url:
-            cmd += f" {url}"
-        if self.user_data_dir:
-            cmd += f' --user-data-dir="{self.user_data_dir}"'
+        return build_launch_cmd(self.config["exe"], args, url, self.user_data_dir)
 
-        logger.info(f"[BrowserManager] Launching new {self.browser}: {cmd}")
-        Application(backend="uia").start(cmd)
+    def _wait_for_window(self, started, cmd):
         for i in range(5):
             time.sleep(1)
             try:
-                self._app = Application(backend="uia").connect(title_re=self.config["window_title_re"])
+                if self.isolated:
+                    # the profile is ours alone, so the started process is the browser itself
+                    self._app = started
+                else:
+                    self._app = Application(backend="uia").connect(title_re=self.config["window_title_re"])
                 main_window = self._app.window(title_re=self.config["window_title_re"], control_type="Window")
                 main_window.wait("exists", timeout=1)
                 logger.info(f"[BrowserManager] Launching new {self.browser}: exists done")
@@ -126,18 +279,26 @@ class BrowserSessionManager:
                 logger.info(f"[BrowserManager] Launching new {self.browser}: visible done")
                 main_window.wait("enabled", timeout=1)
                 logger.info(f"[BrowserManager] Launching new {self.browser}: done")
-                break
+                return
             except Exception as e:
                 logger.error(f"[BrowserManager] Launching new {self.browser} error: {repr(e)}")
                 pass
-            
+        raise TimeoutError(f"No {self.browser} window appeared after starting: {cmd}")
 
     def browser_launch(self, url: str = "", args: list[str] = LAUNCH_ARGS, kill_existing: int = 0, custom_user_data_dir: str = None):
         if kill_existing == 1 or custom_user_data_dir:
             self.clear_gen_code_cache()
             self.browser_close()
-            self.kill_browser_process_by_path()
+            if not self.isolated:
+                self.kill_browser_process_by_path()
         is_new_launch = False
+        if self.isolated:
+            if self._app and self._app.is_process_running():
+                return is_new_launch
+            if self.warm_pool and not url and self._launch_warm(custom_user_data_dir):
+                return True
+            self._new_launch(url, args, custom_user_data_dir)
+            return True
         try:
             self._app = Application(backend="uia").connect(title_re=self.config["window_title_re"])
             if self._app:
@@ -153,11 +314,23 @@ class BrowserSessionManager:
             
         
     def browser_close(self):
+        self.reset_ui_state()
         if self._app:
             self._app.kill()
             self._app = None
         else:
             logger.warning("No browser session to close.")
+        if self.user_data_dir:
+            # the browser is gone, so is its profile clone; every launch of an isolated
+            # session starts from a fresh profile, the default one from its own again
+            profile_cache.release(self.user_data_dir)
+            self.user_data_dir = None
+        if self._warm_port is not None:
+            self.warm_pool.give_back_port(self._warm_port)
+            self._warm_port = None
+        if self._has_slot:
+            self._has_slot = False
+            self._slots.release()
 
     def kill_browser_process_by_path(self):
         exe_path = os.path.normcase(os.path.normpath(self.config["exe"]))
@@ -177,19 +350,154 @@ class BrowserSessionManager:
             time.sleep(2) 
 
 
+    @metrics.timed(PHASE_WINDOW)
     def get_main_window(self):
+        if self._pinned_window is not None:
+            return self._pinned_window
         time_s = time.time()
         no_app = False
         if not self._app:
             no_app = True
             self.browser_launch()        
-        
+
+        if self._main_hwnd is not None and self._main_window_alive():
+            self.main_window_hits += 1
+            return self._main_window
+
+        self.main_window_misses += 1
         main_window = self._app.window(title_re=self.config["window_title_re"], control_type="Window")
-        # time.sleep(1)
-        logger.info(f"get_main_window cost: NO_APP={no_app}, cost={int(time.time() - time_s)}, main_window={main_window}")
-        logger.info(f"get_main_window cost: NO_APP={no_app}, cost={int(time.time() - time_s)}")
+        try:
+            # resolve the title regex once, later calls only check the handle
+            hwnd = main_window.wrapper_object().handle
+            if hwnd:
+                self._main_hwnd = hwnd
+                self._main_window = main_window = self._app.window(handle=hwnd)
+        except Exception as e:
+            logger.warning(f"get_main_window: resolving the main window failed, returning the unresolved lookup: {repr(e)}")
+        logger.info(f"get_main_window cost: NO_APP={no_app}, cost={time.time() - time_s:.3f}s, hwnd={self._main_hwnd}, "
+                    f"hits={self.main_window_hits}, misses={self.main_window_misses}")
         return main_window
+
+    def _main_window_alive(self):
+        """Cheap check that the cached handle is still a window of our browser process."""
+        try:
+            return handleprops.iswindow(self._main_hwnd) and handleprops.processid(self._main_hwnd) == self._app.process
+        except Exception:
+            return False
+
+    def main_window_stats(self):
+        return {"hwnd": self._main_hwnd, "hits": self.main_window_hits, "misses": self.main_window_misses}
     
+    @contextlib.contextmanager
+    def pinned_main_window(self):
+        """Resolve the main window once and hand the same one to every get_main_window() inside the block."""
+        outer = self._pinned_window
+        self._pinned_window = outer or self.get_main_window()
+        try:
+            yield self._pinned_window
+        finally:
+            self._pinned_window = outer
+
+    def reset_ui_state(self):
+        self._pinned_window = None
+        self._main_hwnd = None
+        self._main_window = None
+        self._ui_epoch += 1
+        self.snapshot_engine.reset()
+        self.scoped_snapshot_engines.clear()
+        self.snapshot_handles.clear()
+        self.locator_cache.invalidate("browser restarted")
+        if self.ui_mirror:
+            self.ui_mirror.close()
+            self.ui_mirror = None
+        if self.ui_events:
+            self.ui_events.close()
+            self.ui_events = None
+
+    def notify_navigation(self):
+        """The page was replaced: elements resolved in it are gone."""
+        self._ui_epoch += 1
+        self.locator_cache.invalidate("navigation")
+        if self.ui_mirror:
+            self.ui_mirror.invalidate()
+
+    def event_source(self):
+        """Event source of the main window, created on first use."""
+        if self.ui_events is None:
+            self.ui_events = create_event_source(self.get_main_window().wrapper_object())
+            # the previous snapshot predates the event source, so it cannot be trusted for dirty tracking
+            self.snapshot_engine.reset()
+            self.scoped_snapshot_engines.clear()
+        return self.ui_events
+
+    def mirror_for(self, parent):
+        """
+        UIMirror answering lookups under ``parent``, or None: only searches from
+        the main window are mirrored, and only while UIA events keep it current.
+        """
+        if not self.mirror_lookups or parent is None \
+                or (parent is not self._main_window and parent is not self._pinned_window):
+            return None
+        if not self.event_source().live:
+            return None
+        if self.ui_mirror is None:
+            self.ui_mirror = UIMirror(parent.wrapper_object(), self.ui_events)
+        return self.ui_mirror
+
+    def mark_ui(self):
+        """Event sequence number to pass to wait_for_ui, taken right before sending an action."""
+        mark = self.event_source().mark()
+        self._ui_epoch += 1
+        self._action_started = time.perf_counter()
+        return mark
+
+    def wait_for_ui(self, mark, until=UNTIL_STABLE, quiet_ms=DEFAULT_QUIET_MS, timeout=None):
+        """Wait until the UI settles after the action sent after ``mark``, see utils.wait_util.wait_for_ui."""
+        if self._action_started is not None:
+            metrics.record(PHASE_ACTION, time.perf_counter() - self._action_started)
+            self._action_started = None
+        with metrics.phase(PHASE_SETTLE):
+            result = wait_for_ui(self.ui_events, mark, until=until, quiet_ms=quiet_ms,
+                                 timeout=timeout if timeout is not None else self.settle_timeout)
+        logger.info(f"wait_for_ui: until={until}, result={result}")
+        return result
+
+    def begin_tool_call(self):
+        """
+        A new tool call starts. Unless UI events are delivered live, nothing
+        tells whether the page changed by itself since the previous call.
+        """
+        if not (self.ui_events and self.ui_events.live):
+            self._ui_epoch += 1
+
+    def ui_epoch(self):
+        """
+        Snapshots taken in the same epoch see the same UI and share one walk.
+        The epoch moves with every action (mark_ui), navigation, browser
+        restart and tool call, and with every UI event when they are live.
+        """
+        events = self.ui_events.mark() if self.ui_events and self.ui_events.live else None
+        return self._ui_epoch, events
+
+    def snapshot_engine_for(self, scope):
+        """Engine keeping the previous snapshot of ``scope`` (a utils.snapshot.SnapshotScope)."""
+        key = scope.engine_key()
+        if key is None:
+            engine = self.snapshot_engine
+        else:
+            engine = self.scoped_snapshot_engines.get(key)
+            if engine is None:
+                engine = self.scoped_snapshot_engines[key] = scope.new_engine()
+        engine.workers = self.snapshot_workers
+        return engine
+
+    def drain_dirty_ids(self):
+        """Runtime ids changed since the previous call, or None when snapshots must visit every node."""
+        if self.ui_events is None:
+            return None
+        dirty = self.ui_events.drain_dirty()
+        return dirty if self.event_driven_snapshots else None
+
     def push_data_to_gen_code(self, caller, tool_name, step, scenario, param=None):
         if self.gen_code_id:
             data = {
@@ -211,3 +519,102 @@ class BrowserSessionManager:
         self.header_code = ''
         self.steps_dir = None
         self.step_file_target = None
+
+
+
+current_session = contextvars.ContextVar("current_session")
+
+
+class BrowserSessionPool:
+    """
+    Browser sessions keyed by the ``session_id`` tools are called with.
+
+    The default session (empty id) behaves like the single global manager
+    did: it shares the user's profile and attaches to any running browser.
+    Named sessions are isolated - own temporary profile, own debugging port,
+    own process handle and code-gen state - so several behave runners can
+    drive their own browser on one host. At most ``max_browsers`` browsers
+    run at once; further launches queue in ``BrowserSlots``.
+
+    With a ``warm_pool`` every session, the default one included, is
+    isolated and ``browser_launch`` adopts one of its idle browsers when
+    one is ready.
+    """
+    def __init__(self, browser: str, max_browsers: int = 1, slot_timeout: float = BROWSER_SLOT_TIMEOUT,
+                 warm_pool: WarmBrowserPool = None, **session_options):
+        self.browser = browser
+        self.slots = BrowserSlots(max_browsers, slot_timeout)
+        self.warm_pool = warm_pool
+        self.session_options = session_options  # attributes applied to every new session
+        self._sessions = {}
+        self._next_port = DEBUG_PORT_BASE + 1
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str = DEFAULT_SESSION_ID) -> BrowserSessionManager:
+        session_id = session_id or DEFAULT_SESSION_ID
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                if session_id == DEFAULT_SESSION_ID and self.warm_pool is None:
+                    session = BrowserSessionManager(self.browser, slots=self.slots)
+                elif session_id == DEFAULT_SESSION_ID:
+                    session = BrowserSessionManager(self.browser, isolated=True, slots=self.slots)
+                else:
+                    session = BrowserSessionManager(self.browser, session_id=session_id, isolated=True,
+                                                    debug_port=self._next_port, slots=self.slots)
+                    self._next_port += 1
+                session.warm_pool = self.warm_pool
+                for name, value in self.session_options.items():
+                    setattr(session, name, value)
+                self._sessions[session_id] = session
+                logger.info(f"[BrowserSessionPool] New session '{session_id}', {len(self._sessions)} sessions")
+            return session
+
+    def sessions(self):
+        with self._lock:
+            return dict(self._sessions)
+
+    def stats(self):
+        stats = {"sessions": len(self.sessions()), **self.slots.stats()}
+        if self.warm_pool:
+            stats["warm_pool"] = self.warm_pool.stats()
+        return stats
+
+
+class CurrentSession:
+    """
+    Stand-in for a BrowserSessionManager that forwards to the session the
+    running tool call is bound to (see ``with_session``), or to the default
+    session outside of a tool call. Tools keep using ``browser_manager.xxx``.
+    """
+    def __init__(self, pool: BrowserSessionPool):
+        object.__setattr__(self, "pool", pool)
+
+    def _session(self):
+        return current_session.get(None) or self.pool.get()
+
+    def __getattr__(self, name):
+        return getattr(self._session(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._session(), name, value)
+
+
+def with_session(browser_manager):
+    """Bind the tool call to the session named by its ``session_id`` argument."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            pool = getattr(browser_manager, "pool", None)
+            if pool is None:
+                browser_manager.begin_tool_call()
+                return await func(*args, **kwargs)
+            session = pool.get(kwargs.get("session_id", DEFAULT_SESSION_ID))
+            session.begin_tool_call()
+            token = current_session.set(session)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                current_session.reset(token)
+        return wrapper
+    return decorator
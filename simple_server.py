@@ -4,12 +4,18 @@ import logging
 import sys
 import argparse
 from mcp.server.fastmcp import FastMCP
-from browser_session import BrowserSessionManager
+from browser_session import BrowserSessionPool, CurrentSession, ProcessLauncher, profile_cache
+from tools.batch_tool import register_batch_tools
 from tools.browser_tool import register_browser_tools
 from tools.gen_code_tool import register_gen_code_tools
+from tools.metrics_tool import register_metrics_tools
 from tools.mouse_tool import register_mouse_tools
+from tools.snapshot_tool import register_snapshot_tools
 from tools.verify_tool import register_verify_tools
-from utils.logger import log_tool_call
+from utils.logger import LOG_FORMATS, log_tool_call, set_log_format
+from utils.metrics import metrics, DEFAULT_DUMP_INTERVAL
+from utils.wait_util import DEFAULT_SETTLE_TIMEOUT
+from utils.warm_pool import WarmBrowserPool
 
 settings = {
     "log_level": "DEBUG"
@@ -25,14 +31,54 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--browser", choices=["edge", "edge-beta"], default="edge")
     parser.add_argument("--transport", choices=["stdio", "sse"], default="sse")
+    parser.add_argument("--settle-timeout", type=float, default=DEFAULT_SETTLE_TIMEOUT,
+                        help="Upper bound in seconds of the wait for the UI to settle after an action")
+    parser.add_argument("--event-snapshots", action="store_true",
+                        help="Only re-walk the subtrees reported changed by UIA events when taking snapshots")
+    parser.add_argument("--ui-mirror", action="store_true",
+                        help="Answer element lookups from an in-process copy of the window kept up to date by UIA events")
+    parser.add_argument("--snapshot-workers", type=int, default=1,
+                        help="Threads walking the top-level subtrees of a snapshot when UIA properties are read node by node")
+    parser.add_argument("--max-browsers", type=int, default=1,
+                        help="How many browsers the sessions of parallel runners may keep open at once; further launches wait")
+    parser.add_argument("--warm-pool", type=int, default=0,
+                        help="Keep this many browsers launched and idle so browser_launch returns at once (0: off)")
+    parser.add_argument("--warm-profile", default=None,
+                        help="User data directory the warm browsers are cloned from (default: empty profile)")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default=None,
+                        help="Log output: text lines or JSON lines (default: MCP_LOG_FORMAT or text)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Write the per tool / phase latency histograms to this JSON file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_DUMP_INTERVAL,
+                        help="Seconds between two writes of --metrics-file")
     args = parser.parse_args()
+    if args.log_format:
+        set_log_format(args.log_format)
     
-    browser_manager = BrowserSessionManager(args.browser)
+    warm_pool = None
+    if args.warm_pool > 0:
+        warm_pool = WarmBrowserPool(args.warm_pool, ProcessLauncher(args.browser), profile_cache,
+                                    profile_source=args.warm_profile, port_count=args.warm_pool + args.max_browsers)
+        profile_cache.max_clones = max(profile_cache.max_clones, 2 * (args.warm_pool + args.max_browsers))
+        warm_pool.start()
+
+    pool = BrowserSessionPool(args.browser, max_browsers=args.max_browsers, warm_pool=warm_pool,
+                              settle_timeout=args.settle_timeout,
+                              event_driven_snapshots=args.event_snapshots,
+                              mirror_lookups=args.ui_mirror,
+                              snapshot_workers=args.snapshot_workers)
+    browser_manager = CurrentSession(pool)
 
     register_browser_tools(mcp, browser_manager)
     register_mouse_tools(mcp, browser_manager)
     register_gen_code_tools(mcp, browser_manager)
     register_verify_tools(mcp, browser_manager)
+    register_batch_tools(mcp, browser_manager)
+    register_metrics_tools(mcp, browser_manager)
+    register_snapshot_tools(mcp, browser_manager)
+
+    if args.metrics_file:
+        metrics.start_dump(args.metrics_file, args.metrics_interval)
 
     mcp.run(args.transport)
 
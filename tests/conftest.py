@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_backend
+
+# the server modules import pywinauto at module level
+fake_backend.install()
+
+
+@pytest.fixture
+def fake_session():
+    """The registered tools bound to a simulated browser window, see benchmarks/fake_backend.py."""
+    session = fake_backend.FakeSession(depth=2, breadth=3)
+    session.window.handle = 1  # lets get_main_window settle on the fake window
+    yield session
+    session.close()
@@ -0,0 +1,39 @@
+import json
+
+import fake_backend
+
+
+def _record_waits(session):
+    results = []
+    wait_for_ui = session.manager.wait_for_ui
+
+    def recording_wait(*args, **kwargs):
+        result = wait_for_ui(*args, **kwargs)
+        results.append(result)
+        return result
+
+    session.manager.wait_for_ui = recording_wait
+    return results
+
+
+def test_click_waits_for_the_change_it_caused(fake_session):
+    fake_backend.toggle_panel(fake_session.window)
+    waits = _record_waits(fake_session)
+    response = json.loads(fake_session.call("native_button_click", caller="test", name="Favorites",
+                                            control_type="Button", need_snapshot=0))
+    assert response["status"] == "success"
+    assert any(child.title == "Favorites panel" for child in fake_session.window._children)
+    (wait,) = waits
+    assert wait.events >= 1
+    # quiet_ms is 20 in the fake session: the wait ends with the quiet window, not a fixed sleep
+    assert wait.waited < 0.3
+
+
+def test_hover_waits_for_a_structure_change_only_up_to_its_timeout(fake_session):
+    waits = _record_waits(fake_session)
+    response = json.loads(fake_session.call("mouse_hover", caller="test", name="Refresh",
+                                            control_type="Button", need_snapshot=0))
+    assert response["status"] == "success"
+    (wait,) = waits
+    assert wait.reason == "timeout"
+    assert wait.waited < 1
@@ -0,0 +1,55 @@
+import os
+import types
+
+import pytest
+
+import browser_session
+from browser_session import BrowserSessionManager, BrowserSlots
+
+
+def _manager():
+    return BrowserSessionManager("edge", session_id="s1", isolated=True, slots=BrowserSlots(1, timeout=0.1))
+
+
+def test_failed_start_gives_back_the_slot_and_the_profile():
+    manager = _manager()
+    with pytest.raises(RuntimeError):
+        manager._new_launch("", [])  # Application is unavailable in the simulated backend
+    assert manager._slots.stats()["running"] == 0
+    assert manager.user_data_dir is None
+
+
+def test_launch_without_a_window_raises_and_stops_the_browser(monkeypatch):
+    killed = []
+
+    class NoWindow:
+        def window(self, **criteria):
+            raise LookupError("no window yet")
+
+        def kill(self):
+            killed.append(self)
+
+    monkeypatch.setattr(browser_session, "Application",
+                        lambda backend=None: types.SimpleNamespace(start=lambda cmd: NoWindow()))
+    monkeypatch.setattr(browser_session.time, "sleep", lambda seconds: None)
+    manager = _manager()
+    with pytest.raises(TimeoutError):
+        manager._new_launch("", [])
+    assert len(killed) == 1
+    assert manager._app is None
+    assert manager._slots.stats()["running"] == 0
+    # the next launch can take the slot again
+    manager._take_slot()
+    assert manager._slots.stats()["running"] == 1
+
+
+def test_failed_launch_removes_the_profile_clone(monkeypatch):
+    monkeypatch.setattr(browser_session.time, "sleep", lambda seconds: None)
+    manager = _manager()
+    dirs = []
+    monkeypatch.setattr(manager, "_wait_for_window", lambda started, cmd: dirs.append(manager.user_data_dir) or 1 / 0)
+    monkeypatch.setattr(browser_session, "Application",
+                        lambda backend=None: types.SimpleNamespace(start=lambda cmd: types.SimpleNamespace(kill=lambda: None)))
+    with pytest.raises(ZeroDivisionError):
+        manager._new_launch("", [])
+    assert dirs and not os.path.exists(dirs[0])
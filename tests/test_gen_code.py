@@ -0,0 +1,42 @@
+import ast
+
+from utils.gen_code import generate_batch_step_definition, generate_step_definition
+
+
+def _call(tool_name, **tool_params):
+    return {"tool_name": tool_name, "step_type": "when", "tool_params": dict(caller="test", need_snapshot=1, **tool_params)}
+
+
+def test_batch_step_is_parameterized_like_a_single_call():
+    steps = [_call("native_button_click", name="Save", control_type="Button"),
+             _call("verify_element_exists", element_name="Saved", control_type="Text")]
+    steps[0]["step_text_raw"] = 'I click "Save" and see "Saved"'
+    code = generate_batch_step_definition(steps)
+
+    assert "@when('I click \"{param1}\" and see \"{param2}\"')" in code
+    assert "def step_impl(context, param1, param2):" in code
+    assert "'name': param1" in code
+    assert "'element_name': param2" in code
+    assert "'control_type': 'Button'" in code
+    ast.parse(code)
+
+
+def test_batch_step_keeps_the_raw_text_when_a_value_is_not_an_argument():
+    steps = [_call("native_button_click", name="Save", control_type="Button"),
+             _call("keyboard_input", name="ctrl+s")]
+    steps[0]["step_text_raw"] = 'I click "Save" on "the toolbar"'
+    code = generate_batch_step_definition(steps)
+
+    assert "@when('I click \"Save\" on \"the toolbar\"')" in code
+    assert "def step_impl(context):" in code
+    assert "'name': 'Save'" in code
+    ast.parse(code)
+
+
+def test_single_call_step_definition():
+    step = _call("native_button_click", name="Save")
+    step.update(step_text_raw='I click "Save"', step_text_parameterized='I click "{param}"',
+                parameterized_args={"param": "Save"})
+    code = generate_step_definition(step)
+    assert "def step_impl(context, param):" in code
+    assert "'name': param" in code
@@ -0,0 +1,46 @@
+import types
+
+from fake_uia import FakeElement, FakeTree
+from utils.locator import LocatorCache, find_element, parent_key
+
+
+def _manager():
+    return types.SimpleNamespace(locator_cache=LocatorCache(), ui_events=None, mirror_for=lambda parent: None)
+
+
+def _dialog(tree, title):
+    dialog = FakeElement(title=title, control_type="Window", tree=tree)
+    button = dialog.add_child(title="OK", control_type="Button")
+    return dialog, button
+
+
+def test_same_criteria_under_another_parent_is_another_entry():
+    tree = FakeTree()
+    first, first_ok = _dialog(tree, "First")
+    second, second_ok = _dialog(tree, "Second")
+    manager = _manager()
+    criteria = {"title": "OK", "control_type": "Button"}
+
+    assert find_element(manager, first, criteria) is first_ok
+    assert find_element(manager, second, criteria) is second_ok
+    assert find_element(manager, first, criteria) is first_ok
+    assert manager.locator_cache.stats()["entries"] == 2
+
+
+def test_selector_entries_are_scoped_to_the_parent():
+    tree = FakeTree()
+    first, first_ok = _dialog(tree, "First")
+    second, second_ok = _dialog(tree, "Second")
+    manager = _manager()
+
+    assert find_element(manager, first, 'Button[title^="O"]') is first_ok
+    assert find_element(manager, second, 'Button[title^="O"]') is second_ok
+
+
+def test_window_spec_key_needs_no_ui_call():
+    tree = FakeTree()
+    dialog, _ = _dialog(tree, "First")
+    spec = dialog.child_window(title="First", control_type="Window")
+    tree.reset_calls()
+    assert parent_key(spec) == parent_key(dialog.child_window(control_type="Window", title="First"))
+    assert tree.calls == 0
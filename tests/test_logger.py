@@ -0,0 +1,47 @@
+import json
+import logging
+
+from utils import logger as log
+
+
+def _output(record, log_format):
+    """What the file and console handlers write for ``record`` after it went through the queue."""
+    prepared = log._queue_handler.prepare(record)
+    formatter = log._formatter(log_format)
+    formatter.formatTime = lambda record, datefmt=None: "TIME"
+    return formatter.format(prepared)
+
+
+def _record(msg, *args, **extra):
+    record = logging.LogRecord("browser_session", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_plain_record_text():
+    assert _output(_record("Opened %s", "page"), log.LOG_FORMAT_TEXT) == \
+        "TIME - browser_session - INFO - Opened page"
+
+
+def test_plain_record_json():
+    assert json.loads(_output(_record("Opened %s", "page"), log.LOG_FORMAT_JSON)) == \
+        {"time": "TIME", "level": "INFO", "logger": "browser_session", "message": "Opened page"}
+
+
+def test_lazy_record_text():
+    params = log.LazyJson({"title": "OK"})
+    record = _record("Parameters: %s", params, lazy=True, fields={"tool": "click", "params": params})
+    assert _output(record, log.LOG_FORMAT_TEXT) == 'TIME - browser_session - INFO - Parameters: {"title": "OK"}'
+
+
+def test_lazy_record_json():
+    params = log.LazyJson({"title": "OK"})
+    record = _record("Parameters: %s", params, lazy=True, fields={"tool": "click", "params": params})
+    assert json.loads(_output(record, log.LOG_FORMAT_JSON)) == \
+        {"time": "TIME", "level": "INFO", "logger": "browser_session", "tool": "click", "params": {"title": "OK"}}
+
+
+def test_lazy_record_is_not_serialized_by_the_caller():
+    params = log.LazyJson({"title": "OK"})
+    log._queue_handler.prepare(_record("Parameters: %s", params, lazy=True))
+    assert params._text is None
@@ -0,0 +1,129 @@
+from fake_uia import FakeCacheProvider, FakeTree, build_fake_tree
+from utils.snapshot import SnapshotEngine
+from utils.uia_cache import WrapperPropertyProvider, format_runtime_id
+
+
+def _engine_and_tree(depth=2, breadth=2):
+    tree = FakeTree()
+    root = build_fake_tree(depth=depth, breadth=breadth, tree=tree)
+    engine = SnapshotEngine(max_root_depth=99, provider=FakeCacheProvider())
+    return engine, root, tree
+
+
+def test_diff_holds_only_the_changed_fields():
+    engine, root, _ = _engine_and_tree()
+    engine.snapshot(root)
+    button = root._children[0]
+    button.title = "Renamed"
+    result = engine.snapshot(root, diff=True)
+    assert result["diff"] == {"added": [], "removed": [],
+                              "changed": [{"id": format_runtime_id(button.runtime_id), "changes": {"title": "Renamed"}}]}
+    assert (result["base_version"], result["version"]) == (1, 2)
+
+
+def test_diff_reports_added_and_removed_subtrees():
+    engine, root, _ = _engine_and_tree()
+    engine.snapshot(root)
+    parent = root._children[1]
+    gone = parent._children[0]
+    gone.remove()
+    added = parent.add_child(title="New", control_type="Button")
+    diff = engine.snapshot(root, diff=True)["diff"]
+    assert diff["removed"] == [format_runtime_id(gone.runtime_id)]
+    assert [(a["parent_id"], a["node"]["title"]) for a in diff["added"]] == [(format_runtime_id(parent.runtime_id), "New")]
+    assert engine.snapshot(root, diff=True)["diff"] == {"added": [], "removed": [], "changed": []}
+
+
+def test_clean_subtrees_are_reused_from_the_previous_walk():
+    engine, root, _ = _engine_and_tree()
+    engine.snapshot(root)
+    dirty = root._children[0]
+    dirty.title = "Renamed"
+    engine.snapshot(root, diff=True, dirty={format_runtime_id(dirty.runtime_id)})
+    # only the dirty node and its ancestors are read again
+    assert engine.last_stats["refreshed"] + engine.last_stats["read"] == 2
+    assert engine.last_stats["reused"] == 5
+    assert engine.nodes[format_runtime_id(dirty.runtime_id)]["info"]["title"] == "Renamed"
+
+
+def test_walk_of_the_same_ui_epoch_is_reused():
+    engine, root, tree = _engine_and_tree()
+    first = engine.snapshot(root, epoch=1)
+    tree.reset_calls()
+    assert engine.snapshot(root, epoch=1) == first
+    assert engine.last_stats["memo"] is True
+    assert tree.calls == 0
+    engine.snapshot(root, epoch=2)
+    assert tree.calls > 0
+
+
+def test_depth_cutoff_costs_no_round_trip():
+    tree = FakeTree()
+    root = build_fake_tree(depth=4, breadth=3, tree=tree)
+    provider = FakeCacheProvider()
+    engine = SnapshotEngine(max_root_depth=99, provider=provider, max_depth=2)
+    engine.update(root)
+    # one call for the root (with its children) and one per node whose children were listed (depth 1)
+    assert provider.round_trips == 1 + 3
+    assert engine.last_stats["truncated"] == {"max_depth": 9}
+
+
+def test_depth_cutoff_uses_prefetched_children():
+    tree = FakeTree()
+    root = build_fake_tree(depth=2, breadth=3, tree=tree)
+    provider = FakeCacheProvider(subtree=True)
+    engine = SnapshotEngine(max_root_depth=99, provider=provider, max_depth=1)
+    engine.update(root)
+    assert provider.round_trips == 1
+    assert engine.last_stats["truncated"] == {"max_depth": 3}
+
+    # leaves at the cutoff are known to have nothing below them
+    engine = SnapshotEngine(max_root_depth=99, provider=FakeCacheProvider(subtree=True), max_depth=2)
+    engine.update(root)
+    assert engine.last_stats["truncated"] == {}
+
+
+def _count(tree):
+    return 1 + sum(_count(child) for child in tree["children"])
+
+
+def test_node_budget_keeps_the_shallow_levels():
+    engine, root, _ = _engine_and_tree(depth=3, breadth=3)
+    engine.max_nodes = 10
+    tree = engine.snapshot(root)
+    assert _count(tree) == 10
+    # breadth first: the root and its 3 children are complete, 6 grandchildren fit
+    assert len(tree["children"]) == 3
+    assert engine.last_stats["truncated"]["node_budget"] > 0
+
+
+def test_time_budget_truncates_below_the_root():
+    engine, root, _ = _engine_and_tree()
+    engine.time_budget = -1
+    tree = engine.snapshot(root)
+    assert tree["children"] == []
+    assert engine.last_stats["truncated"] == {"time_budget": 1}
+
+
+def test_web_page_children_are_capped():
+    engine, root, _ = _engine_and_tree(depth=1, breadth=8)
+    engine.in_web_page, engine.max_web_length = True, 5
+    tree = engine.snapshot(root)
+    assert len(tree["children"]) == 5
+    assert engine.last_stats["truncated"] == {"max_children": 1}
+
+
+def test_parallel_walk_matches_the_sequential_one():
+    tree = FakeTree()
+    root = build_fake_tree(depth=3, breadth=4, tree=tree)
+    sequential = SnapshotEngine(max_root_depth=99, provider=WrapperPropertyProvider()).snapshot(root)
+    engine = SnapshotEngine(max_root_depth=99, provider=WrapperPropertyProvider(), workers=4)
+    assert engine.snapshot(root) == sequential
+    assert engine.last_stats["workers"] == 4
+
+
+def test_parallel_walk_shares_the_node_budget():
+    tree = FakeTree()
+    root = build_fake_tree(depth=3, breadth=4, tree=tree)
+    engine = SnapshotEngine(max_root_depth=99, provider=WrapperPropertyProvider(), workers=4, max_nodes=30)
+    assert _count(engine.snapshot(root)) == 30
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+from utils.ui_executor import UIExecutor
+
+PROBE_INTERVAL = 0.005
+MAX_LAG = 0.05  # generous for a loaded CI machine; a blocked loop lags by the whole call
+
+
+async def _max_lag(work):
+    """Largest delay of a short sleep on the event loop while ``work`` is awaited."""
+    lags, done = [], asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+    task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    await work
+    done.set()
+    await task
+    return max(lags), len(lags)
+
+
+def test_blocking_job_leaves_the_event_loop_free():
+    executor = UIExecutor("test")
+
+    async def main():
+        return await _max_lag(executor.run(time.sleep, 0.3))
+
+    try:
+        lag, probes = asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert lag < MAX_LAG
+    assert probes >= 20
+
+
+def test_tool_call_leaves_the_event_loop_free(fake_session):
+    # a search that keeps polling for an element that never appears, for the whole timeout
+    call = fake_session.mcp.call_tool("verify_element_exists", {
+        "caller": "test", "element_name": "No such element", "control_type": "Text", "timeout": 0.3,
+        "need_snapshot": 0})
+    lag, probes = fake_session._loop.run_until_complete(_max_lag(call))
+    assert lag < MAX_LAG
+    assert probes >= 20
+
+
+def test_calls_run_in_order_on_one_thread():
+    executor = UIExecutor("test")
+    seen = []
+
+    async def main():
+        await asyncio.gather(*(executor.run(lambda i=i: seen.append((i, threading.get_ident()))) for i in range(20)))
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert [i for i, _ in seen] == list(range(20))
+    assert len({ident for _, ident in seen}) == 1
+    assert seen[0][1] != threading.get_ident()
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from fake_uia import FakeTree, build_fake_tree, random_change
+from utils.uia_cache import format_runtime_id
+from utils.ui_mirror import UIMirror
+from utils.wait_util import STRUCTURE_CHANGED, SimulatedEventSource
+
+
+def _state(mirror):
+    """Comparable (title, control_type, automation_id, class_name, children) tree of a mirror."""
+    def node(node_id):
+        n = mirror._nodes[node_id]
+        return (n["title"], n["control_type"], n["automation_id"], n["class_name"],
+                tuple(node(child) for child in n["children"]))
+    return node(mirror._root_id)
+
+
+def _criteria(element):
+    return {"title": element.title, "control_type": element.control_type, "found_index": 0}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mirror_stays_consistent_under_random_changes(seed):
+    rng = random.Random(seed)
+    root = build_fake_tree(depth=3, breadth=4, tree=FakeTree())
+    events = SimulatedEventSource()
+    mirror = UIMirror(root, events)
+    mirror.refresh()
+    counter = [0]
+    try:
+        for step in range(60):
+            for _ in range(rng.randint(1, 4)):
+                random_change(rng, root, events, counter)
+            if rng.random() < 0.05:
+                mirror.invalidate()  # navigation
+            mirror.refresh()
+            fresh = UIMirror(root)
+            fresh.refresh()
+            assert _state(mirror) == _state(fresh), f"step {step}: mirror diverged from a fresh read"
+            assert len(mirror) == len(fresh)
+            element = rng.choice([e for e in root.iter_subtree() if e is not root] or [root])
+            criteria = _criteria(element)
+            assert mirror.find(criteria) is root.child_window(**criteria).find(), f"step {step}: lookup of {criteria}"
+    finally:
+        mirror.close()
+
+
+def test_lookups_without_changes_cost_no_call():
+    tree = FakeTree()
+    root = build_fake_tree(depth=3, breadth=3, tree=tree)
+    mirror = UIMirror(root, SimulatedEventSource())
+    mirror.refresh()
+    target = root._children[-1]._children[-1]
+    tree.reset_calls()
+    assert mirror.find(_criteria(target)) is root.child_window(**_criteria(target)).find()
+    assert tree.calls == 1  # the live search only
+    mirror.close()
+
+
+def test_a_change_only_resyncs_the_reported_subtree():
+    tree = FakeTree()
+    root = build_fake_tree(depth=3, breadth=3, tree=tree)
+    events = SimulatedEventSource()
+    mirror = UIMirror(root, events)
+    mirror.refresh()
+    branch = root._children[0]._children[0]
+    added = branch.add_child(title="Added", control_type="Button")
+    events.emit(STRUCTURE_CHANGED, format_runtime_id(branch.runtime_id))
+    tree.reset_calls()
+    assert mirror.find({"title": "Added", "control_type": "Button"}) is added
+    nodes = sum(1 for _ in root.iter_subtree())
+    assert 0 < tree.calls < nodes
+    assert mirror.stats()["subtree_syncs"] == 1
+    mirror.close()
@@ -0,0 +1,42 @@
+from fake_uia import FakeCacheProvider, FakeTree, build_fake_tree
+from utils.selector import compile_selector
+from utils.snapshot import SnapshotEngine
+from utils.uia_cache import WrapperPropertyProvider, select_provider
+
+
+def _tree():
+    tree = FakeTree()
+    return build_fake_tree(depth=3, breadth=3, tree=tree), tree
+
+
+def _walk_calls(root, tree, provider):
+    tree.reset_calls()
+    SnapshotEngine(max_root_depth=99, provider=provider).update(root)
+    return tree.calls
+
+
+def test_registered_provider_reads_the_fake_trees():
+    root, _ = _tree()
+    assert isinstance(select_provider(root), FakeCacheProvider)
+    assert select_provider(root, subtree=True).subtree is True
+    assert isinstance(select_provider(object()), WrapperPropertyProvider)
+
+
+def test_cache_request_costs_one_round_trip_per_node_listed():
+    root, tree = _tree()
+    nodes = sum(1 for _ in root.iter_subtree())
+    provider = FakeCacheProvider()
+    # the root with its children, then one per node whose children the walk lists
+    assert _walk_calls(root, tree, provider) == provider.round_trips == nodes
+    # node by node, every property is a round trip of its own
+    assert _walk_calls(root, tree, WrapperPropertyProvider()) >= 5 * nodes
+
+
+def test_subtree_prefetch_is_a_single_round_trip():
+    root, tree = _tree()
+    assert _walk_calls(root, tree, FakeCacheProvider(subtree=True)) == 1
+
+    target = root._children[-1]._children[-1]
+    tree.reset_calls()
+    assert compile_selector(f'{target.control_type}[title="{target.title}"]').find(root) is not None
+    assert tree.calls == 1
@@ -0,0 +1,49 @@
+from fake_uia import FakeTree, build_fake_tree
+from utils.wait_util import (
+    FOCUS_CHANGED, STRUCTURE_CHANGED, UNTIL_STABLE, PollingEventSource, SimulatedEventSource, wait_for_ui,
+)
+
+
+def test_polling_source_sees_the_first_action():
+    root = build_fake_tree(depth=2, breadth=2, tree=FakeTree())
+    source = PollingEventSource(root)
+    mark = source.mark()
+    root.add_child(title="Added", control_type="Button")  # the action
+    result = wait_for_ui(source, mark, until=STRUCTURE_CHANGED, quiet_ms=20, timeout=1)
+    assert result.reason == "event"
+    assert result.events == 1
+
+
+def test_polling_source_does_not_blame_the_action_for_earlier_changes():
+    root = build_fake_tree(depth=2, breadth=2, tree=FakeTree())
+    source = PollingEventSource(root)
+    root.add_child(title="Added before", control_type="Button")
+    mark = source.mark()
+    result = wait_for_ui(source, mark, until=STRUCTURE_CHANGED, quiet_ms=20, timeout=0.3)
+    assert result.reason == "timeout"
+    assert result.events == 0
+
+
+def test_quiet_window_shorter_than_the_poll_interval():
+    source = SimulatedEventSource()
+    mark = source.mark()
+    source.script([(0.01, STRUCTURE_CHANGED, None)])
+    result = wait_for_ui(source, mark, until=STRUCTURE_CHANGED, quiet_ms=20, timeout=2)
+    assert result.reason == "event"
+    assert result.waited < 0.08
+
+
+def test_stable_wait_ends_with_the_quiet_window():
+    source = SimulatedEventSource()
+    result = wait_for_ui(source, source.mark(), quiet_ms=20, timeout=2)
+    assert result.reason == UNTIL_STABLE
+    assert 0.02 <= result.waited < 0.08
+
+
+def test_live_wait_wakes_on_the_event():
+    source = SimulatedEventSource()
+    mark = source.mark()
+    source.script([(0.05, FOCUS_CHANGED, None)])
+    result = wait_for_ui(source, mark, until=FOCUS_CHANGED, quiet_ms=0, timeout=2)
+    assert result.reason == "event"
+    assert result.waited < 0.09
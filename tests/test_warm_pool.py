@@ -0,0 +1,79 @@
+import os
+import time
+import types
+
+from utils import warm_pool as warm_pool_module
+from fake_uia import FakeLauncher
+from utils.profile_cache import ProfileCache
+from utils.warm_pool import WarmBrowserPool
+
+
+def _wait_idle(pool, count, timeout=2):
+    deadline = time.monotonic() + timeout
+    while pool.stats()["idle"] < count:
+        assert time.monotonic() < deadline, f"pool never got {count} idle browsers: {pool.stats()}"
+        time.sleep(0.005)
+
+
+def test_shutdown_is_registered_at_exit(monkeypatch, tmp_path):
+    registered = []
+    monkeypatch.setattr(warm_pool_module, "atexit", types.SimpleNamespace(
+        register=registered.append, unregister=lambda func: registered.remove(func)))
+    launcher = FakeLauncher()
+    pool = WarmBrowserPool(1, launcher, ProfileCache(root=tmp_path))
+    pool.start()
+    assert registered == [pool.shutdown]
+    _wait_idle(pool, 1)
+    warm_dir = pool._idle[0].user_data_dir
+
+    pool.shutdown()
+    assert registered == []
+    assert not launcher.launched[0].is_process_running()
+    assert not os.path.exists(warm_dir)
+
+
+def _pool(tmp_path, size=1, **kwargs):
+    launcher = FakeLauncher()
+    pool = WarmBrowserPool(size, launcher, ProfileCache(root=tmp_path), **kwargs)
+    pool.start()
+    _wait_idle(pool, size)
+    return pool, launcher
+
+
+def test_session_takes_a_warm_browser_and_the_pool_refills(monkeypatch, tmp_path):
+    import browser_session
+
+    pool, launcher = _pool(tmp_path)
+    # the server hands the pool the same ProfileCache the sessions release their profiles to
+    monkeypatch.setattr(browser_session, "profile_cache", pool.profile_cache)
+    sessions = browser_session.BrowserSessionPool("edge", max_browsers=2, warm_pool=pool)
+    try:
+        session = sessions.get("runner-1")
+        assert session.browser_launch() is True
+        assert session._app is launcher.launched[0]
+        assert session.user_data_dir is not None
+        assert pool.stats()["taken"] == 1
+        _wait_idle(pool, 1)
+        assert len(launcher.launched) == 2
+
+        port, profile = session._warm_port, session.user_data_dir
+        session.browser_close()
+        assert not launcher.launched[0].is_process_running()
+        assert not os.path.exists(profile)
+        assert port in pool._ports
+        assert sessions.slots.stats()["running"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_take_skips_dead_browsers_and_other_profiles(tmp_path):
+    pool, launcher = _pool(tmp_path, size=2)
+    try:
+        assert pool.take(profile_source=str(tmp_path)) is None
+        launcher.launched[0].kill()
+        warm = pool.take()
+        assert warm.app is launcher.launched[1]
+        assert pool.stats()["taken"] == 1
+    finally:
+        pool.shutdown()
+
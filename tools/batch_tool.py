@@ -0,0 +1,87 @@
+import logging
+
+from utils.snapshot import take_snapshot
+from browser_session import with_session
+from utils.logger import log_tool_call
+from utils.response_format import format_tool_response, init_tool_response, parse_tool_response
+from utils.ui_executor import on_ui_thread
+
+
+logger = logging.getLogger(__name__)
+
+
+def tool_result_text(result):
+    """Text of a FastMCP.call_tool result, whatever shape the installed mcp version returns."""
+    if isinstance(result, tuple):  # (content blocks, structured output)
+        result = result[0]
+    if isinstance(result, str):
+        return result
+    for item in result or []:
+        text = getattr(item, "text", None)
+        if text is not None:
+            return text
+    return ""
+
+
+def register_batch_tools(mcp, browser_manager):
+    """Register batch tools to MCP server."""
+
+    @mcp.tool()
+    @with_session(browser_manager)
+    @log_tool_call
+    @on_ui_thread(browser_manager)
+    async def execute_batch(caller: str, calls: list[dict], scenario: str = "", step_raw: str = "", step: str = "",
+                            stop_on_error: int = 1, need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
+        """
+        Runs several tool calls in one request, against one main window lookup and with one final snapshot.
+
+        Args:
+            caller: Identifier of the calling module/function
+            calls: Tool invocations to run in order, each {"tool_name": "...", "arguments": {...}}
+            scenario: Test scenario name
+            step_raw: Raw original step text
+            step: Current test step description
+            stop_on_error: 1 to skip the remaining calls after the first failure, 0 to run them all
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
+
+        Returns:
+            JSON response with the result of every call and a single snapshot taken after the last one
+        """
+        resp = init_tool_response()
+        results = []
+        # passed down to every call unless the call sets them itself
+        inherited = {"caller": caller, "scenario": scenario, "step_raw": step_raw, "step": step}
+        try:
+            with browser_manager.pinned_main_window():
+                failed = False
+                for call in calls:
+                    tool_name = call.get("tool_name")
+                    if failed and stop_on_error == 1:
+                        results.append({"tool_name": tool_name, "status": "skipped"})
+                        continue
+                    arguments = {**inherited, **(call.get("arguments") or {})}
+                    arguments["need_snapshot"] = 0
+                    arguments["session_id"] = session_id
+                    try:
+                        result = parse_tool_response(tool_result_text(await mcp.call_tool(tool_name, arguments)))
+                    except Exception as e:
+                        result = {"status": "error", "error": repr(e)}
+                    result["tool_name"] = tool_name
+                    results.append(result)
+                    failed = failed or result.get("status") != "success"
+
+            resp["status"] = "error" if failed else "success"
+            if failed:
+                resp["error"] = next(r.get("error") for r in results if r.get("status") not in ("success", "skipped"))
+            resp["data"] = {"step_raw": step_raw, "results": results}
+            if need_snapshot == 1:
+                resp["data"]["snapshot"] = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream)
+        except Exception as e:
+            resp["error"] = repr(e)
+            logger.error(f"Error executing batch of {len(calls)} calls: {e}")
+        return format_tool_response(resp)
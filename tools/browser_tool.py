@@ -2,15 +2,20 @@ import json
 import os
 import logging
 import sys
-import time
 import inspect
 
-from utils.element_util import extract_element_info
+from utils.snapshot import take_snapshot
 from utils.keyboard_util import get_shortcut_key
+from browser_session import with_session
 from utils.logger import log_tool_call
 from utils.response_format import format_tool_response, init_tool_response
 from utils.gen_code import record_calls, MCP_SERVER_INTERNAL_CALL
+from utils.ui_executor import on_ui_thread
 from utils.alert_util import close_translate_pane, close_all_alert
+from utils.wait_util import STRUCTURE_CHANGED, PROPERTY_CHANGED
+from utils.locator import find_element, resolve_element, DEFAULT_EXISTS_TIMEOUT
+
+NAVIGATE_QUIET_MS = 500
 
         
 logger = logging.getLogger(__name__)
@@ -19,10 +24,12 @@ def register_browser_tools(mcp, browser_manager):
     """Register browser tools to MCP server."""   
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def browser_launch(caller: str, scenario: str = "", step: str = "", step_raw: str = "", 
-                             need_snapshot: int = 1) -> str:
+                             need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Launches the web browser.
         
@@ -31,6 +38,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name (for logging)
             step: Current test step description (for logging)
             step_raw: Raw original step text
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with browser snapshot data and status information
@@ -42,7 +55,7 @@ def register_browser_tools(mcp, browser_manager):
                 close_all_alert(browser_manager.get_main_window())
             resp["status"] = "success"
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -50,9 +63,11 @@ def register_browser_tools(mcp, browser_manager):
         return format_tool_response(resp)
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
-    async def browser_screenshot(caller: str, path: str = "screenshots/screenshot.png", scenario: str = "", step_raw: str = "", step: str = "") -> str:
+    @on_ui_thread(browser_manager)
+    async def browser_screenshot(caller: str, path: str = "screenshots/screenshot.png", scenario: str = "", step_raw: str = "", step: str = "", session_id: str = "") -> str:
         """
         Takes a screenshot of the current browser main window and saves it as a PNG file.
 
@@ -62,6 +77,7 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name (for logging)
             step_raw: Raw original step text
             step: Current test step description
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
 
         Returns:
             JSON response with status and error information
@@ -87,10 +103,12 @@ def register_browser_tools(mcp, browser_manager):
 
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def browser_launch_with_user_data(caller: str, custom_user_data_dir: str, scenario: str = "", step: str = "", step_raw: str = "", 
-                             need_snapshot: int = 1) -> str:
+                             need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Launches the web browser with user specified data.
         
@@ -100,6 +118,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name (for logging)
             step: Current test step description (for logging)
             step_raw: Raw original step text
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with browser snapshot data and status information
@@ -110,7 +134,7 @@ def register_browser_tools(mcp, browser_manager):
             close_all_alert(browser_manager.get_main_window())
             resp["status"] = "success"
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -120,9 +144,11 @@ def register_browser_tools(mcp, browser_manager):
     
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
-    async def browser_close(caller: str, scenario: str = "", step_raw: str = "", step: str = "") -> str:
+    @on_ui_thread(browser_manager)
+    async def browser_close(caller: str, scenario: str = "", step_raw: str = "", step: str = "", session_id: str = "") -> str:
         """
         Closes the web browser instance that was previously launched.
         
@@ -131,6 +157,7 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with status information about the browser closure
@@ -147,10 +174,12 @@ def register_browser_tools(mcp, browser_manager):
         return format_tool_response(resp)    
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def native_navigate(caller: str, url: str = "", scenario: str = "", step_raw: str = "",
-                              step: str = "", need_snapshot: int = 1) -> str:
+                              step: str = "", need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Navigates the browser to a specified URL.
         
@@ -160,6 +189,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with browser snapshot data and status information
@@ -168,25 +203,26 @@ def register_browser_tools(mcp, browser_manager):
         resp = init_tool_response()
         try:
             main_window = browser_manager.get_main_window() 
-            address_edit = main_window.child_window(
-                auto_id="view_1022",
-                control_type="Edit",
-                found_index=0,
-                # depth=20
-            )
-            address_edit.wrapper_object().click_input()
-            address_edit.wrapper_object().type_keys('^a{BACKSPACE}' + url + '{ENTER}')
+            address_edit = resolve_element(browser_manager, main_window, {
+                "auto_id": "view_1022",
+                "control_type": "Edit",
+                "found_index": 0,
+                # "depth": 20
+            })
+            mark = browser_manager.mark_ui()
+            address_edit.click_input()
+            address_edit.type_keys('^a{BACKSPACE}' + url + '{ENTER}')
 
             # main_window.set_focus()
             # main_window.type_keys("^l")  # Ctrl+L to focus the address bar
             # time.sleep(2)
             # main_window.type_keys(f'{url}{{ENTER}}')
-            time.sleep(2)
+            browser_manager.wait_for_ui(mark, until=STRUCTURE_CHANGED, quiet_ms=NAVIGATE_QUIET_MS)
+            browser_manager.notify_navigation()
             close_translate_pane(main_window)
-            time.sleep(1)
             resp["status"] = "success"
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -196,10 +232,12 @@ def register_browser_tools(mcp, browser_manager):
     
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def native_button_click(caller: str, name: str, control_type: str, automation_id: str = "", scenario: str = "", step_raw: str = "", 
-                                  step: str = "", timeout: int = 5, need_snapshot: int = 1) -> str:
+                                  step: str = "", timeout: int = 5, need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Clicks on a native button element in the browser UI.
         
@@ -211,6 +249,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with browser snapshot data and status information
@@ -218,7 +262,8 @@ def register_browser_tools(mcp, browser_manager):
         if control_type == "TreeItem":
             return await open_folder(caller=MCP_SERVER_INTERNAL_CALL, name=name, control_type=control_type, automation_id=automation_id, 
                                      scenario=scenario, step_raw=step_raw, step=step, timeout=timeout, 
-                                     need_snapshot=need_snapshot)
+                                     need_snapshot=need_snapshot, snapshot_diff=snapshot_diff, snapshot_format=snapshot_format, snapshot_scope=snapshot_scope,
+                                     snapshot_hash=snapshot_hash, snapshot_stream=snapshot_stream, session_id=session_id)
         
         resp = init_tool_response()
         try:
@@ -227,12 +272,11 @@ def register_browser_tools(mcp, browser_manager):
             if automation_id:
                 search_kwargs["auto_id"] = automation_id
 
-            element = dlg.child_window(**search_kwargs)
-            exists = element.exists(timeout=timeout)
-            if exists:
-                btn = element.wrapper_object()
+            btn = find_element(browser_manager, dlg, search_kwargs, timeout=timeout)
+            if btn is not None:
+                mark = browser_manager.mark_ui()
                 btn.click_input()
-                time.sleep(1)
+                browser_manager.wait_for_ui(mark)
                 resp["status"] = "success"
             else:
                 resp["status"] = "failed"
@@ -241,8 +285,7 @@ def register_browser_tools(mcp, browser_manager):
                 logger.error(f"{resp['error']}: {resp['data']['search_kwargs']}")
                 
             if need_snapshot == 1:
-                time.sleep(1)
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"].update({"step_raw": step_raw, "snapshot": snapshot})
         except Exception as e:
             resp["error"] = repr(e)
@@ -256,10 +299,12 @@ def register_browser_tools(mcp, browser_manager):
     
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def native_right_click(caller: str, name: str, control_type: str, automation_id: str = "", scenario: str = "", step_raw: str = "", 
-                                  step: str = "", timeout: int = 5, need_snapshot: int = 1) -> str:
+                                  step: str = "", timeout: int = 5, need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Right clicks on a native control element in the browser UI.
         
@@ -271,6 +316,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with browser snapshot data and status information
@@ -283,12 +334,11 @@ def register_browser_tools(mcp, browser_manager):
             if automation_id:
                 search_kwargs["auto_id"] = automation_id
 
-            element = dlg.child_window(**search_kwargs)
-            exists = element.exists(timeout=timeout)
-            if exists:
-                btn = element.wrapper_object()
+            btn = find_element(browser_manager, dlg, search_kwargs, timeout=timeout)
+            if btn is not None:
+                mark = browser_manager.mark_ui()
                 btn.right_click_input()
-                time.sleep(1)
+                browser_manager.wait_for_ui(mark)
                 resp["status"] = "success"
             else:
                 resp["status"] = "failed"
@@ -297,8 +347,7 @@ def register_browser_tools(mcp, browser_manager):
                 logger.error(f"{resp['error']}: {resp['data']['search_kwargs']}")
                 
             if need_snapshot == 1:
-                time.sleep(1)
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"].update({"step_raw": step_raw, "snapshot": snapshot})
         except Exception as e:
             resp["error"] = repr(e)
@@ -311,10 +360,12 @@ def register_browser_tools(mcp, browser_manager):
 
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def native_double_right_click(caller: str, name: str, control_type: str, automation_id: str = "", scenario: str = "", step_raw: str = "", 
-                                        step: str = "", timeout: int = 5, need_snapshot: int = 1) -> str:
+                                        step: str = "", timeout: int = 5, need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Performs a double-click operation on a native control element in the browser UI.
         
@@ -326,6 +377,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with browser snapshot data and status information
@@ -337,12 +394,11 @@ def register_browser_tools(mcp, browser_manager):
             if automation_id:
                 search_kwargs["auto_id"] = automation_id
 
-            element = dlg.child_window(**search_kwargs)
-            exists = element.exists(timeout=timeout)
-            if exists:
-                btn = element.wrapper_object()
+            btn = find_element(browser_manager, dlg, search_kwargs, timeout=timeout)
+            if btn is not None:
+                mark = browser_manager.mark_ui()
                 btn.double_click_input()
-                time.sleep(1)
+                browser_manager.wait_for_ui(mark)
                 resp["status"] = "success"
             else:
                 resp["status"] = "failed"
@@ -351,8 +407,7 @@ def register_browser_tools(mcp, browser_manager):
                 logger.error(f"{resp['error']}: {resp['data']['search_kwargs']}")
                 
             if need_snapshot == 1:
-                time.sleep(1)
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"].update({"step_raw": step_raw, "snapshot": snapshot})
         except Exception as e:
             resp["error"] = repr(e)
@@ -364,9 +419,11 @@ def register_browser_tools(mcp, browser_manager):
     
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
-    async def send_keystrokes(caller: str, keys_sequence_raw: str, key_sequence_formatted, str, step_raw: str, step: str, scenario: str = '', need_snapshot: int = 1) -> str:
+    @on_ui_thread(browser_manager)
+    async def send_keystrokes(caller: str, keys_sequence_raw: str, key_sequence_formatted, str, step_raw: str, step: str, scenario: str = '', need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Sends keystrokes to the active browser window using pywinauto, with support for key combinations.
 
@@ -378,17 +435,24 @@ def register_browser_tools(mcp, browser_manager):
             step_raw (str): The raw BDD step text from the feature file.
             step (str): The current test step description.
             scenario (str, optional): Scenario name for logging/tracking. Defaults to ''.
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
         Returns:
             str: JSON-formatted result with status, optional snapshot data, and any error message.
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
         """
         resp = init_tool_response()
         try:
             dlg = browser_manager.get_main_window()
             # dlg.type_keys(get_shortcut_key(keys_sequence_raw))
+            mark = browser_manager.mark_ui()
             dlg.type_keys(key_sequence_formatted)
-            time.sleep(2)
+            browser_manager.wait_for_ui(mark)
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
             resp["status"] = "success"
         except Exception as e:
@@ -399,10 +463,12 @@ def register_browser_tools(mcp, browser_manager):
     
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def enter_text(caller: str, title: str, content:str, control_type: str, automation_id: str, scenario: str = '', step_raw: str = '', 
-                         step: str = '', need_snapshot: int = 1) -> str:
+                         step: str = '', need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Enters text into an editable field in the browser UI.
         
@@ -415,6 +481,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with status and error information
@@ -427,22 +499,22 @@ def register_browser_tools(mcp, browser_manager):
             if automation_id:
                 search_kwargs["auto_id"] = automation_id
 
-            element = dlg.child_window(**search_kwargs)
-            if element.exists() is False:
+            element = find_element(browser_manager, dlg, search_kwargs, timeout=DEFAULT_EXISTS_TIMEOUT)
+            if element is None:
                 if automation_id:
                     search_kwargs = {'auto_id': automation_id, 'control_type': control_type}
-                    element = dlg.child_window(**search_kwargs)
+                element = resolve_element(browser_manager, dlg, search_kwargs)
             # edit_text = dlg.child_window(title=f'{title}', control_type=control_type)
-            element.wrapper_object().click_input()
-            element.wrapper_object().type_keys('^a{BACKSPACE}', with_spaces=True)
-            element.wrapper_object().type_keys(content, with_spaces=True)
+            mark = browser_manager.mark_ui()
+            element.click_input()
+            element.type_keys('^a{BACKSPACE}', with_spaces=True)
+            element.type_keys(content, with_spaces=True)
             # element.set_edit_text(content)
-            time.sleep(1)
+            browser_manager.wait_for_ui(mark, until=PROPERTY_CHANGED)
             resp["status"] = "success"
             
             if need_snapshot == 1:
-                time.sleep(1)
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -452,10 +524,12 @@ def register_browser_tools(mcp, browser_manager):
 
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def open_folder(caller: str, name: str, control_type: str, automation_id: str = "", scenario: str = "", step_raw: str = '', 
-                            step: str = '', timeout: int = 5, need_snapshot: int = 1) -> str:
+                            step: str = '', timeout: int = 5, need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Open/expand a folder/TreeItem
         
@@ -466,6 +540,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
         """
         resp = init_tool_response()
         try:
@@ -474,17 +554,16 @@ def register_browser_tools(mcp, browser_manager):
                 search_kwargs["auto_id"] = automation_id
 
             dlg = browser_manager.get_main_window()
-            element = dlg.child_window(**search_kwargs)
-            exists = element.exists(timeout=timeout)
-            if exists:
-                element = element.wrapper_object()
+            element = find_element(browser_manager, dlg, search_kwargs, timeout=timeout)
+            if element is not None:
+                mark = browser_manager.mark_ui()
                 # for leaf node, click it
                 if control_type == 'TreeItem' and element.get_expand_state() != 3 and not element.is_expanded():
                     element.expand()
                 else:
                     element.click_input()
                     
-                time.sleep(2)
+                browser_manager.wait_for_ui(mark)
                 resp["status"] = "success"
             else:
                 resp["status"] = "failed"
@@ -492,7 +571,7 @@ def register_browser_tools(mcp, browser_manager):
                 resp["data"]['search_kwargs'] = search_kwargs
 
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"].update({"step_raw": step_raw, "snapshot": snapshot})
         except Exception as e:
             resp["error"] = repr(e)
@@ -504,10 +583,12 @@ def register_browser_tools(mcp, browser_manager):
     
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def open_combobox(caller: str, dropdown_name: str, scenario: str = "", step_raw: str = '', 
-                            step: str = '', need_snapshot: int = 1) -> str:
+                            step: str = '', need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Open a combobox or dropdown list
         
@@ -516,22 +597,29 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         """
         resp = init_tool_response()
         try:
             dlg = browser_manager.get_main_window()
-            dropdown = dlg.child_window(
-                title=f"{dropdown_name}",
-                control_type="ComboBox",
-                # depth=20
-            )
+            dropdown = resolve_element(browser_manager, dlg, {
+                "title": f"{dropdown_name}",
+                "control_type": "ComboBox",
+                # "depth": 20
+            })
+            mark = browser_manager.mark_ui()
             dropdown.click_input()
-            time.sleep(2)  # Wait for the dropdown list to expand
+            browser_manager.wait_for_ui(mark, until=STRUCTURE_CHANGED)  # Wait for the dropdown list to expand
             resp["status"] = "success"
             
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:             
             resp["error"] = repr(e)
@@ -541,9 +629,11 @@ def register_browser_tools(mcp, browser_manager):
     
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
-    async def select_item(caller: str, option: str, control_type: str = '', scenario: str = "", step_raw: str = '', step: str = '', need_snapshot: int = 1) -> str:
+    @on_ui_thread(browser_manager)
+    async def select_item(caller: str, option: str, control_type: str = '', scenario: str = "", step_raw: str = '', step: str = '', need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Select an option from a dropdown list or menuitem
         
@@ -553,6 +643,12 @@ def register_browser_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
            
         """
         resp = init_tool_response()
@@ -560,27 +656,31 @@ def register_browser_tools(mcp, browser_manager):
             dlg = browser_manager.get_main_window()
             if not control_type:
                 control_type = "MenuItem"
-            option_item = dlg.child_window(
-                title=f"{option}",
-                control_type=control_type,
-                # depth=20
-            )
+            option_item = resolve_element(browser_manager, dlg, {
+                "title": f"{option}",
+                "control_type": control_type,
+                # "depth": 20
+            })
+            mark = browser_manager.mark_ui()
             option_item.click_input()
-            time.sleep(2)  
-            snapshot = extract_element_info(browser_manager.get_main_window())   
-            resp["data"] = {'control_type': control_type, "snapshot": snapshot}
+            browser_manager.wait_for_ui(mark)
+            resp["data"] = {'control_type': control_type}
+            if need_snapshot == 1:
+                resp["data"]["snapshot"] = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream)
             resp["status"] = "success"
         except Exception as e1:
             logger.error(f"Error finding item: option={option}, control_type={control_type}. error={repr(e1)}")
             try:
-                option_item = dlg.child_window(
-                    title=option,
-                    # depth=20
-                )
+                option_item = resolve_element(browser_manager, dlg, {
+                    "title": option,
+                    # "depth": 20
+                })
+                mark = browser_manager.mark_ui()
                 option_item.click_input()
-                time.sleep(2)  
-                snapshot = extract_element_info(browser_manager.get_main_window())   
-                resp["data"] = {'control_type': control_type, "snapshot": snapshot}
+                browser_manager.wait_for_ui(mark)
+                resp["data"] = {'control_type': control_type}
+                if need_snapshot == 1:
+                    resp["data"]["snapshot"] = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream)
                 resp["status"] = "success"
             except Exception as select_error:
                 resp["error"] = repr(select_error)
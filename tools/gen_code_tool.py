@@ -5,6 +5,7 @@ import sys
 import time
 import uuid
 from pathlib import Path
+from browser_session import with_session
 from utils.logger import log_tool_call
 from utils.gen_code import HEADER_AUTO_GEN, STEPS_DIR_DEFAULT, TARGET_STEP_FILE_DEFAULT
 from utils.gen_code import gen_code_preview, ensure_step_path_exists, gen_step_file_from_feature_path, parse_steps_dir_from_step_path
@@ -18,8 +19,9 @@ def register_gen_code_tools(mcp, browser_manager):
     """Register generage code tools to MCP server."""
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
-    async def before_gen_code(feature_file: str = '', step_file: str = '') -> str:
+    async def before_gen_code(feature_file: str = '', step_file: str = '', session_id: str = "") -> str:
         """"Clear cache and only executed before first step of test case"""
         try:
             resp = init_tool_response()
@@ -51,8 +53,9 @@ def register_gen_code_tools(mcp, browser_manager):
         return format_tool_response(resp)
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
-    async def preview_code_changes() -> str:
+    async def preview_code_changes(session_id: str = "") -> str:
         """Preview generated test code changes and confirm before applying"""
         if not browser_manager.gen_code_id or not browser_manager.gen_code_cache:
             return "No pending code changes to preview"
@@ -78,8 +81,9 @@ def register_gen_code_tools(mcp, browser_manager):
     #     return f"Code generation completed with ID: {browser_manager.gen_code_id}\n\n{result_confirm}\n\nUse confirm_code_changes tool to apply or reject changes."
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
-    async def confirm_code_changes() -> str:
+    async def confirm_code_changes(session_id: str = "") -> str:
         """Confirm the previewed code changes"""
         if not hasattr(browser_manager, 'proposed_changes') or not browser_manager.proposed_changes:
             return "No pending code changes to confirm"
@@ -0,0 +1,35 @@
+import logging
+
+from utils.logger import log_tool_call
+from utils.metrics import metrics
+from utils.response_format import format_tool_response, init_tool_response
+
+
+logger = logging.getLogger(__name__)
+
+
+def register_metrics_tools(mcp, browser_manager):
+    """Register metrics tools to MCP server."""
+
+    @mcp.tool()
+    @log_tool_call
+    async def get_metrics(tool: str = "", reset: int = 0) -> str:
+        """
+        Latency histograms of the tool calls since the server started (or the last reset),
+        per tool and per phase: total, window, search, action, settle, snapshot, serialization.
+
+        Args:
+            tool: Only return the metrics of this tool (empty for all of them)
+            reset: 1 to clear the histograms after reading them
+
+        Returns:
+            JSON response with {tool: {phase: {count, total_ms, mean_ms, min_ms, p50_ms, p90_ms, p99_ms, max_ms}}}
+        """
+        resp = init_tool_response()
+        try:
+            resp["status"] = "success"
+            resp["data"] = {"since": metrics.started_at, "tools": metrics.snapshot(tool or None, reset=reset == 1)}
+        except Exception as e:
+            resp["error"] = repr(e)
+            logger.error(f"Error reading metrics: {e}")
+        return format_tool_response(resp)
@@ -5,11 +5,19 @@ import time
 import inspect
 
 from math import hypot
-from utils.element_util import extract_element_info
+from utils.snapshot import take_snapshot
+from browser_session import with_session
 from utils.logger import log_tool_call
 from utils.response_format import format_tool_response, init_tool_response
 from pywinauto import Application, mouse
 from utils.gen_code import record_calls
+from utils.ui_executor import on_ui_thread
+from utils.wait_util import STRUCTURE_CHANGED
+from utils.locator import resolve_element
+
+DRAG_HOLD_DELAY = 0.5  # input pacing for the drag to start, not a UI wait
+DRAG_MOVE_INTERVAL = 0.5  # input pacing between drag moves, the pace Edge's drag and drop is known to follow
+HOVER_TIMEOUT = 0.5  # tooltips show up after a delay, or never: never wait longer than the old fixed sleep
 
         
 
@@ -17,10 +25,12 @@ def register_mouse_tools(mcp, browser_manager):
     """Register mouse tools to MCP server."""
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def mouse_drag_drop(caller: str, source_title: str, source_control_type: str, target_title:str, target_control_type: str, 
-                              scenario: str = '', step_raw: str = '', step: str = '', need_snapshot: int = 1) -> str:
+                              scenario: str = '', step_raw: str = '', step: str = '', need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Performs a drag and drop operation from source element to target element
         
@@ -33,6 +43,12 @@ def register_mouse_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with status and error information
@@ -41,13 +57,14 @@ def register_mouse_tools(mcp, browser_manager):
         resp = init_tool_response()
         try:
             dlg = browser_manager.get_main_window()
-            source = dlg.child_window(title=source_title, control_type=source_control_type) 
-            target = dlg.child_window(title=target_title, control_type=target_control_type)
+            source = resolve_element(browser_manager, dlg, {"title": source_title, "control_type": source_control_type})
+            target = resolve_element(browser_manager, dlg, {"title": target_title, "control_type": target_control_type})
             start_point = source.rectangle().mid_point()
             end_point = target.rectangle().mid_point()
 
+            mark = browser_manager.mark_ui()
             mouse.press(coords=start_point)
-            time.sleep(0.5)
+            time.sleep(DRAG_HOLD_DELAY)
             x1, y1 = start_point
             x2, y2 = end_point
             total_distance = hypot(x2 - x1, y2 - y1)
@@ -57,12 +74,12 @@ def register_mouse_tools(mcp, browser_manager):
                 xi = x1 + (x2 - x1) * i // steps
                 yi = y1 + (y2 - y1) * i // steps
                 mouse.move(coords=(xi, yi))
-                time.sleep(0.5)
+                time.sleep(DRAG_MOVE_INTERVAL)
             mouse.release(coords=end_point)
-            time.sleep(0.5)
+            browser_manager.wait_for_ui(mark)
             resp["status"] = "success"
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -72,10 +89,12 @@ def register_mouse_tools(mcp, browser_manager):
     
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def mouse_hover(caller: str, name: str, control_type: str = 'Button', scenario: str = '', 
-                          step_raw: str = '', step: str = '', need_snapshot: int = 1) -> str:
+                          step_raw: str = '', step: str = '', need_snapshot: int = 1, snapshot_diff: int = 0, snapshot_format: str = "json", snapshot_scope: dict = None, snapshot_hash: str = "", snapshot_stream: int = 0, session_id: str = "") -> str:
         """
         Moves the mouse to hover over a specified UI element
         
@@ -86,6 +105,12 @@ def register_mouse_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with status and error information
@@ -94,14 +119,14 @@ def register_mouse_tools(mcp, browser_manager):
         resp = init_tool_response()
         try:
             dlg = browser_manager.get_main_window()
-            target = dlg.child_window(title=name, control_type=control_type) 
+            target = resolve_element(browser_manager, dlg, {"title": name, "control_type": control_type})
             target_point = target.rectangle().mid_point()
+            mark = browser_manager.mark_ui()
             mouse.move(coords=target_point)
-            time.sleep(0.5)
-            snapshot = extract_element_info(browser_manager.get_main_window())   
+            browser_manager.wait_for_ui(mark, until=STRUCTURE_CHANGED, timeout=HOVER_TIMEOUT)
             resp["status"] = "success"
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
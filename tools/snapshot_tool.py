@@ -0,0 +1,47 @@
+import logging
+
+from browser_session import with_session
+from utils.logger import log_tool_call
+from utils.response_format import format_tool_response, init_tool_response
+from utils.snapshot_handles import DEFAULT_EXPAND_DEPTH, DEFAULT_PAGE_SIZE
+from utils.ui_executor import on_ui_thread
+
+
+logger = logging.getLogger(__name__)
+
+
+def register_snapshot_tools(mcp, browser_manager):
+    """Register snapshot tools to MCP server."""
+
+    @mcp.tool()
+    @with_session(browser_manager)
+    @log_tool_call
+    @on_ui_thread(browser_manager)
+    async def expand_node(caller: str, snapshot_handle: str, node_id: str, depth: int = DEFAULT_EXPAND_DEPTH,
+                          offset: int = 0, limit: int = DEFAULT_PAGE_SIZE, session_id: str = "") -> str:
+        """
+        Walks the subtree of one node of an earlier snapshot, for the parts a snapshot left out.
+        Nodes whose children were not all walked are marked "truncated" and carry an "id".
+
+        Args:
+            caller: Identifier of the calling module/function
+            snapshot_handle: "snapshot_handle" returned with the snapshot (the last few snapshots of the session are kept)
+            node_id: "id" of the node to expand, from the snapshot or an earlier expand_node
+            depth: Levels below the node to return, 1 for its direct children only
+            offset: Index of the first child to return
+            limit: Children returned per page, also the children kept per node inside the page
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
+
+        Returns:
+            JSON response with {"node_id", "offset", "total", "next_offset", "children"}; pass next_offset
+            as offset to get the next page, it is null on the last one
+        """
+        resp = init_tool_response()
+        try:
+            resp["data"] = browser_manager.snapshot_handles.expand(snapshot_handle, node_id, depth=depth,
+                                                                   offset=offset, limit=limit)
+            resp["status"] = "success"
+        except Exception as e:
+            resp["error"] = repr(e)
+            logger.error(f"Error expanding node {node_id} of snapshot {snapshot_handle}: {e}")
+        return format_tool_response(resp)
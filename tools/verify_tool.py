@@ -5,12 +5,16 @@ import sys
 import time
 import inspect
 
-from utils.element_util import extract_element_info
+from utils.snapshot import take_snapshot
 from utils.keyboard_util import get_shortcut_key
+from browser_session import with_session
 from utils.logger import log_tool_call
 from utils.response_format import format_tool_response, init_tool_response
 from utils.gen_code import record_calls
+from utils.ui_executor import on_ui_thread
 from utils.alert_util import close_translate_pane, close_all_alert
+from utils.locator import find_element
+from utils.selector import quote
 
         
 logger = logging.getLogger(__name__)
@@ -20,8 +24,10 @@ def register_verify_tools(mcp, browser_manager):
     
         
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def verify_element_exists(caller: str, 
                                     element_name: str, 
                                     control_type: str, 
@@ -29,7 +35,13 @@ def register_verify_tools(mcp, browser_manager):
                                     scenario: str = "", 
                                     step_raw: str = "",
                                     step: str = "", 
-                                    need_snapshot: int = 1
+                                    need_snapshot: int = 1,
+                                    snapshot_diff: int = 0,
+                                    snapshot_format: str = "json",
+                                    snapshot_scope: dict = None,
+                                    snapshot_hash: str = "",
+                                    snapshot_stream: int = 0,
+                                    session_id: str = ""
                                     ) -> str:
         """
         Verify/check if an element exists/appears
@@ -41,23 +53,26 @@ def register_verify_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
         """
         resp = init_tool_response()
         try:
             dlg = browser_manager.get_main_window()
             search_parent = dlg
             
-            # Prepare search criteria based on parameters
-            search_kwargs = {}
-            search_kwargs["title_re"] = f".*{element_name}.*"
-            search_kwargs["control_type"] = control_type
+            # Prepare search criteria based on parameters: title contains the name, taken literally
+            search_kwargs = f"[control_type={quote(control_type)}][title*={quote(element_name)}]"
             
             # First try a quick search
             try:
-                element = search_parent.child_window(**search_kwargs)
-                
                 # Check if element exists with timeout
-                exists = element.exists(timeout=timeout)
+                element = find_element(browser_manager, search_parent, search_kwargs, timeout=timeout)
+                exists = element is not None
                 # if not exists:
                 #     if control_type == "Text":
                 #         search_kwargs.pop("control_type", None)
@@ -76,7 +91,7 @@ def register_verify_tools(mcp, browser_manager):
                 logger.error(f"Error searching for element '{element_name}': {search_error}")
 
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -86,8 +101,10 @@ def register_verify_tools(mcp, browser_manager):
     
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def verify_checkbox_state(caller: str,
                                 checkbox_name: str,
                                 expected_state: str,
@@ -96,7 +113,13 @@ def register_verify_tools(mcp, browser_manager):
                                 scenario: str = "", 
                                 step_raw: str = "",
                                 step: str = "",
-                                need_snapshot: int = 1
+                                need_snapshot: int = 1,
+                                snapshot_diff: int = 0,
+                                snapshot_format: str = "json",
+                                snapshot_scope: dict = None,
+                                snapshot_hash: str = "",
+                                snapshot_stream: int = 0,
+                                session_id: str = ""
                                 ) -> str:
         """
         Verifies if a checkbox is checked or unchecked.
@@ -110,6 +133,12 @@ def register_verify_tools(mcp, browser_manager):
             scenario: Test scenario name
             step_raw: Raw original step text
             step: Current test step description
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with verification result and status information
@@ -122,10 +151,9 @@ def register_verify_tools(mcp, browser_manager):
             search_kwargs["title"] = checkbox_name
             search_kwargs["control_type"] = control_type
 
-            checkbox_element = dlg.child_window(**search_kwargs)
-            exists = checkbox_element.exists(timeout=timeout)
+            checkbox_element = find_element(browser_manager, dlg, search_kwargs, timeout=timeout)
             
-            if exists:
+            if checkbox_element is not None:
                 # Get the toggle state
                 is_checked = checkbox_element.get_toggle_state() == 1
                 actual_state = "checked" if is_checked else "unchecked"
@@ -143,7 +171,7 @@ def register_verify_tools(mcp, browser_manager):
                 logger.error(f"{resp['error']}: {search_kwargs}")
 
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -153,8 +181,10 @@ def register_verify_tools(mcp, browser_manager):
     
     
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def verify_element_value(caller: str,
                                element_name: str,
                                element_value: str,
@@ -164,7 +194,13 @@ def register_verify_tools(mcp, browser_manager):
                                step: str = "",
                                scenario: str = "", 
                                timeout: int = 5,
-                               need_snapshot: int = 1
+                               need_snapshot: int = 1,
+                               snapshot_diff: int = 0,
+                               snapshot_format: str = "json",
+                               snapshot_scope: dict = None,
+                               snapshot_hash: str = "",
+                               snapshot_stream: int = 0,
+                               session_id: str = ""
                                ) -> str:
         """
         Verifies that an control contains the expected value/content.
@@ -179,6 +215,12 @@ def register_verify_tools(mcp, browser_manager):
             step: Current test step description              
             scenario: Test scenario name
             timeout: Maximum time in seconds to wait for the element
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
 
             
         Returns:
@@ -193,10 +235,9 @@ def register_verify_tools(mcp, browser_manager):
             search_kwargs["title"] = f"{element_name}"
             search_kwargs["control_type"] = control_type
 
-            edit_element = dlg.child_window(**search_kwargs)
-            exists = edit_element.exists(timeout=timeout)
+            edit_element = find_element(browser_manager, dlg, search_kwargs, timeout=timeout)
             
-            if exists:
+            if edit_element is not None:
                 actual_value = edit_element.get_value()
                 if expected_value in actual_value:                       
                     resp["status"] = "success"
@@ -210,7 +251,7 @@ def register_verify_tools(mcp, browser_manager):
                 logger.error(f"{resp['error']}: {search_kwargs}")
             
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
 
         except Exception as e:
@@ -221,8 +262,10 @@ def register_verify_tools(mcp, browser_manager):
 
 
     @mcp.tool()
+    @with_session(browser_manager)
     @log_tool_call
     @record_calls(browser_manager)
+    @on_ui_thread(browser_manager)
     async def verify_elements_order(caller: str,
                             control_names: list[str],
                             control_type: str,
@@ -231,7 +274,13 @@ def register_verify_tools(mcp, browser_manager):
                             step: str = "",
                             scenario: str = "", 
                             timeout: int = 5,
-                            need_snapshot: int = 1
+                            need_snapshot: int = 1,
+                            snapshot_diff: int = 0,
+                            snapshot_format: str = "json",
+                            snapshot_scope: dict = None,
+                            snapshot_hash: str = "",
+                            snapshot_stream: int = 0,
+                            session_id: str = ""
                             ) -> str:
         """
         Verifies that controls appear in the specified order (vertically or horizontally).
@@ -248,6 +297,12 @@ def register_verify_tools(mcp, browser_manager):
             scenario: Test scenario name
             timeout: Maximum time in seconds to wait for the elements
             need_snapshot: Whether to include UI snapshot in response
+            snapshot_diff: 1 to return only the changes since the previous snapshot instead of the full tree
+            snapshot_format: "json" (default) nested tree, "compact" columnar tree with a string table, "compact-zlib" compact, zlib + base64
+            snapshot_scope: Optional part of the UI to snapshot, e.g. {"root": {"title": "Favorites", "control_type": "Document"}, "max_depth": 4, "include": [...], "exclude": [...], "max_children": 5, "max_nodes": 2000, "time_budget": 8, "changed_only": true}
+            snapshot_hash: snapshot_hash of the last snapshot seen; when the UI still matches it the snapshot is only {"unchanged": true, "snapshot_hash": ...}
+            snapshot_stream: 1 to send the snapshot nodes as progress notifications while the UI is walked (needs a progressToken), the response then only sums them up
+            session_id: Browser session to run in, one per parallel runner (empty for the default session)
             
         Returns:
             JSON response with verification result and status information
@@ -266,9 +321,9 @@ def register_verify_tools(mcp, browser_manager):
                 raise ValueError(f"Element not found in siblings: {tree_item.window_text()}") 
 
             for name in control_names:
-                search_kwargs = {"title_re": f".*{name}.*", "control_type": control_type}
-                element = dlg.child_window(**search_kwargs)
-                if element.exists(timeout=timeout):
+                search_kwargs = f"[control_type={quote(control_type)}][title*={quote(name)}]"
+                element = find_element(browser_manager, dlg, search_kwargs, timeout=timeout)
+                if element is not None:
                     elements_real_order.append(get_tree_item_index(element))
 
             expected_orders = control_orders if control_orders else sorted(elements_real_order)
@@ -282,7 +337,7 @@ def register_verify_tools(mcp, browser_manager):
                 logger.error(resp["error"])                            
            
             if need_snapshot == 1:
-                snapshot = extract_element_info(browser_manager.get_main_window()) 
+                snapshot = take_snapshot(browser_manager, snapshot_diff, snapshot_format, snapshot_scope, snapshot_hash, snapshot_stream) 
                 resp["data"] = {"step_raw": step_raw, "snapshot": snapshot}
         except Exception as e:
             resp["error"] = repr(e)
@@ -10,6 +10,8 @@ import pprint
 import textwrap
 from pathlib import Path
 
+from utils.step_registry import get_step_registry
+
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +23,13 @@ TARGET_STEP_FILE_DEFAULT = os.path.join(STEPS_DIR_DEFAULT, "common_steps.py")
 
 MCP_SERVER_INTERNAL_CALL = "mcp-server-internal-transfer-call"
 
+# Tool parameters that only shape the snapshot returned to the caller, not recorded in generated steps
+SNAPSHOT_ONLY_PARAMS = ["snapshot_diff", "snapshot_format", "snapshot_scope", "snapshot_hash", "snapshot_stream"]
+# Tool parameters that pick where the call runs; generated steps get them from the runner (features/environment.py)
+SESSION_PARAMS = ["session_id"]
+# Tool parameters execute_batch sets on every call of the batch, left out of the generated per-call arguments
+BATCH_INHERITED_PARAMS = ["caller", "need_snapshot"]
+
 HEADER_AUTO_GEN = """
 from behave import *
 import logging
@@ -45,16 +54,23 @@ def need_parameterize(step_info: dict, parameterized_size: int) -> bool:
         return True
     return False
 
+PARAMETERIZED_PATTERN = r'\"(.+?)\"'
+
+
 def normalize_step_text(step_text_raw: str, step_info: dict) -> tuple:
-    parameterized_pattern = r'\"(.+?)\"'
+    if not need_parameterize(step_info, len(re.findall(PARAMETERIZED_PATTERN, step_text_raw))):
+        return step_text_raw, {}
+    return extract_step_params(step_text_raw)
+
+
+def extract_step_params(step_text_raw: str) -> tuple:
+    """Step text with its quoted values replaced by {param} / {param1}, {param2}..., and those values by name."""
+    parameterized_pattern = PARAMETERIZED_PATTERN
     matches = list(re.finditer(parameterized_pattern, step_text_raw))
     match_size = len(matches)
     normalized_text = step_text_raw
     params = {}
 
-    if not need_parameterize(step_info, match_size):
-        return normalized_text, params
-    
     idx = 0
     for match in matches:
         k = f"param{idx + 1}" if match_size > 1 else "param"
@@ -131,6 +147,64 @@ def step_impl(context{param_def}):"""
     return code_text
 
 
+def generate_batch_step_definition(step_infos) -> str:
+    """
+    One execute_batch call for a step that recorded several tool calls.
+
+    Quoted values of the step text become step parameters, like in
+    generate_step_definition, when each of them is the value of a
+    TOOL_PARAMS_REPLACE_MAP argument of one of the calls.
+    """
+    first = step_infos[0]
+    normalized_text, params = extract_step_params(first.get("step_text_raw"))
+    names = {}
+    for name, value in params.items():
+        names.setdefault(value, name)
+    calls = []
+    for step_info in step_infos:
+        arguments = {k: v for k, v in step_info.get("tool_params", {}).items() if k not in BATCH_INHERITED_PARAMS}
+        replaceable = TOOL_PARAMS_REPLACE_MAP.get(step_info.get("tool_name"), {})
+        variables = {k: names[v] for k, v in arguments.items() if k in replaceable and isinstance(v, str) and v in names}
+        calls.append((step_info.get("tool_name"), arguments, variables))
+    real_parameterized = bool(params) and set(params) == {name for _, _, variables in calls for name in variables.values()}
+
+    first['step_text'] = normalized_text if real_parameterized else first.get("step_text_raw")
+    param_def = ", " + ", ".join(params.keys()) if real_parameterized else ""
+    calls_str = ""
+    for tool_name, arguments, variables in calls:
+        if not real_parameterized:
+            variables = {}
+        arguments_str = "{" + ", ".join(f"{k!r}: {variables[k] if k in variables else repr(v)}"
+                                        for k, v in arguments.items()) + "}"
+        calls_str += f"{' ' * 16}{{'tool_name': {tool_name!r}, 'arguments': {arguments_str}}},\n"
+    args_str = '{\n' + \
+        f"{' ' * 12}'caller': {first.get('tool_params', {}).get('caller', '')!r},\n" + \
+        f"{' ' * 12}'calls': [\n{calls_str}{' ' * 12}],\n" + \
+        f"{' ' * 12}'need_snapshot': 0\n{' ' * 8}}}"
+
+    return f"""
+# --- auto-generated step ---
+@{first.get("step_type").lower()}('{first['step_text']}')
+def step_impl(context{param_def}):
+    result = call_tool_sync(context, context.session.call_tool(
+        name="execute_batch", 
+        arguments={args_str}
+    ))
+    result_json = get_tool_json(result)
+    assert result_json.get("status") == "success", f"Expected status to be 'success', got '{{result_json.get('status')}}', error: '{{result_json.get('error')}}'" """
+
+
+def group_multi_calls(steps):
+    """Split extracted steps into lists of calls recorded for the same step."""
+    groups = []
+    for item in steps:
+        if item.get("is_multi_call") and item.get("call_idx", 0) > 1 and groups:
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+    return groups
+
+
 def extract_steps_from_cache(gen_code_id, gen_code_cache):
     dedupe_set = set()
     steps = []
@@ -180,36 +254,32 @@ def extract_steps_from_cache(gen_code_id, gen_code_cache):
 
 def gen_code_preview(browser_manager) -> dict:
     new_steps_code = []
-    existing_code = ""
-    
-    step_file = browser_manager.steps_dir
-    existing_code = read_step_files(Path(step_file))
-    target_existing_code = read_step_files(Path(browser_manager.step_file_target))
 
-    if not target_existing_code:
+    registry = get_step_registry(browser_manager.steps_dir)
+    target_file = Path(browser_manager.step_file_target)
+    if not target_file.is_file() or target_file.stat().st_size == 0:
             browser_manager.header_code = HEADER_AUTO_GEN
 
     steps = extract_steps_from_cache(browser_manager.gen_code_id, browser_manager.gen_code_cache)
     logger.info(f"Processing {len(steps)} extracted steps")
 
-    existing_patterns = re.findall(r'@(given|when|then|step)\(["\'](.+?)["\']\)', existing_code)
-    existing_patterns = [(decorator.lower(), pattern.lower()) for decorator, pattern in existing_patterns]
-
-    print(f"\nexisting_patterns: {existing_patterns}\n")
-    new_add_patterns = ()
-    for item in steps:
-        step_code = generate_step_definition(item)
+    print(f"\nexisting_patterns: {len(registry)} step definitions in {registry.steps_dir}\n")
+    new_add_patterns = set()
+    for group in group_multi_calls(steps):
+        item = group[0]
+        step_code = generate_step_definition(item) if len(group) == 1 else generate_batch_step_definition(group)
         step_text = item.get('step_text', '')
         step_type = item.get('step_type', '')
-        print(f"\nexisting_patterns check: {(step_type, step_text.lower())}\n")
-        if (step_type, step_text.lower()) in existing_patterns:
+        existing = registry.find(step_type, step_text)
+        print(f"\nexisting_patterns check: {(step_type, step_text.lower())} -> {existing}\n")
+        if existing is not None:
             continue
         if (step_type, step_text.lower()) in new_add_patterns and item.get("call_idx", 0) <= 1:
             continue
             # step_code = generate_step_definition(item)
         if step_code:
             new_steps_code.append(step_code)
-            new_add_patterns += ((step_type, step_text.lower()),)
+            new_add_patterns.add((step_type, step_text.lower()))
 
     browser_manager.proposed_changes = new_steps_code
     browser_manager.new_steps_count = len(new_steps_code)
@@ -302,6 +372,8 @@ def log_params(func, *args, **kwargs):
         tool_params[k] = v
     
     tool_params['need_snapshot'] = 0
+    for k in SNAPSHOT_ONLY_PARAMS + SESSION_PARAMS:
+        tool_params.pop(k, None)
     return tool_params
 
 
@@ -0,0 +1,216 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import metrics, PHASE_SEARCH
+from utils.selector import compile_selector, from_kwargs
+from utils.uia_cache import format_runtime_id
+from utils.wait_util import STRUCTURE_CHANGED, PROPERTY_CHANGED
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_EXISTS_TIMEOUT = 0.5
+DEFAULT_FIND_TIMEOUT = 5
+LOCATOR_CACHE_SIZE = 256
+SELECTOR_RETRY_INTERVAL = 0.1  # seconds between two walks of a selector that matched nothing yet
+
+
+class ElementNotFound(LookupError):
+    def __init__(self, search_kwargs, timeout):
+        super().__init__(f"Element not found within {timeout} seconds: {search_kwargs}")
+        self.search_kwargs = search_kwargs
+
+
+def locator_key(search_kwargs, scope=None):
+    return (scope,) + tuple(sorted((k, str(v)) for k, v in search_kwargs.items()))
+
+
+def parent_key(parent):
+    """
+    Identity of the search root, part of the cache key: the criteria of a
+    window specification (the main window is looked up by handle, so no UIA
+    call), the runtime id of a resolved element.
+    """
+    if parent is None:
+        return None
+    # not getattr: a WindowSpecification resolves unknown attributes through the UI
+    criteria = getattr(parent, "__dict__", {}).get("criteria")
+    if criteria is not None:
+        return tuple(locator_key(c) for c in (criteria if isinstance(criteria, list) else [criteria]))
+    try:
+        return format_runtime_id(parent.element_info.runtime_id)
+    except Exception:
+        return id(parent)
+
+
+def matches_criteria(element, search_kwargs):
+    """Cheap re-check that a resolved element still satisfies the search criteria."""
+    if "selector" in search_kwargs:
+        return compile_selector(search_kwargs["selector"]).matches_leaf(element)
+    if "title" in search_kwargs or "title_re" in search_kwargs:
+        title = element.window_text()
+        if "title" in search_kwargs and title != search_kwargs["title"]:
+            return False
+        if "title_re" in search_kwargs and not re.match(search_kwargs["title_re"], title):
+            return False
+    return True
+
+
+class LocatorCache:
+    """
+    Session cache mapping search criteria, under a search root (``scope``,
+    see parent_key), to the element they resolved to.
+
+    Entries remember the event sequence at which they were last validated.
+    With a live event source and no structure or property event since, a
+    hit costs nothing; otherwise the element is revalidated (same runtime
+    id, title still matching) before being returned. Navigation and browser
+    restarts drop the whole cache through ``invalidate``.
+    """
+    def __init__(self, max_entries=LOCATOR_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> {"element", "runtime_id", "seq"}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stale = 0
+
+    def get(self, search_kwargs, events=None, scope=None):
+        key = locator_key(search_kwargs, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        if events is not None and events.live \
+                and not events.last_event((STRUCTURE_CHANGED, PROPERTY_CHANGED), entry["seq"]):
+            self.hits += 1
+            return entry["element"]
+
+        element = entry["element"]
+        try:
+            alive = format_runtime_id(element.element_info.runtime_id) == entry["runtime_id"]
+            valid = alive and matches_criteria(element, search_kwargs)
+        except Exception:
+            valid = False
+        with self._lock:
+            if not valid:
+                self._entries.pop(key, None)
+                self.stale += 1
+                self.misses += 1
+                return None
+            entry["seq"] = events.mark() if events is not None and events.live else 0
+            self.revalidated += 1
+            self.hits += 1
+        return element
+
+    def put(self, search_kwargs, element, events=None, scope=None):
+        try:
+            runtime_id = format_runtime_id(element.element_info.runtime_id)
+        except Exception:
+            runtime_id = None
+        if runtime_id is None:
+            return
+        with self._lock:
+            self._entries[locator_key(search_kwargs, scope)] = {
+                "element": element,
+                "runtime_id": runtime_id,
+                "seq": events.mark() if events is not None and events.live else 0,
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, reason=""):
+        with self._lock:
+            if self._entries:
+                logger.info(f"Locator cache invalidated ({reason}): {len(self._entries)} entries dropped")
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "revalidated": self.revalidated, "stale": self.stale}
+
+
+@metrics.timed(PHASE_SEARCH)
+def find_element(browser_manager, parent, search_kwargs, timeout=DEFAULT_EXISTS_TIMEOUT):
+    """
+    Resolve ``parent.child_window(**search_kwargs)`` through the session
+    locator cache, then the session's UI mirror, then a live search.
+    Returns the wrapper, or None when nothing matched within ``timeout``
+    seconds.
+
+    ``search_kwargs`` may also be a selector (utils.selector). Selectors of
+    exact matches only, like plain criteria, take the path above; the
+    others, and title_re criteria, are matched in one walk of the tree.
+    """
+    if isinstance(search_kwargs, str):
+        selector = compile_selector(search_kwargs)
+    else:
+        selector = from_kwargs(search_kwargs) if "title_re" in search_kwargs else None
+    if selector is not None and selector.kwargs is not None:
+        search_kwargs, selector = selector.kwargs, None
+    if selector is not None:
+        return _find_selector(browser_manager, parent, selector, timeout)
+
+    cache = browser_manager.locator_cache
+    events = browser_manager.ui_events
+    scope = parent_key(parent)
+    element = cache.get(search_kwargs, events, scope)
+    if element is not None:
+        return element
+
+    mirror = browser_manager.mirror_for(parent)
+    if mirror is not None and mirror.supports(search_kwargs):
+        try:
+            element = mirror.find(search_kwargs)
+        except Exception as e:
+            logger.warning(f"UI mirror lookup failed, searching live: {repr(e)}")
+            mirror.invalidate()
+        if element is not None:
+            cache.put(search_kwargs, element, browser_manager.ui_events, scope)
+            return element
+
+    spec = parent.child_window(**search_kwargs)
+    if not spec.exists(timeout=timeout):
+        return None
+    element = spec.wrapper_object()
+    cache.put(search_kwargs, element, events, scope)
+    return element
+
+
+def _find_selector(browser_manager, parent, selector, timeout):
+    cache = browser_manager.locator_cache
+    key = {"selector": selector.text, "found_index": selector.index}
+    scope = parent_key(parent)
+    element = cache.get(key, browser_manager.ui_events, scope)
+    if element is not None:
+        return element
+    deadline = time.time() + (timeout or 0)
+    while True:
+        try:
+            element = selector.find(parent.wrapper_object())
+        except Exception as e:  # parent gone or tree changing under the walk, like a failed exists()
+            logger.info(f"Selector walk of {selector.text!r} failed: {repr(e)}")
+            element = None
+        if element is not None:
+            cache.put(key, element, browser_manager.ui_events, scope)
+            return element
+        if time.time() >= deadline:
+            return None
+        time.sleep(SELECTOR_RETRY_INTERVAL)
+
+
+def resolve_element(browser_manager, parent, search_kwargs, timeout=DEFAULT_FIND_TIMEOUT):
+    """Like find_element but raises ElementNotFound instead of returning None."""
+    element = find_element(browser_manager, parent, search_kwargs, timeout=timeout)
+    if element is None:
+        raise ElementNotFound(search_kwargs, timeout)
+    return element
@@ -1,55 +1,198 @@
-
+import atexit
+import hashlib
 import logging
+import logging.handlers
 import json
 import os
+import queue
+import time
 import uuid
 from datetime import datetime
 
 from functools import wraps
 
+from utils.metrics import metrics
+
 
 log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
 os.makedirs(log_dir, exist_ok=True)
 log_file = os.path.join(log_dir, f'mcp_server_{datetime.now().strftime("%Y%m%d")}.log')
+# Large tool results, stored once per content hash
+blob_dir = os.path.join(log_dir, 'blobs')
+
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"  # one JSON object per line
+LOG_FORMATS = (LOG_FORMAT_TEXT, LOG_FORMAT_JSON)
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+MAX_LOGGED_CHARS = 1000
+
+
+def _cap(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...(+{len(text) - max_chars} chars)"
+
+
+def store_blob(text):
+    """Write ``text`` to the blob directory under its hash, once. Returns the path relative to the log directory."""
+    digest = hashlib.sha1(text.encode('utf-8', 'replace')).hexdigest()[:16]
+    name = os.path.join('blobs', f'{digest}.json')
+    path = os.path.join(log_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(blob_dir, exist_ok=True)
+        try:
+            with open(path, 'x', encoding='utf-8') as f:
+                f.write(text)
+        except FileExistsError:
+            pass
+    return name
+
+
+class LazyJson:
+    """
+    Log argument serialized with json.dumps only when the record is formatted,
+    which happens on the listener thread, and capped at ``max_chars``.
+    """
+    def __init__(self, value, max_chars=MAX_LOGGED_CHARS):
+        self.value = value
+        self.max_chars = max_chars
+        self._text = None
+        self._capped = False
+
+    def _serialize(self):
+        try:
+            text = json.dumps(self.value, ensure_ascii=False)
+        except TypeError:
+            return f"[Unable to serialize: {type(self.value)}]"
+        self._capped = len(text) > self.max_chars
+        return _cap(text, self.max_chars)
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self._serialize()
+        return self._text
+
+    def json_value(self):
+        text = str(self)
+        return text if self._capped else self.value
+
+
+class LazyResult(LazyJson):
+    """Tool result for the log: small ones as they are, large ones stored by hash and referenced."""
+    def _serialize(self):
+        text = self.value
+        if not isinstance(text, str):
+            try:
+                text = json.dumps(text, ensure_ascii=False)
+            except TypeError:
+                return f"[Unable to serialize: {type(self.value)}]"
+        if len(text) <= self.max_chars:
+            return text
+        self._capped = True
+        return f"[{len(text)} chars stored in {store_blob(text)}]"
+
+    def json_value(self):
+        return str(self)
 
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record. Tool call records carry their fields as ``record.fields``."""
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name}
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=self._default)
+
+    @staticmethod
+    def _default(value):
+        if isinstance(value, LazyJson):
+            return value.json_value()
+        return str(value)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves records marked ``lazy`` unformatted, so that
+    their LazyJson arguments are serialized by the listener thread. Their
+    arguments must not be mutated after the call.
+    """
+    def prepare(self, record):
+        if getattr(record, "lazy", False):
+            return record
+        return super().prepare(record)
+
+
+def _formatter(log_format):
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unsupported log format: {log_format}, expected one of {LOG_FORMATS}")
+    return JsonLinesFormatter() if log_format == LOG_FORMAT_JSON else logging.Formatter(TEXT_FORMAT)
+
+
+# File and console output run on a listener thread, callers only enqueue
+_handlers = [logging.FileHandler(log_file, encoding='utf-8'), logging.StreamHandler()]
+_listener = logging.handlers.QueueListener(queue.SimpleQueue(), *_handlers, respect_handler_level=True)
+
+
+def set_log_format(log_format):
+    """Switch the file and console output between "text" and "json" lines."""
+    for handler in _handlers:
+        handler.setFormatter(_formatter(log_format))
+
+
+set_log_format(os.environ.get('MCP_LOG_FORMAT', LOG_FORMAT_TEXT))
+_queue_handler = LazyQueueHandler(_listener.queue)
+# prepare() only merges the arguments into the message, the output handlers add the prefix
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    handlers=[_queue_handler]
 )
+_listener.start()
+atexit.register(_listener.stop)
+
 logger = logging.getLogger('mcp_server')
 
 # logger = logging.getLogger(__name__)
 
+
+def _extra(call_id, tool_name, event, **fields):
+    return {"lazy": True, "fields": {"call_id": call_id, "tool": tool_name, "event": event, **fields}}
+
+
 def log_tool_call(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
         tool_name = func.__name__
         call_id = str(uuid.uuid4())
+        params = LazyJson(dict(kwargs))
+        start = time.perf_counter()
 
-        logger.info(f"Tool Call - Start - ID: {call_id} - Tool: {tool_name} - Parameters: {json.dumps(kwargs, ensure_ascii=False)}")
+        logger.info("Tool Call - Start - ID: %s - Tool: %s - Parameters: %s", call_id, tool_name, params,
+                    extra=_extra(call_id, tool_name, "start", params=params))
         try:
-            result = await func(*args, **kwargs)
-
-            logger.info(f"Tool Call - Success - ID: {call_id} - Tool: {tool_name} - Parameters: {json.dumps(kwargs, ensure_ascii=False)}")
+            with metrics.tool_call(tool_name):
+                result = await func(*args, **kwargs)
 
-            if isinstance(result, (list, dict, str)) and len(str(result)) > 1000:
-                logger.info(f"Result: (large output, showing summary) Type: {type(result)}, Size: {len(str(result))} chars")
-            else:
-                try:
-                    logger.info(f"Result: {json.dumps(result, ensure_ascii=False)}")
-                except TypeError:
-                    logger.error(f"Result: [Unable to serialize: {type(result)}]")
+            duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            logger.info("Tool Call - Success - ID: %s - Tool: %s - Parameters: %s - Duration: %sms",
+                        call_id, tool_name, params, duration_ms,
+                        extra=_extra(call_id, tool_name, "success", duration_ms=duration_ms))
+            result_arg = LazyResult(result)
+            logger.info("Result: %s", result_arg,
+                        extra=_extra(call_id, tool_name, "result", result=result_arg))
 
             return result
 
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            logger.error(f"Tool Call - Error - ID: {call_id} - Tool: {tool_name} - Parameters: {json.dumps(kwargs, ensure_ascii=False)} - Error: {str(e)}")
+            logger.error("Tool Call - Error - ID: %s - Tool: %s - Parameters: %s - Error: %s",
+                         call_id, tool_name, params, e, exc_info=True,
+                         extra=_extra(call_id, tool_name, "error", params=params, error=str(e)))
             raise
 
     return wrapper
@@ -0,0 +1,178 @@
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# Phases of a tool call, see Metrics.phase
+PHASE_TOTAL = "total"
+PHASE_WINDOW = "window"  # main window resolution
+PHASE_SEARCH = "search"  # element search
+PHASE_ACTION = "action"  # click / type, between mark_ui and wait_for_ui
+PHASE_SETTLE = "settle"  # wait for the UI to settle
+PHASE_SNAPSHOT = "snapshot"
+PHASE_SERIALIZATION = "serialization"
+
+NO_TOOL = "(no tool)"
+SUB_BUCKET_BITS = 5  # 32 sub-buckets per power of two, about 3% precision
+DEFAULT_DUMP_INTERVAL = 60
+
+current_tool = contextvars.ContextVar("current_tool", default=None)
+_current_phase = contextvars.ContextVar("current_phase", default=None)
+
+
+class Histogram:
+    """
+    Latency histogram with HDR-style log-linear buckets over microseconds:
+    values below 2**SUB_BUCKET_BITS us are exact, larger ones fall into one
+    of 2**SUB_BUCKET_BITS buckets per power of two. Memory stays small and
+    the relative error of percentiles bounded whatever the range.
+    """
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}  # (shift, sub bucket) -> count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, us):
+        shift = max(0, us.bit_length() - self.sub_bucket_bits)
+        return shift, us >> shift
+
+    @staticmethod
+    def _bucket_value(bucket):
+        shift, sub = bucket
+        # middle of the bucket
+        return (sub << shift) + ((1 << shift) - 1) / 2
+
+    def record(self, seconds):
+        us = max(0, int(seconds * 1_000_000))
+        bucket = self._bucket(us)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += us
+        self.min = us if self.min is None else min(self.min, us)
+        self.max = us if self.max is None else max(self.max, us)
+
+    def percentile(self, p):
+        """Value in microseconds below which ``p`` percent of the recorded values fall."""
+        if not self.count:
+            return 0
+        rank = max(1, round(p / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.counts, key=self._bucket_value):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(self._bucket_value(bucket), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        def ms(us):
+            return round(us / 1000, 3)
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "total_ms": ms(self.total), "mean_ms": ms(self.total / self.count),
+                "min_ms": ms(self.min), "p50_ms": ms(self.percentile(50)), "p90_ms": ms(self.percentile(90)),
+                "p99_ms": ms(self.percentile(99)), "max_ms": ms(self.max)}
+
+
+class Metrics:
+    """
+    Histograms per (tool, phase). The tool is taken from the ``current_tool``
+    context variable set by ``tool_call`` (see utils.logger.log_tool_call),
+    so phases timed on the UI executor thread are attributed to the tool
+    that queued them. Nested phases are counted in the outermost one only.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # tool -> phase -> Histogram
+        self.started_at = time.time()
+        self._dump_thread = None
+
+    def record(self, phase, seconds, tool=None):
+        tool = tool or current_tool.get() or NO_TOOL
+        with self._lock:
+            phases = self._histograms.setdefault(tool, {})
+            histogram = phases.get(phase)
+            if histogram is None:
+                histogram = phases[phase] = Histogram()
+            histogram.record(seconds)
+
+    @contextlib.contextmanager
+    def tool_call(self, tool_name):
+        token = current_tool.set(tool_name)
+        phase_token = _current_phase.set(None)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(PHASE_TOTAL, time.perf_counter() - start, tool_name)
+            _current_phase.reset(phase_token)
+            current_tool.reset(token)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if _current_phase.get() is not None:
+            yield
+            return
+        token = _current_phase.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current_phase.reset(token)
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator timing every call of the function as phase ``name``."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self, tool=None, reset=False):
+        """{tool: {phase: summary}}, of one tool or of all of them."""
+        with self._lock:
+            result = {name: {phase: histogram.summary() for phase, histogram in phases.items()}
+                      for name, phases in self._histograms.items() if tool is None or name == tool}
+            if reset:
+                self._histograms = {}
+                self.started_at = time.time()
+        return result
+
+    def dump(self, path):
+        data = {"since": self.started_at, "time": time.time(), "tools": self.snapshot()}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_dump(self, path, interval=DEFAULT_DUMP_INTERVAL):
+        """Write the metrics to ``path`` every ``interval`` seconds and at exit."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                except Exception as e:
+                    logger.warning(f"Writing metrics to {path} failed: {repr(e)}")
+
+        if self._dump_thread is None:
+            self._dump_thread = threading.Thread(target=loop, name="metrics-dump", daemon=True)
+            self._dump_thread.start()
+            atexit.register(self.dump, path)
+
+
+metrics = Metrics()
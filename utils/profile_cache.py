@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_CACHE_DIR = Path(tempfile.gettempdir()) / "win_auto_mcp_profiles"
+MAX_TEMPLATES = 4
+MAX_CLONES = 8
+
+# Files a running browser never writes (LevelDB .ldb tables, installed
+# extensions) or only replaces through write-to-temp + rename (the
+# ImportantFileWriter JSON files), which leaves a hard link untouched. Anything
+# else - SQLite databases, logs, Sessions/, Visited Links, the disk caches and
+# files nobody listed yet - may be rewritten in place and is copied, so a run
+# can never modify the shared template.
+SHARED_NAMES = {"Preferences", "Secure Preferences", "Local State", "Bookmarks", "Bookmarks.bak"}
+SHARED_SUFFIXES = (".ldb",)
+SHARED_DIRS = {"Extensions"}
+
+LINK_LIST_FILE = ".link_list.json"
+TEMPLATE_VERSION = 2  # part of the template key, templates of older rules are never reused
+
+
+def can_share(rel_path):
+    """True for files a hard link to the template is safe for, see SHARED_NAMES."""
+    parts = Path(rel_path).parts
+    name = parts[-1]
+    return name in SHARED_NAMES or name.endswith(SHARED_SUFFIXES) or any(part in SHARED_DIRS for part in parts[:-1])
+
+
+def fingerprint(source):
+    """Hash of the relative path, size and mtime of every file under ``source``."""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            digest.update(f"{os.path.relpath(path, source)}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8", "replace"))
+    return digest.hexdigest()[:16]
+
+
+class ProfileCache:
+    """
+    Per-run browser profiles cloned from a cached template.
+
+    The first launch with a given source directory copies it once into a
+    template keyed by its fingerprint. Every run then gets a clone where
+    the files known to be only read or atomically replaced by the browser
+    are hard links to the template, and every other file is a real copy.
+    Least recently used clones and templates beyond the limits are deleted,
+    except clones still in use (handed out and not released yet).
+    """
+    def __init__(self, root=PROFILE_CACHE_DIR, max_templates=MAX_TEMPLATES, max_clones=MAX_CLONES):
+        self.root = Path(root)
+        self.max_templates = max_templates
+        self.max_clones = max_clones
+        self._lock = threading.Lock()
+        self._in_use = set()
+        self.templates_built = 0
+        self.files_linked = 0
+        self.files_copied = 0
+
+    @property
+    def templates_dir(self):
+        return self.root / "templates"
+
+    @property
+    def clones_dir(self):
+        return self.root / "clones"
+
+    def template(self, source):
+        """Template directory for ``source``, built on first use."""
+        source = Path(source).resolve()
+        key = f"{source.name}_{fingerprint(source)}_v{TEMPLATE_VERSION}"
+        template_dir = self.templates_dir / key
+        if not template_dir.exists():
+            # copied outside the lock so parallel launches of other profiles do not wait for it;
+            # two launches of the same new profile both build it and the first one wins
+            start = time.time()
+            building = self.templates_dir / f".building_{key}_{uuid.uuid4().hex[:8]}"
+            shutil.copytree(source, building)
+            link_list = []
+            for root, _, files in os.walk(building):
+                for name in files:
+                    rel = os.path.relpath(os.path.join(root, name), building)
+                    if can_share(rel):
+                        link_list.append(rel)
+            with open(building / LINK_LIST_FILE, "w", encoding="utf-8") as f:
+                json.dump(sorted(link_list), f)
+            with self._lock:
+                if template_dir.exists():
+                    shutil.rmtree(building, ignore_errors=True)
+                else:
+                    os.replace(building, template_dir)
+                    self.templates_built += 1
+                    logger.info(f"[ProfileCache] Template {template_dir} built from {source} in {time.time() - start:.2f}s")
+        with self._lock:
+            os.utime(template_dir)
+        return template_dir
+
+    def clone(self, source, prefix="win_auto_mcp_user_data_"):
+        """New profile directory with the content of ``source``, cheap to create."""
+        template_dir = self.template(source)
+        with open(template_dir / LINK_LIST_FILE, encoding="utf-8") as f:
+            link_set = set(json.load(f))
+
+        start = time.time()
+        dest_dir = self.clones_dir / f"{prefix}{Path(source).name}_{uuid.uuid1()}"
+        with self._lock:
+            self._in_use.add(dest_dir)
+        linked = copied = 0
+        for root, _, files in os.walk(template_dir):
+            rel_root = os.path.relpath(root, template_dir)
+            target_root = dest_dir / rel_root
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                rel = os.path.normpath(os.path.join(rel_root, name))
+                if rel == LINK_LIST_FILE:
+                    continue
+                src, dst = os.path.join(root, name), target_root / name
+                if rel in link_set:
+                    try:
+                        os.link(src, dst)
+                        linked += 1
+                        continue
+                    except OSError:
+                        pass  # other volume or no hard link support
+                shutil.copy2(src, dst)
+                copied += 1
+        self.files_linked += linked
+        self.files_copied += copied
+        logger.info(f"[ProfileCache] Cloned {dest_dir}: {linked} linked, {copied} copied, {time.time() - start:.2f}s")
+        self.evict()
+        return dest_dir
+
+    def empty(self, prefix="win_auto_mcp_session_"):
+        """New empty profile directory, evicted like the clones."""
+        dest_dir = self.clones_dir / f"{prefix}{uuid.uuid1()}"
+        os.makedirs(dest_dir)
+        with self._lock:
+            self._in_use.add(dest_dir)
+        self.evict()
+        return dest_dir
+
+    def release(self, clone_dir, delete=True):
+        """The browser using ``clone_dir`` is gone: delete it, or leave it to the LRU eviction."""
+        if not clone_dir:
+            return
+        clone_dir = Path(clone_dir)
+        with self._lock:
+            self._in_use.discard(clone_dir)
+        if delete and clone_dir.parent == self.clones_dir:
+            shutil.rmtree(clone_dir, ignore_errors=True)
+
+    def evict(self):
+        """Delete least recently used clones and templates beyond the limits."""
+        with self._lock:
+            self._evict_lru(self.clones_dir, self.max_clones)
+            self._evict_lru(self.templates_dir, self.max_templates)
+
+    def _evict_lru(self, directory, limit):
+        if not directory.exists():
+            return
+        entries = [p for p in directory.iterdir() if p.is_dir() and not p.name.startswith(".")]
+        entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        in_use = [p for p in entries if p in self._in_use]
+        idle = [p for p in entries if p not in self._in_use]
+        for path in idle[max(0, limit - len(in_use)):]:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"[ProfileCache] Evicted {path}")
+
+    def stats(self):
+        return {"templates_built": self.templates_built, "files_linked": self.files_linked,
+                "files_copied": self.files_copied}
@@ -2,6 +2,8 @@ import json
 from datetime import datetime
 from typing import Any, Dict, Optional, Union, Literal
 
+from utils.metrics import metrics, PHASE_SERIALIZATION
+
 
 def init_tool_response() -> Dict[str, Any]:
     return {
@@ -10,6 +12,7 @@ def init_tool_response() -> Dict[str, Any]:
         "data": {},
     }
 
+@metrics.timed(PHASE_SERIALIZATION)
 def format_tool_response(
     response_dict: Dict[str, Any]
 ) -> str:
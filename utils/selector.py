@@ -0,0 +1,304 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from utils.uia_cache import select_provider
+
+
+logger = logging.getLogger(__name__)
+
+
+PLAN_CACHE_SIZE = 256
+REGEX_CACHE_SIZE = 256
+
+# selector attribute -> node field, with the child_window keyword of an exact match
+ATTRIBUTES = {
+    "title": ("title", "title"),
+    "name": ("title", "title"),
+    "control_type": ("control_type", "control_type"),
+    "auto_id": ("automation_id", "auto_id"),
+    "automation_id": ("automation_id", "auto_id"),
+    "class_name": ("class_name", "class_name"),
+}
+# child_window criteria a selector can express, see from_kwargs
+KWARGS_ATTRIBUTES = {"title": ("title", "="), "title_re": ("title", "~="), "control_type": ("control_type", "="),
+                     "auto_id": ("auto_id", "="), "class_name": ("class_name", "=")}
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<child>>)
+  | (?P<nth>:nth-of-type\(\s*(?P<n>\d+)\s*\))
+  | (?P<attr>\[\s*(?P<name>\w+)\s*(?P<op>\*=|\^=|\$=|~=|=)\s*
+        (?:"(?P<dq>(?:[^"\\]|\\.)*)"|'(?P<sq>(?:[^'\\]|\\.)*)'|(?P<bare>[^\]\s]+))\s*\])
+  | (?P<type>\*|[A-Za-z_]\w*)
+""", re.VERBOSE)
+_ESCAPE = re.compile(r"\\([\\\"'])")  # only quotes and backslashes, so regex escapes pass through
+
+
+class SelectorError(ValueError):
+    pass
+
+
+class _LRU:
+    """Small LRU map, shared by every session (plans and regexes do not depend on the UI)."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = build(key)
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_plans = _LRU(PLAN_CACHE_SIZE)
+_regexes = _LRU(REGEX_CACHE_SIZE)
+
+
+def quote(value):
+    """``value`` as a selector string literal, whatever characters it holds."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _test(field, op, value):
+    """Predicate on a node field. Literal operators never go through re."""
+    if op == "=":
+        return lambda text: text == value
+    if op == "*=":
+        return lambda text: value in text
+    if op == "^=":
+        return lambda text: text.startswith(value)
+    if op == "$=":
+        return lambda text: text.endswith(value)
+    pattern = _regexes.get(value, re.compile)
+    return lambda text: pattern.match(text) is not None
+
+
+class _Fields(dict):
+    """Fields of a node, read on first use: a walk only pays for the properties its tests look at."""
+    def __init__(self, node):
+        super().__init__()
+        self.node = node
+
+    def __missing__(self, field):
+        if field == "title":
+            self["title"] = self.node.title() or ""
+        else:
+            static = self.node.static()
+            self.update(control_type=static["control_type"] or "", automation_id=static["automation_id"] or "",
+                        class_name=static["class_name"] or "")
+        return self[field]
+
+
+class Step:
+    """One compound of a selector: attribute tests, an optional nth-of-type, and how it hangs off the previous step."""
+    def __init__(self, combinator):
+        self.combinator = combinator  # " " descendant, ">" child of the previous step (or of the search root)
+        self.tests = []  # (field, op, value, predicate); control type and literals first
+        self.nth = None  # 1-based position among the siblings of the same control type
+
+    def add(self, attribute, op, value):
+        if attribute not in ATTRIBUTES:
+            raise SelectorError(f"Unknown selector attribute '{attribute}', expected one of {sorted(ATTRIBUTES)}")
+        field = ATTRIBUTES[attribute][0]
+        self.tests.append((field, op, value, _test(field, op, value)))
+        # static properties before the title, literal operators before regexes
+        self.tests.sort(key=lambda t: (t[0] == "title", t[1] == "~="))
+
+    def matches(self, fields, nth_of_type):
+        if self.nth is not None and self.nth != nth_of_type:
+            return False
+        for field, _, _, predicate in self.tests:
+            if not predicate(fields[field]):
+                return False
+        return True
+
+    def __repr__(self):
+        tests = "".join(f"[{field}{op}{quote(value)}]" for field, op, value, _ in self.tests)
+        nth = f":nth-of-type({self.nth})" if self.nth is not None else ""
+        return f"{self.combinator}*{tests}{nth}"
+
+
+class Selector:
+    """
+    Compiled selector: a list of steps matched in a single preorder walk.
+
+    The walk keeps, for every node, the steps its ancestors left open (a
+    descendant step stays open below its match, a child step only for the
+    direct children), so a node is read once whatever the number of steps.
+    Results come in document order, like child_window's ``found_index``.
+    """
+    def __init__(self, text, steps, index=0):
+        self.text = text
+        self.steps = steps
+        self.index = index  # match returned by find, found_index of the kwargs it was built from
+        self.kwargs = self._literal_kwargs()
+        self.counts_types = any(step.nth is not None for step in steps)
+
+    def _literal_kwargs(self):
+        """child_window criteria of a single step of exact matches (the fast path), else None."""
+        if len(self.steps) != 1 or self.steps[0].nth is not None or self.steps[0].combinator != " ":
+            return None
+        kwargs = {}
+        for field, op, value, _ in self.steps[0].tests:
+            keyword = next(kw for f, kw in ATTRIBUTES.values() if f == field)
+            if op != "=" or kwargs.get(keyword, value) != value:
+                return None
+            kwargs[keyword] = value
+        if self.index:
+            kwargs["found_index"] = self.index
+        return kwargs
+
+    def find_all(self, root, provider=None, limit=None):
+        """Provider nodes of the descendants of ``root`` matching the selector, in document order."""
+        provider = provider or select_provider(root, subtree=True)
+        last = len(self.steps) - 1
+        found = []
+        stack = []
+
+        def push_children(node, deep, near):
+            # deep: steps open from any ancestor, near: steps open from the parent only
+            children, counts, nth = [], {}, None
+            for child in node.children():
+                fields = _Fields(child)
+                if self.counts_types:
+                    counts[fields["control_type"]] = nth = counts.get(fields["control_type"], 0) + 1
+                children.append((child, fields, nth, deep, near))
+            stack.extend(reversed(children))
+
+        first = frozenset((0,))
+        push_children(provider.root(root), first if self.steps[0].combinator == " " else frozenset(),
+                      first if self.steps[0].combinator == ">" else frozenset())
+        while stack:
+            node, fields, nth, deep, near = stack.pop()
+            matched = [i for i in deep | near if self.steps[i].matches(fields, nth)]
+            if last in matched:
+                found.append(node)
+                if limit is not None and len(found) >= limit:
+                    return found
+            open_steps = [i + 1 for i in matched if i < last]
+            deep = deep.union(i for i in open_steps if self.steps[i].combinator == " ")
+            near = frozenset(i for i in open_steps if self.steps[i].combinator == ">")
+            if deep or near:
+                push_children(node, deep, near)
+        return found
+
+    def find(self, root, provider=None):
+        """Live element of the match at ``index`` (found_index) below ``root``, or None."""
+        found = self.find_all(root, provider, limit=self.index + 1)
+        return found[self.index].element if len(found) > self.index else None
+
+    def matches_leaf(self, element):
+        """Cheap re-check of the last step's tests on an element, for cached results."""
+        info = element.element_info
+        fields = {"title": element.window_text() or "", "control_type": info.control_type or "",
+                  "automation_id": info.automation_id or "", "class_name": info.class_name or ""}
+        return all(predicate(fields[field]) for field, _, _, predicate in self.steps[-1].tests)
+
+    def __repr__(self):
+        return f"<Selector {self.text!r}>"
+
+
+def _parse(text):
+    steps, combinator, step, pos = [], " ", None, 0
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            raise SelectorError(f"Invalid selector {text!r} at {pos}: {text[pos:pos + 10]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "ws":
+            if step is not None:
+                steps.append(step)
+                step = None
+            continue
+        if kind == "child":
+            if step is not None:
+                steps.append(step)
+                step = None
+            if combinator == ">":
+                raise SelectorError(f"Invalid selector {text!r} at {m.start()}: '>' twice")
+            combinator = ">"
+            continue
+        if step is None:
+            step, combinator = Step(combinator), " "
+        elif kind == "type":
+            raise SelectorError(f"Invalid selector {text!r} at {m.start()}: control type must come first")
+        if kind == "type":
+            if m.group("type") != "*":
+                step.add("control_type", "=", m.group("type"))
+        elif kind == "nth":
+            step.nth = int(m.group("n"))
+            if step.nth < 1:
+                raise SelectorError(f"Invalid selector {text!r}: nth-of-type counts from 1")
+        else:
+            quoted = m.group("dq") if m.group("dq") is not None else m.group("sq")
+            value = _ESCAPE.sub(r"\1", quoted) if quoted is not None else m.group("bare")
+            step.add(m.group("name"), m.group("op"), value)
+    if step is not None:
+        steps.append(step)
+    if not steps or combinator == ">":
+        raise SelectorError(f"Invalid selector {text!r}: missing a step")
+    return Selector(text, steps)
+
+
+def compile_selector(text):
+    """
+    Compile a selector, cached by text.
+
+    Steps are separated by whitespace (descendant) or ``>`` (direct child),
+    a leading ``>`` anchors the first step to the children of the search
+    root. A step is an optional control type (or ``*``), attribute tests and
+    an optional ``:nth-of-type(n)``:
+
+        Pane[title="Favorites"] > TreeItem[title*="Work (2024)"]:nth-of-type(2)
+
+    Attributes: title (name), control_type, auto_id (automation_id),
+    class_name. Operators: ``=`` equals, ``*=`` contains, ``^=`` starts
+    with, ``$=`` ends with, ``~=`` regex (matched at the start, like
+    child_window's title_re). Values are quoted with " or ' (``\\"``,
+    ``\\'`` and ``\\\\`` are the only escapes); use ``quote`` to embed
+    arbitrary text.
+    """
+    return _plans.get(text, _parse)
+
+
+def _from_kwargs(key):
+    kwargs = dict(key)
+    step = Step(" ")
+    for keyword, (attribute, op) in KWARGS_ATTRIBUTES.items():
+        if keyword in kwargs:
+            step.add(attribute, op, kwargs[keyword])
+    text = "".join(f"[{attribute}{op}{quote(kwargs[keyword])}]"
+                   for keyword, (attribute, op) in KWARGS_ATTRIBUTES.items() if keyword in kwargs)
+    return Selector(text or "*", [step], index=int(kwargs.get("found_index") or 0))
+
+
+def from_kwargs(search_kwargs):
+    """Selector equivalent to ``child_window(**search_kwargs)``, None for criteria it cannot express."""
+    if not all(key in KWARGS_ATTRIBUTES or key == "found_index" for key in search_kwargs):
+        return None
+    return _plans.get(("kwargs",) + tuple(sorted((k, v) for k, v in search_kwargs.items())),
+                      lambda key: _from_kwargs(key[1:]))
+
+
+def cache_stats():
+    return {"plans": _plans.stats(), "regexes": _regexes.stats()}
@@ -0,0 +1,577 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.locator import resolve_element
+from utils.metrics import metrics, PHASE_SNAPSHOT, PHASE_SERIALIZATION
+from utils.snapshot_codec import encode_snapshot, FORMAT_JSON
+from utils.snapshot_stream import SnapshotStream
+from utils.uia_cache import select_provider
+from utils.ui_executor import co_initialize
+
+
+logger = logging.getLogger(__name__)
+
+
+# Document panes hosted in the browser chrome that are not web pages
+NON_WEB_DOCUMENTS = ["Favorites", "Downloads", "History", "Copilot"]
+
+SNAPSHOT_TIME_BUDGET = 8
+
+
+def is_web_page_root(info):
+    return info["automation_id"] == "RootWebArea" and info["control_type"] == "Document" \
+        and info["title"] not in NON_WEB_DOCUMENTS \
+        and not info["title"].startswith("Microsoft Copilot")
+
+
+def read_node(node, known=None):
+    """
+    Read the snapshot fields of a single provider node (see utils.uia_cache).
+
+    ``known`` is the record of the same runtime id from the previous snapshot.
+    control_type / automation_id / class_name never change for a runtime id,
+    and neither does the set of supported patterns, so with a known record only
+    the title, the rectangle and the values of supported patterns are fetched.
+
+    Returns (info, record) where record is what should be passed as ``known``
+    next time.
+    """
+    if known is None:
+        static = node.static()
+        patterns = {"value": True, "toggle": static["control_type"] == "CheckBox", "expand": True}
+    else:
+        static = known["static"]
+        patterns = dict(known["patterns"])
+
+    left, top, right, bottom = node.rectangle()
+    info = {
+        "title": node.title(),
+        "control_type": static["control_type"],
+        "automation_id": static["automation_id"],
+        "class_name": static["class_name"],
+        "rectangle": {
+            "left": left,
+            "top": top,
+            "right": right,
+            "bottom": bottom
+        },
+        "children": []
+    }
+    if patterns["value"]:
+        try:
+            info["value"] = node.value(),
+        except Exception:
+            patterns["value"] = False
+
+    if patterns["toggle"]:
+        try:
+            info["is_checked"] = node.toggle_state() == 1
+        except Exception:
+            patterns["toggle"] = False
+
+    collapsed = False
+    if patterns["expand"]:
+        try:
+            is_expanded = node.is_expanded()
+            if static["control_type"] == "TreeItem":
+                info["is_expanded"] = is_expanded
+            collapsed = not is_expanded
+        except Exception:
+            patterns["expand"] = False
+
+    return info, {"static": static, "patterns": patterns, "collapsed": collapsed}
+
+
+class SnapshotEngine:
+    """
+    Incremental snapshot of a UI tree.
+
+    The engine keeps the records of the previous walk keyed by runtime id.
+    Elements seen before only have their changing fields re-read (see
+    ``read_node``), and when the caller knows which elements changed (from UIA
+    structure/property events) it passes them as ``dirty`` and every other
+    subtree is reused from the previous snapshot without touching UIA at all.
+
+    ``snapshot(..., diff=True)`` returns the added / removed / changed nodes
+    against the previous snapshot instead of the whole tree. Nodes carry an
+    ``id`` in that mode so the client can apply the diff.
+
+    Properties are read through a provider from utils.uia_cache; by default the
+    cheapest one available for the element is picked on every snapshot. With
+    ``workers`` > 1 and a provider that reads node by node, the top-level
+    subtrees are walked on that many threads.
+
+    ``max_nodes`` caps the size of the snapshot; nodes cut off by it, by the
+    time budget or by ``max_web_length`` are marked ``truncated`` (see _Walk).
+
+    Nodes keep the provider node they were read from (``source``), so a
+    subtree cut off by a budget can be walked later from where the snapshot
+    stopped, see utils.snapshot_handles.
+
+    Every walk leaves a ``content_hash`` of the tree. A walk is tagged with
+    the UI epoch it was made in (see BrowserSessionManager.ui_epoch); while
+    the epoch does not move, ``update`` reuses it instead of walking again.
+    """
+    def __init__(self, max_root_depth=6, max_web_length=5, time_budget=SNAPSHOT_TIME_BUDGET, provider=None, max_depth=None,
+                 max_nodes=None, workers=1, in_web_page=False):
+        self.provider = provider
+        self.max_root_depth = max_root_depth
+        self.max_web_length = max_web_length
+        self.time_budget = time_budget
+        self.max_depth = max_depth  # levels below the root to walk, None for no limit
+        self.max_nodes = max_nodes  # nodes in a snapshot, None for no limit
+        self.workers = workers
+        self.in_web_page = in_web_page  # the root is inside a web page, so max_web_length applies from the start
+        self._pool = None
+
+        self.version = 0
+        self._nodes = {}  # node id -> {"info", "record", "children", "parent", "source"}
+        self._root_id = None
+        self._epoch = None  # UI epoch of the last walk
+        self._base = None  # (nodes, root id, version) the next diff is taken against
+        self._lock = threading.RLock()
+        self.content_hash = None
+        self.last_stats = {}
+
+    def _worker_pool(self):
+        if self.workers <= 1:
+            return None
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="snapshot-walk",
+                                            initializer=co_initialize)
+        return self._pool
+
+    def reset(self):
+        with self._lock:
+            self.version = 0
+            self._nodes = {}
+            self._root_id = None
+            self._epoch = None
+            self._base = None
+            self.content_hash = None
+
+    @property
+    def nodes(self):
+        """Node map of the last walk. Every walk builds a new one, so it can be kept."""
+        return self._nodes
+
+    @property
+    def root_id(self):
+        return self._root_id
+
+    def is_current(self, epoch):
+        """The last walk was made in UI epoch ``epoch`` and can stand for a new one."""
+        return epoch is not None and epoch == self._epoch and self._root_id is not None
+
+    def snapshot(self, element, diff=False, dirty=None, epoch=None):
+        """
+        Walk ``element`` and return its snapshot.
+
+        Args:
+            element: Root wrapper to walk, usually the browser main window
+            diff: Return the changes against the previous snapshot instead of the full tree
+            dirty: Ids of nodes reported changed since the previous snapshot. None means
+                   unknown, which makes the engine visit every node.
+            epoch: UI epoch of the request, the last walk is reused when it was made in the same one
+        """
+        with self._lock:
+            self.update(element, dirty, epoch)
+            return self.result(diff)
+
+    def update(self, element, dirty=None, epoch=None, stream=None):
+        """
+        Walk ``element`` unless the last walk is current for ``epoch``. Returns False when it was reused.
+        Nodes are handed to ``stream`` (a utils.snapshot_stream.SnapshotStream) as they are read.
+        """
+        with self._lock:
+            if self.is_current(epoch):
+                self._base = (self._nodes, self._root_id, self.version)
+                self.last_stats = dict(self.last_stats, memo=True)
+                return False
+            time_s = time.time()
+            prev_nodes, prev_root = self._nodes, self._root_id
+            provider = self.provider or select_provider(element)
+            walk = _Walk(self, prev_nodes, dirty, stream)
+            pool = self._worker_pool() if not getattr(provider, "prefetched", False) else None
+            root_id = walk.run(provider.root(element), pool)
+
+            self._base = (prev_nodes, prev_root, self.version)
+            self.version += 1
+            self._nodes, self._root_id, self._epoch = walk.nodes, root_id, epoch
+            self.content_hash = tree_hash(walk.nodes, root_id)
+            self.last_stats = {
+                "version": self.version,
+                "read": walk.read,
+                "refreshed": walk.refreshed,
+                "reused": walk.reused,
+                "truncated": walk.truncated,
+                "workers": self.workers if pool is not None else 1,
+                "provider": provider.name,
+                "cost": round(time.time() - time_s, 3),
+            }
+            logger.info(f"snapshot stats: {self.last_stats}")
+            return True
+
+    def result(self, diff=False):
+        """Snapshot of the last ``update``: the whole tree, or with ``diff`` its changes against the walk before."""
+        with self._lock:
+            prev_nodes, prev_root, base_version = self._base or ({}, None, self.version)
+            self._base = None
+            if diff and prev_root is not None:
+                return {
+                    "diff": diff_nodes(prev_nodes, self._nodes, prev_root, self._root_id)
+                    if prev_nodes is not self._nodes else {"added": [], "removed": [], "changed": []},
+                    "base_version": base_version,
+                    "version": self.version,
+                }
+            return materialize(self._nodes, self._root_id, with_ids=diff)
+
+
+class _Walk:
+    """
+    Breadth-first walk of one snapshot.
+
+    Levels are read in order, so when the node or time budget runs out the
+    shallow part of the tree is complete and only the deepest nodes are
+    missing. Every node whose children were not all walked gets a
+    ``truncated`` field with the reason: ``max_children``, ``max_depth``,
+    ``node_budget`` or ``time_budget``. Nodes at the depth limit are not
+    asked for their children: they are marked ``max_depth`` unless the
+    provider already knows they have none. With a worker pool, the subtrees of the root's children
+    are walked concurrently, sharing the budgets.
+    """
+    def __init__(self, engine, prev_nodes, dirty, stream=None):
+        self.engine = engine
+        self.stream = stream
+        self.prev_nodes = prev_nodes
+        self.dirty = set(dirty) if dirty is not None else None
+        self.dirty_paths = _ancestor_ids(prev_nodes, self.dirty) if self.dirty is not None else set()
+        self.nodes = {}
+        self.deadline = time.time() + engine.time_budget
+        self.read = 0
+        self.refreshed = 0
+        self.reused = 0
+        self.truncated = {}  # reason -> number of nodes truncated for it
+        self.budget_used = 1  # the root
+        self._lock = threading.Lock()
+
+    def run(self, root, pool=None):
+        root_id, tasks = self.visit(root, parent_id=None, index=0, web_depth=0, in_web_page=self.engine.in_web_page,
+                                    depth=0)
+        if pool is not None and len(tasks) > 1:
+            for future in [pool.submit(self.walk, [task]) for task in tasks]:
+                future.result()
+        else:
+            self.walk(tasks)
+        for node in self.nodes.values():
+            if None in node["children"]:
+                node["children"] = [child_id for child_id in node["children"] if child_id is not None]
+        return root_id
+
+    def walk(self, tasks):
+        queue = deque(tasks)
+        while queue:
+            reason = self._take_budget()
+            if reason:
+                for task in queue:
+                    self._truncate(task[1], reason)
+                return
+            _, tasks = self.visit(*queue.popleft())
+            queue.extend(tasks)
+
+    def _take_budget(self):
+        if time.time() > self.deadline:
+            return "time_budget"
+        with self._lock:
+            if self.engine.max_nodes is not None and self.budget_used >= self.engine.max_nodes:
+                return "node_budget"
+            self.budget_used += 1
+        return None
+
+    def _truncate(self, node_id, reason):
+        with self._lock:
+            info = self.nodes[node_id]["info"]
+            if "truncated" not in info:
+                info["truncated"] = reason
+                self.truncated[reason] = self.truncated.get(reason, 0) + 1
+
+    def visit(self, node, parent_id, index, web_depth, in_web_page, depth):
+        """Read one node, returns its id and the tasks of the children to walk."""
+        node_id = node.runtime_id or f"{parent_id}/{index}"
+        prev = self.prev_nodes.get(node_id)
+
+        if prev is not None and self.dirty is not None \
+                and node_id not in self.dirty and node_id not in self.dirty_paths:
+            self._reuse_subtree(node_id, parent_id, index)
+            return node_id, []
+
+        known = prev["record"] if prev is not None else None
+        info, record = read_node(node, known)
+        with self._lock:
+            if known is None:
+                self.read += 1
+            else:
+                self.refreshed += 1
+            self.nodes[node_id] = {"info": info, "record": record, "children": [], "parent": parent_id, "source": node}
+            if parent_id is not None:
+                self.nodes[parent_id]["children"][index] = node_id
+        if self.stream is not None:
+            self.stream.add(node_id, parent_id, index, info)
+
+        if record["collapsed"]:
+            return node_id, []
+
+        if is_web_page_root(info):
+            in_web_page = True
+
+        if web_depth >= self.engine.max_root_depth \
+                or (self.engine.max_depth is not None and depth >= self.engine.max_depth):
+            if node.has_children() is not False:
+                self._truncate(node_id, "max_depth")
+            return node_id, []
+
+        next_web_depth = web_depth + 1 if web_depth > 0 else 0
+        if is_web_page_root(info) and web_depth == 0:
+            next_web_depth = 1
+
+        children = node.children()
+        if in_web_page and len(children) > self.engine.max_web_length:
+            children = children[:self.engine.max_web_length]
+            self._truncate(node_id, "max_children")
+        # slots filled in as the children are visited, the ones left empty are dropped
+        self.nodes[node_id]["children"] = [None] * len(children)
+        return node_id, [(child, node_id, i, next_web_depth, in_web_page, depth + 1) for i, child in enumerate(children)]
+
+    def _reuse_subtree(self, node_id, parent_id, index):
+        queue = deque([(node_id, parent_id, index)])
+        with self._lock:
+            if parent_id is not None:
+                self.nodes[parent_id]["children"][index] = node_id
+            while queue:
+                current_id, current_parent, current_index = queue.popleft()
+                prev = self.prev_nodes[current_id]
+                self.nodes[current_id] = dict(prev, parent=current_parent, children=list(prev["children"]))
+                self.reused += 1
+                self.budget_used += current_id != node_id
+                if self.stream is not None:
+                    self.stream.add(current_id, current_parent, current_index, prev["info"])
+                queue.extend((child_id, current_id, i) for i, child_id in enumerate(prev["children"]))
+
+
+def _ancestor_ids(nodes, node_ids):
+    """Ids of every ancestor of ``node_ids`` that must be visited to reach them."""
+    paths = set()
+    for node_id in node_ids:
+        node = nodes.get(node_id)
+        parent_id = node["parent"] if node else None
+        while parent_id is not None and parent_id not in paths:
+            paths.add(parent_id)
+            parent_id = nodes[parent_id]["parent"] if parent_id in nodes else None
+    if any(node_id not in nodes for node_id in node_ids):
+        # an unknown node changed, so its position is unknown: visit everything
+        paths.update(nodes.keys())
+    return paths
+
+
+def diff_nodes(old_nodes, new_nodes, old_root, new_root):
+    """
+    Compare two node maps produced by SnapshotEngine.
+
+    Returns {"added": [...], "removed": [...], "changed": [...]} where added
+    entries are whole subtrees attached under ``parent_id`` at ``index``,
+    removed entries are node ids and changed entries hold only the fields
+    that differ (plus the new child order when it changed).
+    """
+    added, removed, changed = [], [], []
+    if old_root != new_root:
+        removed.append(old_root)
+        added.append({"parent_id": None, "index": 0,
+                      "node": materialize(new_nodes, new_root, with_ids=True)})
+        return {"added": added, "removed": removed, "changed": changed}
+
+    for node_id, node in old_nodes.items():
+        if node_id not in new_nodes and node["parent"] in new_nodes:
+            removed.append(node_id)
+
+    for node_id, node in new_nodes.items():
+        old = old_nodes.get(node_id)
+        if old is None:
+            if node["parent"] in old_nodes:
+                parent = new_nodes[node["parent"]]
+                added.append({"parent_id": node["parent"],
+                              "index": parent["children"].index(node_id),
+                              "node": materialize(new_nodes, node_id, with_ids=True)})
+            continue
+
+        changes = {k: v for k, v in node["info"].items() if old["info"].get(k) != v}
+        changes.update({k: None for k in old["info"] if k not in node["info"]})
+        if old["children"] != node["children"]:
+            changes["children"] = list(node["children"])
+        if changes:
+            changed.append({"id": node_id, "changes": changes})
+
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def tree_hash(nodes, root_id):
+    """
+    Stable hash of the ids, fields and shape of the tree under ``root_id``.
+    read_node builds every info dict in the same key order, so its repr is
+    stable and much cheaper than a sorted json dump.
+    """
+    if root_id is None:
+        return None
+    parts, stack = [], [root_id]
+    while stack:
+        node_id = stack.pop()
+        node = nodes[node_id]
+        parts.append(f"{node_id!r}{node['info']!r}{len(node['children'])}")
+        stack.extend(reversed(node["children"]))
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def materialize(nodes, node_id, with_ids=False):
+    """
+    Rebuild the nested snapshot dict of ``node_id`` from a node map. Truncated
+    nodes always carry their id, expand_node walks below them.
+    """
+    node = nodes[node_id]
+    info = {"id": node_id} if with_ids or "truncated" in node["info"] else {}
+    info.update(node["info"])
+    info["children"] = [materialize(nodes, child_id, with_ids) for child_id in node["children"]]
+    return info
+
+
+def filter_tree(tree, include=None, exclude=None):
+    """
+    Keep only the nodes whose control_type passes ``include`` / ``exclude``.
+    Children of dropped nodes move up to the nearest kept ancestor; the root
+    is always kept.
+    """
+    def keep(node):
+        control_type = node.get("control_type")
+        return (not include or control_type in include) and (not exclude or control_type not in exclude)
+
+    def collect(children):
+        kept = []
+        for child in children:
+            grandchildren = collect(child.get("children", []))
+            if keep(child):
+                kept.append(dict(child, children=grandchildren))
+            else:
+                kept.extend(grandchildren)
+        return kept
+
+    return dict(tree, children=collect(tree.get("children", [])))
+
+
+class SnapshotScope:
+    """
+    Part of the UI a tool snapshot covers, parsed from the ``snapshot_scope``
+    tool parameter:
+
+        root: child_window criteria of the element to start from (default: main window)
+        max_depth: levels below the root to walk
+        max_children: children kept per node inside web pages (default 5)
+        max_nodes: nodes in the snapshot, the deepest ones are dropped first
+        time_budget: seconds the walk may take (default 8)
+        include / exclude: control types to keep / drop, children of dropped nodes move up
+        changed_only: return only the changes since the previous snapshot of the same scope
+    """
+    KEYS = ("root", "max_depth", "max_children", "max_nodes", "time_budget", "include", "exclude", "changed_only")
+
+    def __init__(self, root=None, max_depth=None, max_children=None, max_nodes=None, time_budget=None,
+                 include=None, exclude=None, changed_only=False):
+        self.root = root
+        self.max_depth = max_depth
+        self.max_children = max_children
+        self.max_nodes = max_nodes
+        self.time_budget = time_budget
+        self.include = include
+        self.exclude = exclude
+        self.changed_only = changed_only
+
+    @classmethod
+    def from_param(cls, scope):
+        if not scope:
+            return cls()
+        unknown = set(scope) - set(cls.KEYS)
+        if unknown:
+            raise ValueError(f"Unknown snapshot_scope keys: {sorted(unknown)}, expected some of {cls.KEYS}")
+        return cls(**scope)
+
+    def engine_key(self):
+        """Scopes walking the same elements share an engine, and so the diff baseline."""
+        if self.root is None and self.max_depth is None and self.max_children is None and self.max_nodes is None \
+                and self.time_budget is None:
+            return None
+        root = tuple(sorted((k, str(v)) for k, v in (self.root or {}).items()))
+        return root, self.max_depth, self.max_children, self.max_nodes, self.time_budget
+
+    def content_hash(self, tree_hash):
+        """Hash of the snapshot this scope returns, from the hash of the engine's tree."""
+        if not (self.include or self.exclude) or tree_hash is None:
+            return tree_hash
+        filters = json.dumps([sorted(self.include or []), sorted(self.exclude or [])])
+        return hashlib.sha1(f"{tree_hash}|{filters}".encode("utf-8")).hexdigest()[:16]
+
+    def new_engine(self):
+        return SnapshotEngine(max_web_length=self.max_children if self.max_children is not None else 5,
+                              time_budget=self.time_budget if self.time_budget is not None else SNAPSHOT_TIME_BUDGET,
+                              max_depth=self.max_depth, max_nodes=self.max_nodes)
+
+
+def take_snapshot(browser_manager, diff: int = 0, snapshot_format: str = FORMAT_JSON, scope: dict = None,
+                  last_hash: str = "", stream: int = 0):
+    """
+    Snapshot the browser main window, or the part ``scope`` selects, through the session's snapshot engines.
+
+    The snapshot carries its ``snapshot_hash``. When it equals ``last_hash`` (the hash the caller
+    saw last) only {"unchanged": true, "snapshot_hash": ...} is returned. Requests made in the same
+    UI epoch share one walk. The walk is kept under ``snapshot_handle`` for expand_node.
+
+    With ``stream`` and a client that asked for progress, the nodes of a full tree walk are sent as
+    progress notifications while it runs (see utils.snapshot_stream) and the snapshot returned only
+    sums them up. Diffs, include / exclude filters and reused walks are returned as usual.
+    """
+    scope = SnapshotScope.from_param(scope)
+    engine = browser_manager.snapshot_engine_for(scope)
+    epoch = browser_manager.ui_epoch()
+    diff = diff == 1 or bool(scope.changed_only)
+    streamer = None
+    if stream == 1 and not diff and not (scope.include or scope.exclude) and not engine.is_current(epoch):
+        streamer = SnapshotStream.for_current_request()
+    with metrics.phase(PHASE_SNAPSHOT):
+        if engine.is_current(epoch):
+            engine.update(None, epoch=epoch)
+        else:
+            main_window = browser_manager.get_main_window()
+            if scope.root:
+                root = resolve_element(browser_manager, main_window, scope.root)
+            else:
+                root = main_window.wrapper_object()
+            # dirty ids are tracked against the main window tree only
+            dirty = browser_manager.drain_dirty_ids() if engine is browser_manager.snapshot_engine else None
+            try:
+                engine.update(root, dirty=dirty, epoch=epoch, stream=streamer)
+            finally:
+                if streamer is not None:
+                    streamer.close()
+        snapshot_hash = scope.content_hash(engine.content_hash)
+        handle = browser_manager.snapshot_handles.put(engine.nodes, engine.root_id)
+        if last_hash and last_hash == snapshot_hash:
+            return {"unchanged": True, "snapshot_hash": snapshot_hash, "snapshot_handle": handle}
+        if streamer is not None:
+            truncated = {node_id: node["info"]["truncated"] for node_id, node in engine.nodes.items()
+                         if "truncated" in node["info"]}
+            return dict(streamer.summary(truncated), snapshot_hash=snapshot_hash, snapshot_handle=handle)
+        snapshot = engine.result(diff=diff)
+        if (scope.include or scope.exclude) and "diff" not in snapshot:
+            snapshot = filter_tree(snapshot, scope.include, scope.exclude)
+    with metrics.phase(PHASE_SERIALIZATION):
+        return dict(encode_snapshot(snapshot, snapshot_format), snapshot_hash=snapshot_hash, snapshot_handle=handle)
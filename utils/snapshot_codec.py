@@ -0,0 +1,100 @@
+import base64
+import json
+import zlib
+
+
+FORMAT_JSON = "json"
+FORMAT_COMPACT = "compact"
+FORMAT_COMPACT_ZLIB = "compact-zlib"
+SNAPSHOT_FORMATS = (FORMAT_JSON, FORMAT_COMPACT, FORMAT_COMPACT_ZLIB)
+
+COMPACT_VERSION = 2
+
+# Node fields stored as indices into the shared string table
+INTERNED_FIELDS = ("control_type", "class_name", "automation_id")
+# Node fields only some nodes have, stored as [[node index, value], ...]
+SPARSE_FIELDS = ("id", "value", "is_checked", "is_expanded", "truncated")
+
+
+def encode_compact(tree):
+    """
+    Columnar encoding of a nested snapshot.
+
+    Nodes are listed in pre-order. ``parent`` holds the index of each node's
+    parent (-1 for the root) instead of nesting, ``rect`` is a flat
+    [left, top, right, bottom, ...] array, control types / class names /
+    automation ids are indices into ``strings``, and the pattern fields and
+    node ids only list the nodes that have them.
+    """
+    strings, string_index = [], {}
+
+    def intern(value):
+        value = value or ""
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    columns = {"parent": [], "title": [], "rect": []}
+    columns.update({field: [] for field in INTERNED_FIELDS})
+    sparse = {field: [] for field in SPARSE_FIELDS}
+
+    stack = [(tree, -1)]
+    while stack:
+        node, parent = stack.pop()
+        index = len(columns["parent"])
+        columns["parent"].append(parent)
+        columns["title"].append(node.get("title", ""))
+        rect = node.get("rectangle") or {}
+        columns["rect"].extend((rect.get("left", 0), rect.get("top", 0), rect.get("right", 0), rect.get("bottom", 0)))
+        for field in INTERNED_FIELDS:
+            columns[field].append(intern(node.get(field)))
+        for field in SPARSE_FIELDS:
+            if field in node:
+                sparse[field].append([index, node[field]])
+        stack.extend((child, index) for child in reversed(node.get("children", [])))
+
+    encoded = {"format": FORMAT_COMPACT, "version": COMPACT_VERSION, "strings": strings, **columns}
+    encoded.update({field: values for field, values in sparse.items() if values})
+    return encoded
+
+
+def decode_compact(encoded):
+    """Rebuild the nested snapshot from ``encode_compact`` output."""
+    if encoded.get("format") == FORMAT_COMPACT_ZLIB:
+        encoded = json.loads(zlib.decompress(base64.b64decode(encoded["data"])))
+
+    strings = encoded["strings"]
+    rect = encoded["rect"]
+    nodes = []
+    for index, parent in enumerate(encoded["parent"]):
+        node = {"title": encoded["title"][index]}
+        for field in ("control_type", "automation_id", "class_name"):
+            node[field] = strings[encoded[field][index]]
+        left, top, right, bottom = rect[4 * index:4 * index + 4]
+        node["rectangle"] = {"left": left, "top": top, "right": right, "bottom": bottom}
+        node["children"] = []
+        nodes.append(node)
+        if parent >= 0:
+            nodes[parent]["children"].append(node)
+    for field in SPARSE_FIELDS:
+        for index, value in encoded.get(field, []):
+            nodes[index][field] = value
+    return nodes[0] if nodes else {}
+
+
+def encode_snapshot(snapshot, snapshot_format=FORMAT_JSON):
+    """
+    Encode a snapshot for a tool response. Diff snapshots are already small
+    and are returned as they are in every format.
+    """
+    if snapshot_format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unsupported snapshot_format: {snapshot_format}, expected one of {SNAPSHOT_FORMATS}")
+    if snapshot_format == FORMAT_JSON or not snapshot or "diff" in snapshot:
+        return snapshot
+    encoded = encode_compact(snapshot)
+    if snapshot_format == FORMAT_COMPACT_ZLIB:
+        raw = json.dumps(encoded, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return {"format": FORMAT_COMPACT_ZLIB, "version": COMPACT_VERSION,
+                "data": base64.b64encode(zlib.compress(raw, 6)).decode("ascii")}
+    return encoded
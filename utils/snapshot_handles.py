@@ -0,0 +1,109 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from utils.snapshot import SnapshotEngine, SNAPSHOT_TIME_BUDGET, materialize
+
+
+logger = logging.getLogger(__name__)
+
+
+MAX_HANDLES = 8  # snapshots kept per session, the oldest handle expires first
+DEFAULT_EXPAND_DEPTH = 2
+DEFAULT_PAGE_SIZE = 50
+
+
+class _SourceProvider:
+    """Provider walking from a provider node kept by a snapshot (its ``source``), in whatever provider read it."""
+    name = "expand"
+    prefetched = True  # the source's own provider decides where the reads go, never walk on the pool
+
+    def root(self, node):
+        return node
+
+
+class SnapshotHandles:
+    """
+    Recent snapshots of a session, kept server-side under a handle.
+
+    A handle maps to the node map of the walk (see SnapshotEngine.nodes),
+    which holds the provider node of every element, so ``expand`` can walk
+    the subtree below any node of the snapshot - typically one marked
+    ``truncated`` - without walking the whole window again. Nodes found by
+    an expansion are added to the handle and can be expanded in turn.
+    """
+    def __init__(self, max_handles=MAX_HANDLES):
+        self.max_handles = max_handles
+        self._handles = OrderedDict()  # handle -> {"nodes", "root_id", "expanded"}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def put(self, nodes, root_id):
+        """Handle of a walk's node map. The same map (a reused walk) keeps its handle."""
+        with self._lock:
+            for handle, entry in reversed(self._handles.items()):
+                if entry["nodes"] is nodes:
+                    self._handles.move_to_end(handle)
+                    return handle
+            handle = f"s{next(self._counter)}"
+            self._handles[handle] = {"nodes": nodes, "root_id": root_id, "expanded": {}}
+            while len(self._handles) > self.max_handles:
+                self._handles.popitem(last=False)
+            return handle
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+    def _node(self, handle, node_id):
+        with self._lock:
+            entry = self._handles.get(handle)
+            if entry is None:
+                raise KeyError(f"Unknown or expired snapshot handle: {handle}, take a new snapshot")
+            node = entry["expanded"].get(node_id) or entry["nodes"].get(node_id)
+            if node is None:
+                raise KeyError(f"Unknown node id {node_id} in snapshot {handle}")
+            return entry, node
+
+    def expand(self, handle, node_id, depth=DEFAULT_EXPAND_DEPTH, offset=0, limit=DEFAULT_PAGE_SIZE,
+               time_budget=SNAPSHOT_TIME_BUDGET):
+        """
+        Walk one page of the children of ``node_id`` and their subtrees.
+
+        Args:
+            handle: Snapshot handle returned with a snapshot
+            node_id: Id of the node to expand
+            depth: Levels below ``node_id`` to return, 1 for its children only
+            offset / limit: Page of the children to walk; inside the page every node keeps at most
+                            ``limit`` children, the others are marked truncated and can be expanded
+            time_budget: Seconds the whole page may take
+
+        Returns:
+            {"node_id", "offset", "total", "next_offset" (None on the last page), "children": [...]}
+        """
+        if depth < 1 or limit < 1 or offset < 0:
+            raise ValueError(f"depth and limit must be at least 1 and offset at least 0, got {depth}, {limit}, {offset}")
+        entry, node = self._node(handle, node_id)
+        deadline = time.time() + time_budget
+        children = node["source"].children()
+        page = children[offset:offset + limit]
+        # max_depth is the only depth limit, web_depth never exceeds it
+        engine = SnapshotEngine(max_root_depth=depth + 1, max_web_length=limit, provider=_SourceProvider(),
+                                max_depth=depth - 1, in_web_page=True)
+        result = []
+        for child in page:
+            engine.time_budget = max(0, deadline - time.time())
+            engine.update(child)
+            with self._lock:
+                entry["expanded"].update(engine.nodes)
+            result.append(materialize(engine.nodes, engine.root_id, with_ids=True))
+        next_offset = offset + len(page)
+        return {
+            "node_id": node_id,
+            "offset": offset,
+            "total": len(children),
+            "next_offset": next_offset if next_offset < len(children) else None,
+            "children": result,
+        }
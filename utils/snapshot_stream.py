@@ -0,0 +1,98 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from utils.ui_executor import caller_loop
+
+
+logger = logging.getLogger(__name__)
+
+
+CHUNK_NODES = 200  # nodes per progress notification at most
+CHUNK_INTERVAL = 0.05  # seconds a read node may wait for its chunk to fill up
+SEND_TIMEOUT = 5
+
+
+class SnapshotStream:
+    """
+    Sends the nodes of a snapshot walk as MCP progress notifications while
+    the walk is still running.
+
+    The walk is breadth-first, so the browser chrome goes out first and deep
+    web content last. Every notification's ``message`` is JSON:
+
+        {"snapshot_chunk": 3, "nodes": [{"id", "parent_id", "index", "title", "control_type", ...}]}
+
+    ``index`` orders a node among its siblings (there can be gaps). The walk
+    runs on the session's UI thread; notifications are sent on the loop of
+    the tool call, one after the other, and ``close`` waits for them so they
+    all arrive before the tool response.
+    """
+    def __init__(self, session, progress_token, request_id, loop, chunk_nodes=CHUNK_NODES, interval=CHUNK_INTERVAL):
+        self.session = session
+        self.progress_token = progress_token
+        self.request_id = request_id
+        self.loop = loop
+        self.chunk_nodes = chunk_nodes
+        self.interval = interval
+        self.chunks = 0
+        self.nodes = 0
+        self._pending = []
+        self._futures = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._send_lock = asyncio.Lock()
+
+    @classmethod
+    def for_current_request(cls):
+        """Stream of the running tool call, None outside of one or when the client sent no progressToken."""
+        loop = caller_loop.get()
+        try:
+            from mcp.server.lowlevel.server import request_ctx
+            ctx = request_ctx.get()
+        except (ImportError, LookupError):
+            return None
+        progress_token = ctx.meta.progressToken if ctx.meta else None
+        if progress_token is None or loop is None:
+            return None
+        return cls(ctx.session, progress_token, ctx.request_id, loop)
+
+    def add(self, node_id, parent_id, index, info):
+        entry = {"id": node_id, "parent_id": parent_id, "index": index}
+        entry.update((k, v) for k, v in info.items() if k != "children")
+        with self._lock:
+            self._pending.append(entry)
+            if len(self._pending) >= self.chunk_nodes or time.monotonic() - self._last_flush >= self.interval:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self.chunks += 1
+        self.nodes += len(self._pending)
+        message = json.dumps({"snapshot_chunk": self.chunks, "nodes": self._pending}, ensure_ascii=False)
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._futures.append(asyncio.run_coroutine_threadsafe(self._send(self.chunks, message), self.loop))
+
+    async def _send(self, progress, message):
+        async with self._send_lock:  # tasks start in submission order, the lock keeps them in it
+            await self.session.send_progress_notification(self.progress_token, progress, message=message,
+                                                          related_request_id=self.request_id)
+
+    def close(self, timeout=SEND_TIMEOUT):
+        """Send what is left and wait until every chunk was handed to the transport."""
+        with self._lock:
+            self._flush()
+            futures, self._futures = self._futures, []
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception as e:
+                logger.warning(f"Sending a snapshot chunk failed: {repr(e)}")
+
+    def summary(self, truncated):
+        """What the tool response carries instead of the tree."""
+        return {"streamed": True, "chunks": self.chunks, "nodes": self.nodes, "truncated": truncated}
@@ -0,0 +1,114 @@
+import re
+
+
+# Regex of the parse format types behave step patterns use, see the parse library
+PARSE_TYPES = {
+    "": r".+?",
+    "d": r"[-+]?\d+",
+    "n": r"[-+]?[\d,]+",
+    "w": r"\w+",
+    "W": r"\W+",
+    "s": r"\s+",
+    "S": r"\S+",
+    "f": r"[-+]?\d*\.\d+",
+    "F": r"[-+]?\d*\.\d+",
+    "g": r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?",
+    "l": r"[A-Za-z]+",
+}
+FIELD_RE = re.compile(r"\{\{|\}\}|\{([^{}]*)\}")
+
+
+def compile_step_pattern(pattern, flags=0):
+    """
+    Compile a parse-style step pattern ('I open "{url}"', 'I wait {n:d} seconds')
+    into (literal prefix, regex matching the whole step text). ``{{`` and ``}}``
+    are literal braces; unknown format types match like ``{}``.
+    """
+    regex, prefix, pos, in_prefix = [], [], 0, True
+    for m in FIELD_RE.finditer(pattern):
+        literal = pattern[pos:m.start()]
+        regex.append(re.escape(literal))
+        if in_prefix:
+            prefix.append(literal)
+        if m.group(1) is None:  # escaped brace
+            brace = m.group(0)[0]
+            regex.append(re.escape(brace))
+            if in_prefix:
+                prefix.append(brace)
+        else:
+            _, _, format_spec = m.group(1).partition(":")
+            regex.append(f"({PARSE_TYPES.get(format_spec[-1:] if format_spec else '', PARSE_TYPES[''])})")
+            in_prefix = False
+        pos = m.end()
+    regex.append(re.escape(pattern[pos:]))
+    if in_prefix:
+        prefix.append(pattern[pos:])
+    return "".join(prefix), re.compile("".join(regex) + r"\Z", re.DOTALL | flags)
+
+
+class _TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []
+
+
+class StepMatcher:
+    """
+    Index of step patterns answering "which pattern would behave run for this
+    step text". Patterns are compiled once with parse semantics and stored
+    in a character trie keyed by their literal prefix (the text before the
+    first field); a lookup walks the trie along the step text and only runs
+    the regexes of the patterns whose prefix matched, in the order they were
+    added. Plain patterns without fields are answered from a dict.
+
+    With ``ignore_case`` (how gen_code compares steps) case and runs of
+    whitespace do not matter; behave itself matches exactly.
+    """
+    def __init__(self, ignore_case=False):
+        self.ignore_case = ignore_case
+        self._root = _TrieNode()
+        self._plain = {}  # text -> value, patterns without fields
+        self._count = 0
+
+    def _key(self, text):
+        return " ".join(text.lower().split()) if self.ignore_case else text
+
+    def __len__(self):
+        return self._count
+
+    def add(self, pattern, value):
+        if self.ignore_case:
+            pattern = " ".join(pattern.split())
+        prefix, regex = compile_step_pattern(pattern, re.IGNORECASE if self.ignore_case else 0)
+        self._count += 1
+        if prefix == pattern and "{" not in pattern:
+            self._plain.setdefault(self._key(pattern), (self._count, value))
+            return
+        node = self._root
+        for char in self._key(prefix):
+            node = node.children.setdefault(char, _TrieNode())
+        node.entries.append((self._count, regex, value))
+
+    def candidates(self, text):
+        """Parameterized entries whose literal prefix starts ``text``."""
+        node, found = self._root, list(self._root.entries)
+        for char in self._key(text):
+            node = node.children.get(char)
+            if node is None:
+                break
+            found.extend(node.entries)
+        return found
+
+    def match(self, text):
+        """Value of the first added pattern matching the whole ``text``, or None."""
+        best = self._plain.get(self._key(text))
+        if self.ignore_case:
+            text = " ".join(text.split())
+        for order, regex, value in sorted(self.candidates(text), key=lambda entry: entry[0]):
+            if best is not None and best[0] < order:
+                break
+            if regex.match(text):
+                return value
+        return best[1] if best is not None else None
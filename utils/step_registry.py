@@ -0,0 +1,225 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+from utils.step_matcher import StepMatcher
+
+
+logger = logging.getLogger(__name__)
+
+
+STEP_KEYWORDS = ("given", "when", "then", "step")
+# Parsed step modules, next to the steps, keyed by relative path
+REGISTRY_FILE = ".step_registry.json"
+REGISTRY_VERSION = 1
+MAX_DEPTH = 5
+PARAM_RE = re.compile(r"\{[^{}]*\}")
+
+
+def normalize_step(text):
+    return " ".join(text.lower().split())
+
+
+def step_key(keyword, text):
+    """Exact lookup key: placeholder names do not matter, "{param}" == "{url}"."""
+    return keyword, PARAM_RE.sub("{}", normalize_step(text))
+
+
+def _decorator_step(decorator):
+    """(keyword, pattern) of ``@given('...')`` / ``@behave.step(u'...')``, else None."""
+    if not isinstance(decorator, ast.Call) or not decorator.args:
+        return None
+    func = decorator.func
+    name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+    if name is None or name.lower() not in STEP_KEYWORDS:
+        return None
+    pattern = decorator.args[0]
+    if not isinstance(pattern, ast.Constant) or not isinstance(pattern.value, str):
+        return None
+    return name.lower(), pattern.value
+
+
+def parse_step_source(source, filename="<steps>"):
+    """[[keyword, pattern, lineno, function name], ...] of every step decorator in ``source``."""
+    steps = []
+    for node in ast.walk(ast.parse(source, filename=filename)):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for decorator in node.decorator_list:
+                step = _decorator_step(decorator)
+                if step:
+                    steps.append([step[0], step[1], decorator.lineno, node.name])
+    steps.sort(key=lambda step: step[2])
+    return steps
+
+
+def iter_step_files(steps_dir, max_depth=MAX_DEPTH):
+    """Every .py file under ``steps_dir`` down to ``max_depth`` levels, like read_step_files."""
+    stack = [(Path(steps_dir), 0)]
+    while stack:
+        directory, depth = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"Cannot list step directory {directory}: {e}")
+            continue
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".py"):
+                yield Path(entry.path), entry.stat()
+            elif entry.is_dir() and depth < max_depth and not entry.name.startswith((".", "__")):
+                stack.append((Path(entry.path), depth + 1))
+
+
+class StepDefinition:
+    def __init__(self, keyword, pattern, path, lineno, func_name=""):
+        self.keyword = keyword
+        self.pattern = pattern
+        self.path = path
+        self.lineno = lineno
+        self.func_name = func_name
+
+    @property
+    def parameterized(self):
+        return PARAM_RE.search(self.pattern) is not None
+
+    def __repr__(self):
+        return f"@{self.keyword}('{self.pattern}') at {self.path}:{self.lineno}"
+
+
+class StepRegistry:
+    """
+    Step definitions of a steps directory, parsed with ast.
+
+    ``refresh`` only re-parses files whose mtime / size changed and whose
+    content hash differs from the last parse; the parse results are kept in
+    ``.step_registry.json`` next to the steps so a new server starts warm.
+    Patterns are indexed by (keyword, normalized text) for exact lookups,
+    and per keyword in a StepMatcher (utils.step_matcher) deciding which
+    pattern, if any, covers a concrete step text with behave's parse
+    semantics.
+    """
+    def __init__(self, steps_dir):
+        self.steps_dir = Path(steps_dir).resolve()
+        self.registry_file = self.steps_dir / REGISTRY_FILE
+        self._lock = threading.Lock()
+        self._files = {}  # relative path -> {"mtime_ns", "size", "sha1", "steps"}
+        self._exact = {}  # (keyword, normalized text) -> [StepDefinition]
+        self._matchers = {}  # keyword -> StepMatcher of its patterns
+        self.parsed = 0
+        self._indexed = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.registry_file, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == REGISTRY_VERSION:
+                self._files = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        data = {"version": REGISTRY_VERSION, "files": self._files}
+        tmp_file = self.registry_file.with_name(f"{REGISTRY_FILE}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.registry_file)
+        except OSError as e:
+            logger.warning(f"Cannot write step registry {self.registry_file}: {e}")
+
+    def refresh(self):
+        """Pick up added, changed and deleted step files. Returns the number of files parsed."""
+        with self._lock:
+            files, parsed, touched = {}, 0, False
+            if not self.steps_dir.exists():
+                logger.warning(f"Step path does not exist: {self.steps_dir}")
+            else:
+                for path, st in iter_step_files(self.steps_dir):
+                    rel = path.relative_to(self.steps_dir).as_posix()
+                    known = self._files.get(rel)
+                    if known and known["mtime_ns"] == st.st_mtime_ns and known["size"] == st.st_size:
+                        files[rel] = known
+                        continue
+                    entry = files[rel] = self._parse(path, st, known)
+                    parsed += entry["sha1"] != (known or {}).get("sha1")
+                    touched = True
+            removed = files.keys() != self._files.keys()
+            self._files = files
+            if parsed or removed or not self._indexed:
+                self._build_index()
+            if touched or removed:
+                self._save()
+            self.parsed += parsed
+            return parsed
+
+    def _parse(self, path, st, known):
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError as e:
+            logger.error(f"Error reading file {path}: {e}")
+            return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": "", "steps": []}
+        sha1 = hashlib.sha1(content).hexdigest()
+        if known and known["sha1"] == sha1:
+            return dict(known, mtime_ns=st.st_mtime_ns, size=st.st_size)
+        try:
+            steps = parse_step_source(content.decode("utf-8", "replace"), str(path))
+        except SyntaxError as e:
+            logger.error(f"Cannot parse step file {path}: {e}")
+            steps = []
+        return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": sha1, "steps": steps}
+
+    def _build_index(self):
+        exact, matchers = {}, {keyword: StepMatcher(ignore_case=True) for keyword in STEP_KEYWORDS}
+        for rel, entry in self._files.items():
+            for keyword, pattern, lineno, func_name in entry["steps"]:
+                definition = StepDefinition(keyword, pattern, rel, lineno, func_name)
+                exact.setdefault(step_key(keyword, pattern), []).append(definition)
+                matchers[keyword].add(pattern, definition)
+        self._exact, self._matchers = exact, matchers
+        self._indexed = True
+
+    def definitions(self):
+        return [definition for definitions in self._exact.values() for definition in definitions]
+
+    def __len__(self):
+        return sum(len(definitions) for definitions in self._exact.values())
+
+    def find(self, keyword, text):
+        """
+        Existing definition a ``keyword`` step with ``text`` would use, or None.
+        ``text`` is either a pattern (matched as written) or a concrete step
+        matched against the parameterized patterns. ``@step`` definitions
+        match every keyword.
+        """
+        keyword = keyword.lower()
+        keywords = STEP_KEYWORDS if keyword == "step" else (keyword, "step")
+        for kw in keywords:
+            found = self._exact.get(step_key(kw, text))
+            if found:
+                return found[0]
+        for kw in keywords:
+            found = self._matchers[kw].match(text)
+            if found is not None:
+                return found
+        return None
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_step_registry(steps_dir):
+    """Shared, refreshed registry of ``steps_dir``."""
+    key = str(Path(steps_dir).resolve())
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = StepRegistry(key)
+    registry.refresh()
+    return registry
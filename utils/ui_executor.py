@@ -0,0 +1,128 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import inspect
+import logging
+import queue
+import sys
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+# Event loop of the caller that queued the running call, for work that must go back to it (e.g. MCP notifications)
+caller_loop = contextvars.ContextVar("caller_loop", default=None)
+
+
+def co_initialize():
+    if sys.platform != "win32":
+        return False
+    try:
+        import pythoncom
+        # same apartment model pywinauto picked for the importing thread
+        pythoncom.CoInitializeEx(getattr(sys, "coinit_flags", pythoncom.COINIT_MULTITHREADED))
+        return True
+    except Exception as e:
+        logger.warning(f"COM initialization failed on UI thread: {repr(e)}")
+        return False
+
+
+def co_uninitialize():
+    try:
+        import pythoncom
+        pythoncom.CoUninitialize()
+    except Exception:
+        pass
+
+
+class UIExecutor:
+    """
+    Single worker thread running all UI automation calls of one browser session.
+
+    pywinauto and the UIA COM objects it hands out are only used from this
+    thread, so tools can await ``run`` and leave the asyncio event loop free
+    for other clients. Coroutine functions are run to completion on the
+    worker's own event loop, inside the caller's context variables; calls made
+    from the worker itself (a tool calling another tool) run inline instead of
+    queueing behind themselves.
+    """
+    def __init__(self, name="ui"):
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name=f"ui-executor-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        com_initialized = co_initialize()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                future, context, func, args, kwargs = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = context.run(func, *args, **kwargs)
+                    if inspect.isawaitable(result):
+                        result = context.run(loop.run_until_complete, result)
+                    future.set_result(result)
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            loop.close()
+            if com_initialized:
+                co_uninitialize()
+
+    def in_worker(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, func, *args, **kwargs):
+        """Queue ``func`` on the worker, returns a concurrent.futures.Future."""
+        future = concurrent.futures.Future()
+        self._ensure_started()
+        self._queue.put((future, contextvars.copy_context(), func, args, kwargs))
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        """Await ``func(*args, **kwargs)`` executed on the worker thread."""
+        if self.in_worker():
+            result = func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        token = caller_loop.set(asyncio.get_running_loop())
+        try:
+            future = self.submit(func, *args, **kwargs)
+        finally:
+            caller_loop.reset(token)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        if wait and thread is not threading.current_thread():
+            thread.join()
+
+
+def on_ui_thread(browser_manager):
+    """Run the decorated tool coroutine on the session's UI executor."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await browser_manager.executor.run(func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,229 @@
+import logging
+import re
+import threading
+from collections import deque
+
+from utils.uia_cache import select_provider
+from utils.wait_util import DIRTY_EVENTS
+
+
+logger = logging.getLogger(__name__)
+
+
+# child_window criteria the mirror answers, anything else goes to a live search
+MIRROR_CRITERIA = ("title", "title_re", "control_type", "auto_id", "class_name", "found_index")
+# indexed criteria -> node field
+INDEXED_CRITERIA = {"title": "title", "control_type": "control_type", "auto_id": "automation_id",
+                    "class_name": "class_name"}
+
+
+class UIMirror:
+    """
+    In-process copy of a window's UI tree with hash indexes, to answer
+    ``child_window`` lookups without a live UIA descendant scan.
+
+    Every node is keyed by runtime id and indexed by title, control type,
+    automation id and class name. The mirror is fed by a live event source
+    (utils.wait_util): structure and property change events only record the
+    sender, and the next ``refresh`` (done before every lookup, on the
+    session's UI thread) re-reads the subtree of each reported element with
+    the same provider snapshots use. A sender the mirror does not know, an
+    event without a sender or ``invalidate`` (navigation) re-reads the whole
+    window.
+
+    Lookups return the live element of the matching node; only acting on it
+    goes to UIA. Lookups the mirror cannot answer exactly - criteria it does
+    not index, or several matches without found_index, where pywinauto
+    raises - return None and should go to a live search, like misses (the
+    element may still be on its way). Visibility is not mirrored.
+    """
+    def __init__(self, root, events=None, provider=None):
+        self.root = root
+        self.events = events
+        self.provider = provider
+        self._nodes = {}  # runtime id -> {"id", "title", "control_type", "automation_id", "class_name",
+        #                                  "parent", "children", "source"}
+        self._indexes = {field: {} for field in INDEXED_CRITERIA.values()}  # field -> value -> {ids}
+        self._root_id = None
+        self._dirty = set()
+        self._resync = True
+        self._lock = threading.Lock()  # guards _dirty / _resync, set from event threads
+        self._patterns = {}
+        self.syncs = 0
+        self.subtree_syncs = 0
+        self.hits = 0
+        self.misses = 0
+        if events is not None:
+            events.add_listener(self._on_event)
+
+    def close(self):
+        if self.events is not None:
+            self.events.remove_listener(self._on_event)
+
+    def _on_event(self, kind, runtime_id):
+        if kind not in DIRTY_EVENTS:
+            return
+        with self._lock:
+            if runtime_id is None:
+                self._resync = True
+            else:
+                self._dirty.add(runtime_id)
+
+    def invalidate(self):
+        """The whole tree was replaced (navigation): re-read it before the next lookup."""
+        with self._lock:
+            self._resync = True
+
+    def __len__(self):
+        return len(self._nodes)
+
+    # --- keeping the mirror in sync ---
+    def refresh(self):
+        """Apply the changes reported since the last refresh. Returns the number of subtrees re-read."""
+        with self._lock:
+            resync, dirty = self._resync, self._dirty
+            self._resync, self._dirty = False, set()
+        if resync or any(node_id not in self._nodes for node_id in dirty) or self._root_id in dirty:
+            self._sync_all()
+            return 1
+        # re-reading an element re-reads its descendants, so skip the ones below another dirty element
+        tops = [node_id for node_id in dirty if not self._has_ancestor_in(node_id, dirty)]
+        for node_id in tops:
+            try:
+                self._sync_subtree(node_id)
+            except Exception as e:
+                logger.info(f"UI mirror: re-reading {node_id} failed, re-reading the window: {repr(e)}")
+                self._sync_all()
+                return 1
+        return len(tops)
+
+    def _has_ancestor_in(self, node_id, ids):
+        parent_id = self._nodes[node_id]["parent"]
+        while parent_id is not None:
+            if parent_id in ids:
+                return True
+            parent_id = self._nodes[parent_id]["parent"]
+        return False
+
+    def _provider(self, element):
+        return self.provider or select_provider(element, subtree=True)
+
+    def _sync_all(self):
+        self._nodes = {}
+        self._indexes = {field: {} for field in INDEXED_CRITERIA.values()}
+        self._root_id = self._read(self._provider(self.root).root(self.root), None, 0)
+        self.syncs += 1
+        logger.info(f"UI mirror synced: {len(self._nodes)} nodes")
+
+    def _sync_subtree(self, node_id):
+        node = self._nodes[node_id]
+        element = node["source"].element
+        parent_id, index = node["parent"], self._nodes[node["parent"]]["children"].index(node_id)
+        source = self._provider(element).root(element)
+        self._remove(node_id)
+        new_id = self._read(source, parent_id, index)
+        self._nodes[parent_id]["children"][index] = new_id
+        self.subtree_syncs += 1
+
+    def _read(self, source, parent_id, index):
+        """Read ``source`` and its descendants, breadth-first. Returns the id of ``source``."""
+        root_id = None
+        queue = deque([(source, parent_id, index)])
+        while queue:
+            source, parent_id, index = queue.popleft()
+            node_id = source.runtime_id or f"{parent_id}/{index}"
+            static = source.static()
+            node = {
+                "id": node_id,
+                "title": source.title(),
+                "control_type": static["control_type"],
+                "automation_id": static["automation_id"],
+                "class_name": static["class_name"],
+                "parent": parent_id,
+                "children": [],
+                "source": source,
+            }
+            if node_id in self._nodes:  # an element moved: drop where it was
+                self._remove(node_id, detach=True)
+            self._nodes[node_id] = node
+            for field, values in self._indexes.items():
+                values.setdefault(node[field], set()).add(node_id)
+            if root_id is None:
+                root_id = node_id
+            elif parent_id in self._nodes:
+                self._nodes[parent_id]["children"].append(node_id)
+            queue.extend((child, node_id, i) for i, child in enumerate(source.children()))
+        return root_id
+
+    def _remove(self, node_id, detach=False):
+        """Drop ``node_id`` and its descendants, and with ``detach`` its slot in its parent."""
+        if detach:
+            parent = self._nodes.get(self._nodes[node_id]["parent"])
+            if parent is not None and node_id in parent["children"]:
+                parent["children"].remove(node_id)
+        stack = [node_id]
+        while stack:
+            node = self._nodes.pop(stack.pop(), None)
+            if node is None:
+                continue
+            for field, values in self._indexes.items():
+                ids = values.get(node[field])
+                if ids is not None:
+                    ids.discard(node["id"])
+                    if not ids:
+                        del values[node[field]]
+            stack.extend(node["children"])
+
+    # --- lookups ---
+    @staticmethod
+    def supports(search_kwargs):
+        return all(key in MIRROR_CRITERIA for key in search_kwargs)
+
+    def _pattern(self, title_re):
+        pattern = self._patterns.get(title_re)
+        if pattern is None:
+            pattern = self._patterns[title_re] = re.compile(title_re)
+        return pattern
+
+    def _document_order(self, node_id):
+        path = []
+        while True:
+            parent_id = self._nodes[node_id]["parent"]
+            if parent_id is None:
+                return path[::-1]
+            path.append(self._nodes[parent_id]["children"].index(node_id))
+            node_id = parent_id
+
+    def find_all(self, search_kwargs):
+        """Ids of the descendants of the root matching ``search_kwargs``, in document order."""
+        candidates = None
+        for key, field in INDEXED_CRITERIA.items():
+            if key in search_kwargs:
+                ids = self._indexes[field].get(search_kwargs[key], set())
+                candidates = ids if candidates is None else candidates & ids
+        if candidates is None:
+            candidates = self._nodes.keys()
+        if "title_re" in search_kwargs:
+            pattern = self._pattern(search_kwargs["title_re"])
+            candidates = [node_id for node_id in candidates if pattern.match(self._nodes[node_id]["title"])]
+        return sorted((node_id for node_id in candidates if node_id != self._root_id), key=self._document_order)
+
+    def find(self, search_kwargs):
+        """Live element of the match of ``root.child_window(**search_kwargs)``, or None."""
+        self.refresh()
+        found = self.find_all(search_kwargs)
+        index = search_kwargs.get("found_index")
+        if index is None:
+            ambiguous = len(found) > 1
+            index = 0
+        else:
+            ambiguous = False
+        if ambiguous or index >= len(found):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._nodes[found[index]]["source"].element
+
+    def stats(self):
+        return {"nodes": len(self._nodes), "syncs": self.syncs, "subtree_syncs": self.subtree_syncs,
+                "hits": self.hits, "misses": self.misses}
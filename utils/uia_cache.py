@@ -0,0 +1,254 @@
+import logging
+import sys
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+EXPAND_STATE_EXPANDED = 1
+
+_thread_providers = threading.local()  # UIACacheRequestProvider of each session UI thread
+_provider_factories = []  # see register_provider
+
+
+def format_runtime_id(runtime_id):
+    if not runtime_id:
+        return None
+    return ".".join(str(part) for part in runtime_id)
+
+
+class ElementNode:
+    """
+    Node read straight from a pywinauto wrapper, one UIA call per property.
+
+    This is the pure-Python fallback used when no bulk provider is available.
+    Getters for unsupported patterns raise, like the wrapper methods do.
+    """
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def runtime_id(self):
+        try:
+            return format_runtime_id(self.element.element_info.runtime_id)
+        except Exception:
+            return None
+
+    def static(self):
+        return {
+            "control_type": self.element.element_info.control_type,
+            "automation_id": self.element.element_info.automation_id,
+            "class_name": self.element.element_info.class_name,
+        }
+
+    def title(self):
+        return self.element.window_text()
+
+    def rectangle(self):
+        rect = self.element.rectangle()
+        return rect.left, rect.top, rect.right, rect.bottom
+
+    def value(self):
+        return self.element.get_value()
+
+    def toggle_state(self):
+        return self.element.get_toggle_state()
+
+    def is_expanded(self):
+        return self.element.is_expanded()
+
+    def children(self):
+        return [ElementNode(child) for child in self.element.children()]
+
+    def has_children(self):
+        """Whether the node has children, None when only another UIA call could tell."""
+        return None
+
+
+class WrapperPropertyProvider:
+    """Fallback provider: every property is a separate round trip."""
+    name = "wrapper"
+    prefetched = False  # properties are fetched node by node
+
+    def root(self, element):
+        return ElementNode(element)
+
+
+class CachedNode:
+    """Node whose properties and children come from a prefetched cache."""
+    def __init__(self, provider, data, element=None):
+        self._provider = provider
+        self._data = data
+        self._element = element
+
+    @property
+    def element(self):
+        if self._element is None:
+            self._element = self._provider.wrap(self._data)
+        return self._element
+
+    @property
+    def runtime_id(self):
+        return format_runtime_id(self._provider.get(self._data, "runtime_id"))
+
+    def static(self):
+        return {
+            "control_type": self._provider.get(self._data, "control_type"),
+            "automation_id": self._provider.get(self._data, "automation_id"),
+            "class_name": self._provider.get(self._data, "class_name"),
+        }
+
+    def title(self):
+        return self._provider.get(self._data, "title")
+
+    def rectangle(self):
+        return self._provider.get(self._data, "rectangle")
+
+    def value(self):
+        if not self._provider.get(self._data, "has_value"):
+            raise AttributeError("Value pattern is not supported")
+        return self._provider.get(self._data, "value")
+
+    def toggle_state(self):
+        if not self._provider.get(self._data, "has_toggle"):
+            raise AttributeError("Toggle pattern is not supported")
+        return self._provider.get(self._data, "toggle_state")
+
+    def is_expanded(self):
+        if not self._provider.get(self._data, "has_expand"):
+            raise AttributeError("ExpandCollapse pattern is not supported")
+        return self._provider.get(self._data, "expand_state") == EXPAND_STATE_EXPANDED
+
+    def children(self):
+        return [CachedNode(self._provider, child) for child in self._provider.cached_children(self._data)]
+
+    def has_children(self):
+        """Whether the node has children, from the prefetched cache; None when they were not prefetched."""
+        return self._provider.has_cached_children(self._data)
+
+
+class UIACacheRequestProvider:
+    """
+    Bulk provider built on UIA CacheRequest with TreeScope_Element | TreeScope_Children.
+
+    One BuildUpdatedCache call brings back every property the snapshot needs
+    for an element and all its children: ``root`` makes one for the root, and
+    every node the walk descends into makes one when its children are asked
+    for. The prefetch never goes deeper than the walk, so depth and
+    ``max_web_length`` pruning and the time budget (checked between nodes)
+    bound it; a Subtree scope on the main window would pull the whole web
+    accessibility tree in one uninterruptible call. Elements are cached in
+    full mode so the wrappers returned by ``CachedNode.element`` can still be
+    acted on.
+
+    ``subtree=True`` is for callers that read every node anyway (element
+    searches, the UI mirror): one call prefetches the whole subtree.
+
+    Node data is (element, children_cached). The CacheRequest is built once
+    and the provider reused by ``select_provider`` on the same thread.
+    """
+    name = "uia-cache"
+    prefetched = True
+
+    def __init__(self, subtree=False):
+        from pywinauto.uia_defines import IUIA
+
+        self._iuia = IUIA()
+        uia = self._iuia.UIA_dll
+        self._property_ids = {
+            "runtime_id": uia.UIA_RuntimeIdPropertyId,
+            "title": uia.UIA_NamePropertyId,
+            "control_type": uia.UIA_ControlTypePropertyId,
+            "automation_id": uia.UIA_AutomationIdPropertyId,
+            "class_name": uia.UIA_ClassNamePropertyId,
+            "rectangle": uia.UIA_BoundingRectanglePropertyId,
+            "has_value": uia.UIA_IsValuePatternAvailablePropertyId,
+            "value": uia.UIA_ValueValuePropertyId,
+            "has_toggle": uia.UIA_IsTogglePatternAvailablePropertyId,
+            "toggle_state": uia.UIA_ToggleToggleStatePropertyId,
+            "has_expand": uia.UIA_IsExpandCollapsePatternAvailablePropertyId,
+            "expand_state": uia.UIA_ExpandCollapseExpandCollapseStatePropertyId,
+        }
+        self._cache_request = self._iuia.iuia.CreateCacheRequest()
+        for property_id in self._property_ids.values():
+            self._cache_request.AddProperty(property_id)
+        self.subtree = subtree
+        self._cache_request.TreeScope = uia.TreeScope_Subtree if subtree else uia.TreeScope_Element | uia.TreeScope_Children
+        self._cache_request.TreeFilter = self._iuia.true_condition
+        self._cache_request.AutomationElementMode = uia.AutomationElementMode_Full
+        self.round_trips = 0
+
+    def root(self, element):
+        com_element = element.element_info.element
+        self.round_trips += 1
+        cached = com_element.BuildUpdatedCache(self._cache_request)
+        return CachedNode(self, (cached, True), element)
+
+    def get(self, data, name):
+        value = data[0].GetCachedPropertyValue(self._property_ids[name])
+        if name == "control_type":
+            return self._iuia.known_control_type_ids.get(value, value)
+        if name == "rectangle":
+            # cached BoundingRectangle is (left, top, width, height)
+            left, top, width, height = (int(v) for v in value)
+            return left, top, left + width, top + height
+        if name == "runtime_id":
+            return tuple(value) if value else None
+        return value
+
+    def cached_children(self, data):
+        com_element, children_cached = data
+        if not children_cached:
+            self.round_trips += 1
+            com_element = com_element.BuildUpdatedCache(self._cache_request)
+        children = com_element.GetCachedChildren()
+        if not children:
+            return []
+        return [(children.GetElement(i), self.subtree) for i in range(children.Length)]
+
+    def has_cached_children(self, data):
+        com_element, children_cached = data
+        if not children_cached:
+            return None
+        children = com_element.GetCachedChildren()
+        return bool(children and children.Length)
+
+    def wrap(self, data):
+        from pywinauto.controls.uiawrapper import UIAWrapper
+        from pywinauto.uia_element_info import UIAElementInfo
+        return UIAWrapper(UIAElementInfo(data[0]))
+
+
+def register_provider(factory):
+    """
+    Let ``factory(element, subtree)`` provide for the elements it knows, and
+    return None for the others; select_provider asks it first. Simulated
+    backends (benchmarks/fake_uia.py) plug in here.
+    """
+    if factory not in _provider_factories:
+        _provider_factories.append(factory)
+
+
+def select_provider(element, subtree=False):
+    """
+    Pick the cheapest provider able to read ``element``. ``subtree`` prefetches
+    the whole subtree at once, for callers that read all of it.
+    """
+    for factory in _provider_factories:
+        provider = factory(element, subtree)
+        if provider is not None:
+            return provider
+    if sys.platform == "win32" and hasattr(getattr(element, "element_info", None), "element"):
+        name = "uia_subtree" if subtree else "uia"
+        provider = getattr(_thread_providers, name, None)
+        if provider is not None:
+            return provider
+        try:
+            # COM objects stay on the thread that made them; a session does all its UIA work on its UI thread
+            provider = UIACacheRequestProvider(subtree)
+            setattr(_thread_providers, name, provider)
+            return provider
+        except Exception as e:
+            logger.warning(f"UIA cache request unavailable, falling back to wrapper reads: {repr(e)}")
+    return WrapperPropertyProvider()
@@ -0,0 +1,303 @@
+import hashlib
+import logging
+import sys
+import threading
+import time
+
+from utils.uia_cache import select_provider, format_runtime_id
+
+
+logger = logging.getLogger(__name__)
+
+
+STRUCTURE_CHANGED = "structure"
+FOCUS_CHANGED = "focus"
+PROPERTY_CHANGED = "property"
+ALL_EVENTS = (STRUCTURE_CHANGED, FOCUS_CHANGED, PROPERTY_CHANGED)
+# Events whose sender needs to be re-read by the next snapshot
+DIRTY_EVENTS = (STRUCTURE_CHANGED, PROPERTY_CHANGED)
+
+UNTIL_STABLE = "stable"
+
+DEFAULT_QUIET_MS = 300
+DEFAULT_SETTLE_TIMEOUT = 10
+POLL_INTERVAL = 0.1  # seconds between two polls of a source without live events
+SIGNATURE_DEPTH = 4
+
+
+class WaitResult:
+    def __init__(self, waited, reason, events):
+        self.waited = waited
+        self.reason = reason  # "event", "stable" or "timeout"
+        self.events = events
+
+    def to_dict(self):
+        return {"waited": round(self.waited, 3), "reason": self.reason, "events": self.events}
+
+    def __repr__(self):
+        return f"WaitResult({self.to_dict()})"
+
+
+class UIEventSource:
+    """
+    Base event source: keeps a sequence number and timestamp per event kind
+    and wakes up waiters on every event.
+
+    ``tracks_dirty`` sources also collect the runtime ids of the elements
+    reported changed, which the snapshot engine can use to skip clean subtrees.
+    Listeners (e.g. utils.ui_mirror) are called with (kind, runtime_id) for
+    every event, on the thread that emitted it and before waiters wake up, so
+    they must only record it.
+    """
+    tracks_dirty = False
+    live = False  # events are delivered continuously, not only while a wait polls
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._last = {}  # kind -> (seq, monotonic time)
+        self._dirty = set()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def emit(self, kind, runtime_id=None):
+        with self._cond:
+            self._seq += 1
+            self._last[kind] = (self._seq, time.monotonic())
+            if runtime_id and kind in DIRTY_EVENTS:
+                self._dirty.add(runtime_id)
+            for listener in self._listeners:
+                try:
+                    listener(kind, runtime_id)
+                except Exception as e:
+                    logger.error(f"UI event listener failed: {repr(e)}")
+            self._cond.notify_all()
+
+    def mark(self):
+        with self._cond:
+            return self._seq
+
+    def last_event(self, kinds, since):
+        """Latest (seq, time) among ``kinds`` emitted after sequence ``since``, or None."""
+        with self._cond:
+            hits = [self._last[k] for k in kinds if k in self._last and self._last[k][0] > since]
+        return max(hits) if hits else None
+
+    def events_since(self, since):
+        with self._cond:
+            return self._seq - since
+
+    def drain_dirty(self):
+        if not self.tracks_dirty:
+            return None
+        with self._cond:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def poll(self):
+        pass
+
+    def wait_event(self, timeout, seq=None):
+        """Sleep up to ``timeout`` seconds, less if an event comes (or came after sequence ``seq``)."""
+        with self._cond:
+            if seq is None or self._seq == seq:
+                self._cond.wait(timeout)
+
+    def close(self):
+        pass
+
+
+class SimulatedEventSource(UIEventSource):
+    """
+    Event source driven by the caller, for tests and benchmarks.
+
+    ``script`` emits a list of (delay_seconds, kind, runtime_id) from a timer
+    thread, relative to the call.
+    """
+    tracks_dirty = True
+    live = True
+
+    def script(self, events):
+        timers = []
+        for delay, kind, runtime_id in events:
+            timer = threading.Timer(delay, self.emit, args=(kind, runtime_id))
+            timer.daemon = True
+            timer.start()
+            timers.append(timer)
+        return timers
+
+
+class PollingEventSource(UIEventSource):
+    """
+    Fallback when UIA events are not available: every ``poll`` hashes the
+    top of the tree and reports a structure change when the hash moved.
+    The baseline is taken at creation and again by ``mark``, so a change
+    made before the action is not reported as caused by it.
+    """
+    def __init__(self, element, depth=SIGNATURE_DEPTH):
+        super().__init__()
+        self._element = element
+        self._depth = depth
+        self._signature = None
+        self.poll()
+
+    def mark(self):
+        self.poll()
+        return super().mark()
+
+    def poll(self):
+        try:
+            signature = tree_signature(self._element, self._depth)
+        except Exception as e:
+            logger.warning(f"Tree signature failed: {repr(e)}")
+            return
+        if self._signature is not None and signature != self._signature:
+            self.emit(STRUCTURE_CHANGED)
+        self._signature = signature
+
+
+class UIAEventSource(UIEventSource):
+    """
+    Structure, focus and property change events from UIA, registered on the
+    subtree of ``element``. Handlers run on UIA's own threads and only
+    record the event.
+    """
+    tracks_dirty = True
+    live = True
+
+    def __init__(self, element):
+        super().__init__()
+        import comtypes
+        from pywinauto.uia_defines import IUIA
+
+        uia = IUIA().UIA_dll
+        self._iuia = IUIA().iuia
+        source = self
+
+        class StructureHandler(comtypes.COMObject):
+            _com_interfaces_ = [uia.IUIAutomationStructureChangedEventHandler]
+
+            def HandleStructureChangedEvent(self, sender, change_type, runtime_id):
+                source.emit(STRUCTURE_CHANGED, _sender_runtime_id(sender))
+
+        class FocusHandler(comtypes.COMObject):
+            _com_interfaces_ = [uia.IUIAutomationFocusChangedEventHandler]
+
+            def HandleFocusChangedEvent(self, sender):
+                source.emit(FOCUS_CHANGED, _sender_runtime_id(sender))
+
+        class PropertyHandler(comtypes.COMObject):
+            _com_interfaces_ = [uia.IUIAutomationPropertyChangedEventHandler]
+
+            def HandlePropertyChangedEvent(self, sender, property_id, new_value):
+                source.emit(PROPERTY_CHANGED, _sender_runtime_id(sender))
+
+        properties = [
+            uia.UIA_NamePropertyId,
+            uia.UIA_ValueValuePropertyId,
+            uia.UIA_ToggleToggleStatePropertyId,
+            uia.UIA_ExpandCollapseExpandCollapseStatePropertyId,
+            uia.UIA_BoundingRectanglePropertyId,
+        ]
+        self._element = com_element = element.element_info.element
+        self._handlers = (StructureHandler(), FocusHandler(), PropertyHandler())
+        self._iuia.AddStructureChangedEventHandler(com_element, uia.TreeScope_Subtree, None, self._handlers[0])
+        self._iuia.AddFocusChangedEventHandler(None, self._handlers[1])
+        self._iuia.AddPropertyChangedEventHandler(com_element, uia.TreeScope_Subtree, None, self._handlers[2], properties)
+
+    def close(self):
+        # pywinauto shares one IUIAutomation across the process, and so every session:
+        # only remove this source's handlers, never RemoveAllEventHandlers
+        structure, focus, prop = self._handlers
+        removals = (
+            lambda: self._iuia.RemoveStructureChangedEventHandler(self._element, structure),
+            lambda: self._iuia.RemoveFocusChangedEventHandler(focus),
+            lambda: self._iuia.RemovePropertyChangedEventHandler(self._element, prop),
+        )
+        for remove in removals:
+            try:
+                remove()
+            except Exception as e:
+                logger.error(f"Error removing UIA event handler: {repr(e)}")
+
+
+def _sender_runtime_id(sender):
+    try:
+        return format_runtime_id(sender.GetRuntimeId())
+    except Exception:
+        return None
+
+
+def tree_signature(element, depth=SIGNATURE_DEPTH):
+    """Hash of the runtime ids and titles of the top ``depth`` levels under ``element``."""
+    digest = hashlib.sha1()
+    level = [select_provider(element).root(element)]
+    for _ in range(depth):
+        next_level = []
+        for node in level:
+            digest.update(f"{node.runtime_id}|{node.title()}\n".encode("utf-8", "replace"))
+            next_level.extend(node.children())
+        level = next_level
+    return digest.hexdigest()
+
+
+def create_event_source(element):
+    """UIA events on Windows, tree polling everywhere else or if registration fails."""
+    if sys.platform == "win32" and hasattr(getattr(element, "element_info", None), "element"):
+        try:
+            return UIAEventSource(element)
+        except Exception as e:
+            logger.warning(f"UIA event handlers unavailable, polling the tree instead: {repr(e)}")
+    return PollingEventSource(element)
+
+
+def wait_for_ui(source, mark, until=UNTIL_STABLE, quiet_ms=DEFAULT_QUIET_MS, timeout=DEFAULT_SETTLE_TIMEOUT):
+    """
+    Wait for the UI to settle after an action.
+
+    Args:
+        source: UIEventSource watching the window the action was sent to
+        mark: ``source.mark()`` taken right before the action
+        until: "stable" to return once no event was seen for ``quiet_ms``, or one
+               event kind / a tuple of kinds ("structure", "focus", "property") that
+               must be seen first, followed by the same quiet period
+        quiet_ms: How long the tree must stay quiet to count as settled
+        timeout: Upper bound of the wait in seconds
+
+    Returns:
+        WaitResult with the time actually waited and why the wait ended
+    """
+    kinds = ALL_EVENTS if until == UNTIL_STABLE else ((until,) if isinstance(until, str) else tuple(until))
+    quiet = quiet_ms / 1000
+    start = time.monotonic()
+    deadline = start + timeout
+    seen = until == UNTIL_STABLE
+
+    while True:
+        source.poll()
+        seq = mark + source.events_since(mark)
+        now = time.monotonic()
+        if not seen and source.last_event(kinds, mark):
+            seen = True
+        wake = deadline
+        if seen:
+            last = source.last_event(ALL_EVENTS, mark)
+            quiet_until = (last[1] if last else start) + quiet
+            if now >= quiet_until:
+                reason = UNTIL_STABLE if until == UNTIL_STABLE else "event"
+                return WaitResult(now - start, reason, source.events_since(mark))
+            wake = min(wake, quiet_until)
+        if now >= deadline:
+            return WaitResult(now - start, "timeout", source.events_since(mark))
+        if not source.live:
+            wake = min(wake, now + POLL_INTERVAL)
+        # live sources wake up on the next event, or when the quiet window ends
+        source.wait_event(wake - now, seq)
@@ -0,0 +1,147 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+
+WARM_PORT_BASE = 9322
+LAUNCH_RETRY_DELAY = 5
+
+
+class WarmBrowser:
+    def __init__(self, app, user_data_dir, debug_port, profile_source=None):
+        self.app = app
+        self.user_data_dir = user_data_dir
+        self.debug_port = debug_port
+        self.profile_source = profile_source
+        self.launched_at = time.time()
+
+    def __repr__(self):
+        return f"WarmBrowser(port={self.debug_port}, user_data_dir={self.user_data_dir})"
+
+
+class WarmBrowserPool:
+    """
+    Keeps ``size`` browsers launched and idle, each on a fresh profile clone,
+    so that ``take`` can hand one out without waiting for a launch.
+
+    A background thread launches browsers through ``launcher.launch(user_data_dir,
+    debug_port)`` until ``size`` are idle, and starts again whenever one is
+    taken. Idle browsers that died are dropped on ``take``. ``start`` registers
+    ``shutdown`` to run at exit, so idle browsers and their profile clones do
+    not outlive the server.
+    """
+    def __init__(self, size, launcher, profile_cache, profile_source=None, port_base=WARM_PORT_BASE, port_count=None):
+        self.size = size
+        self.launcher = launcher
+        self.profile_cache = profile_cache
+        self.profile_source = str(Path(profile_source).resolve()) if profile_source else None
+        # ports of idle browsers and of the ones taken but not closed yet
+        self._ports = deque(range(port_base, port_base + (port_count or 4 * size)))
+        self._idle = deque()
+        self._launching = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.taken = 0
+        self.misses = 0
+        self.launch_failures = 0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._fill, name="warm-browser-pool", daemon=True)
+            self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or (len(self._idle) + self._launching < self.size and self._ports))
+                if not self._running:
+                    return
+                self._launching += 1
+                port = self._ports.popleft()
+            warm = None
+            try:
+                warm = self._launch(port)
+            except Exception as e:
+                self.launch_failures += 1
+                logger.error(f"[WarmBrowserPool] Launch on port {port} failed: {repr(e)}")
+            with self._cond:
+                self._launching -= 1
+                if warm is None:
+                    self._ports.append(port)
+                elif self._running:
+                    self._idle.append(warm)
+                    logger.info(f"[WarmBrowserPool] {warm} ready, {len(self._idle)}/{self.size} idle")
+                self._cond.notify_all()
+            if warm is None:
+                time.sleep(LAUNCH_RETRY_DELAY)
+            elif not self._running:
+                self._discard(warm)
+
+    def _launch(self, port):
+        if self.profile_source:
+            user_data_dir = self.profile_cache.clone(self.profile_source, prefix="win_auto_mcp_warm_")
+        else:
+            user_data_dir = self.profile_cache.empty(prefix="win_auto_mcp_warm_")
+        try:
+            app = self.launcher.launch(user_data_dir, port)
+        except Exception:
+            self.profile_cache.release(user_data_dir)
+            raise
+        return WarmBrowser(app, user_data_dir, port, self.profile_source)
+
+    def take(self, profile_source=None):
+        """An idle browser on a clone of ``profile_source`` (None: empty profile), or None right away."""
+        profile_source = str(Path(profile_source).resolve()) if profile_source else None
+        if profile_source != self.profile_source:
+            return None
+        with self._cond:
+            while self._idle:
+                warm = self._idle.popleft()
+                self._cond.notify_all()
+                if warm.app.is_process_running():
+                    self.taken += 1
+                    return warm
+                logger.warning(f"[WarmBrowserPool] {warm} exited while idle")
+                self._ports.append(warm.debug_port)
+                self.profile_cache.release(warm.user_data_dir)
+            self.misses += 1
+        return None
+
+    def give_back_port(self, port):
+        """Called when a browser handed out by ``take`` is closed."""
+        with self._cond:
+            if port not in self._ports:
+                self._ports.append(port)
+                self._cond.notify_all()
+
+    def _discard(self, warm):
+        try:
+            warm.app.kill()
+        except Exception as e:
+            logger.warning(f"[WarmBrowserPool] Killing {warm} failed: {repr(e)}")
+        self.profile_cache.release(warm.user_data_dir)
+
+    def shutdown(self):
+        atexit.unregister(self.shutdown)
+        with self._cond:
+            self._running = False
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for warm in idle:
+            self._discard(warm)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.size, "idle": len(self._idle), "launching": self._launching,
+                    "taken": self.taken, "misses": self.misses, "launch_failures": self.launch_failures}